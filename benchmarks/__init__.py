@@ -0,0 +1 @@
+"""Database benchmarks for TermWave."""
@@ -0,0 +1,304 @@
+"""Time the chat database's hot paths against a synthetic history.
+
+Usage::
+
+    python -m benchmarks.run                         # 10k chats, 5M messages
+    python -m benchmarks.run --scale small           # quick run
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+The generated database is cached (``--db``) and reused by later runs with
+the same size and seed, since building the large history takes a while.
+Each run works on a fresh copy of it, as the write benchmarks add and
+remove rows, so every run measures the same data.
+Each operation is timed over many iterations and summarised as p50 and p99
+latencies. With ``--compare``, any operation whose p50 or p99 is slower
+than the baseline by more than ``--threshold`` is flagged and the exit
+status is 1.
+"""
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import VOCABULARY, populate
+from src.db.database import ChatDatabase
+
+SCALES = {
+    "small": {"chats": 200, "messages": 20000},
+    "medium": {"chats": 2000, "messages": 500000},
+    "large": {"chats": 10000, "messages": 5000000},
+}
+
+DEFAULT_ITERATIONS = 200
+
+# A regression is flagged when a percentile is this much slower than baseline
+DEFAULT_THRESHOLD = 0.20
+
+# Slowdowns smaller than this are timer and scheduler noise, not regressions
+_NOISE_FLOOR_MS = 0.25
+
+
+def percentiles(samples):
+    """Summarise latency samples.
+
+    Args:
+        samples: Durations in seconds
+
+    Returns:
+        dict: ``p50_ms``, ``p99_ms``, ``mean_ms`` and ``iterations``
+    """
+    samples = sorted(samples)
+    if len(samples) > 1:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p99 = cuts[49], cuts[98]
+    else:
+        p50 = p99 = samples[0]
+    return {
+        "p50_ms": round(p50 * 1000, 4),
+        "p99_ms": round(p99 * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "iterations": len(samples),
+    }
+
+
+def _time(func, iterations, setup=None):
+    """Time func over a number of iterations, excluding any per-call setup."""
+    samples = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_benchmarks(db, iterations=DEFAULT_ITERATIONS, seed=0):
+    """Time each database operation.
+
+    Args:
+        db: A ChatDatabase filled with a history
+        iterations: Number of timed calls per operation
+        seed: Seed for choosing chats and search terms
+
+    Returns:
+        dict: Operation name mapped to its percentiles()
+    """
+    rng = random.Random(seed)
+    with db.pool.reader() as conn:
+        chat_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM chats WHERE deleted_at IS NULL ORDER BY message_count DESC"
+        )]
+    if not chat_ids:
+        raise ValueError("The benchmark database has no chats")
+
+    # Pick long chats more often, as people return to their big threads
+    weights = [1 / (rank + 1) for rank in range(len(chat_ids))]
+
+    def pick_chat():
+        return (rng.choices(chat_ids, weights)[0],)
+
+    def new_chat():
+        chat_id = db.start_chat("user", "Benchmark chat to delete")
+        for i in range(20):
+            db.save_message(chat_id, "assistant", f"Reply {i}")
+        return (chat_id,)
+
+    def new_deleted_chat():
+        db.delete_chat(new_chat()[0])
+        return ()
+
+    def search_terms():
+        return (" ".join(rng.sample(VOCABULARY, 2)),)
+
+    results = {
+        "get_all_chats": _time(db.get_all_chats, iterations),
+        "get_chat_messages": _time(db.get_chat_messages, iterations, pick_chat),
+        "get_chat_messages_page": _time(db.get_chat_messages_page, iterations, pick_chat),
+        "save_message": _time(
+            lambda chat_id: db.save_message(chat_id, "user", "Benchmark message"),
+            iterations, pick_chat
+        ),
+        "delete_chat": _time(db.delete_chat, iterations, new_chat),
+    }
+
+    # Purge what delete_chat left behind untimed, then time purging one chat at a time
+    db.purge_deleted_chats()
+    results.update({
+        "purge_deleted_chats": _time(db.purge_deleted_chats, iterations, new_deleted_chat),
+        "search_messages": _time(
+            lambda query: list(db.search_messages(query)), iterations, search_terms
+        ),
+    })
+    db.flush()
+    return {name: percentiles(samples) for name, samples in results.items()}
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Find operations that got slower than the baseline.
+
+    Args:
+        baseline: A results dict loaded from a baseline file
+        current: A results dict from this run
+        threshold: Allowed slowdown as a fraction, e.g. 0.2 for 20%
+
+    Returns:
+        list: A description of each regression
+    """
+    regressions = []
+    for name, timings in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            old, new = before[key], timings[key]
+            if new > max(old * (1 + threshold), old + _NOISE_FLOOR_MS):
+                regressions.append(
+                    f"{name} {key[:3]}: {old:.3f} ms -> {new:.3f} ms "
+                    f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def _history_files(path):
+    """Return the files of a benchmark database: the database and its archive."""
+    return [path, path.with_name(path.stem + ".archive.db")]
+
+
+def _prepare_history(path, chats, messages, seed, regenerate):
+    """Generate the cached benchmark database unless a matching one exists."""
+    marker = path.with_name(path.name + ".json")
+    wanted = {"chats": chats, "messages": messages, "seed": seed}
+
+    cached = path.exists() and marker.exists() and json.loads(marker.read_text()) == wanted
+    if regenerate or not cached:
+        _remove_history(path)
+        print(f"Generating {chats} chats and ~{messages} messages...", file=sys.stderr)
+        db = ChatDatabase(db_path=path)
+        start = time.perf_counter()
+        populate(db, chats, messages, seed)
+        print(f"Generated in {time.perf_counter() - start:.0f} s", file=sys.stderr)
+        # Closing the last connection folds the WAL into the file, ready to copy
+        db.close()
+        marker.write_text(json.dumps(wanted))
+
+
+def _working_copy(path):
+    """Copy the cached benchmark database to a scratch file for one run.
+
+    Returns:
+        Path: The copy, named so that its archive is copied alongside
+    """
+    copy = path.with_name(path.stem + ".run.db")
+    for source, target in zip(_history_files(path), _history_files(copy)):
+        for suffix in ("-wal", "-shm"):
+            Path(str(target) + suffix).unlink(missing_ok=True)
+        if source.exists():
+            shutil.copyfile(source, target)
+        else:
+            target.unlink(missing_ok=True)
+    return copy
+
+
+def _remove_history(path):
+    """Delete a benchmark database and its archive, with their WAL files."""
+    for stale in _history_files(path):
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(stale) + suffix).unlink(missing_ok=True)
+
+
+def build_parser():
+    """Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser for the benchmark runner
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description="Benchmark the chat database"
+    )
+    parser.add_argument("--scale", choices=SCALES, default="large")
+    parser.add_argument("--chats", type=int, help="Override the number of chats")
+    parser.add_argument("--messages", type=int, help="Override the number of messages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument(
+        "--db", type=Path, default=None,
+        help="Cached benchmark database (default: benchmarks/data/<scale>.db)"
+    )
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Rebuild the benchmark database")
+    parser.add_argument("--save", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before flagging, as a fraction")
+    return parser
+
+
+def main(argv=None):
+    """Run the benchmarks.
+
+    Args:
+        argv: Command line arguments. If None, uses sys.argv.
+
+    Returns:
+        int: 1 if a regression was found, otherwise 0
+    """
+    args = build_parser().parse_args(argv)
+    chats = args.chats or SCALES[args.scale]["chats"]
+    messages = args.messages or SCALES[args.scale]["messages"]
+    path = args.db or Path(__file__).parent / "data" / f"{args.scale}.db"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    _prepare_history(path, chats, messages, args.seed, args.regenerate)
+    copy = _working_copy(path)
+    db = ChatDatabase(db_path=copy)
+    try:
+        results = run_benchmarks(db, args.iterations, args.seed)
+    finally:
+        db.close()
+        _remove_history(copy)
+
+    report = {
+        "meta": {
+            "chats": chats,
+            "messages": messages,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    for name, timings in results.items():
+        print(f"{name:<24} p50 {timings['p50_ms']:>9.3f} ms   p99 {timings['p99_ms']:>9.3f} ms")
+
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        scale = {key: baseline.get("meta", {}).get(key) for key in ("chats", "messages")}
+        if scale != {"chats": chats, "messages": messages}:
+            print("Warning: baseline was recorded at a different scale", file=sys.stderr)
+        regressions = compare_results(baseline, report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against the baseline.", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
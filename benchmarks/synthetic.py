@@ -0,0 +1,130 @@
+"""Synthetic chat history for benchmarking.
+
+Real histories are skewed: most chats are a handful of short exchanges,
+while a few run to thousands of messages, and assistant replies are
+longer and more variable than user prompts. The generator reproduces that
+shape with Pareto-distributed chat lengths and log-normal message sizes,
+built from a fixed vocabulary so search has realistic terms to match.
+"""
+
+import datetime
+import random
+import uuid
+
+VOCABULARY = (
+    "the of and to in is that for it as with was on be by this are or from at "
+    "python sqlite database query index cache thread async await function "
+    "error retry timeout memory disk page schema table column row value "
+    "river mountain ocean forest desert island valley glacier canyon meadow "
+    "recipe garlic onion pepper butter flour sugar oven simmer roast "
+    "theorem proof lemma matrix vector integral derivative limit series prime "
+    "budget invoice salary market stock bond interest loan tax pension "
+    "guitar piano violin melody rhythm chord tempo harmony lyric album"
+).split()
+
+# Log-normal parameters (of the length in characters) per role
+_LENGTH_PARAMS = {"user": (4.5, 1.0), "assistant": (6.0, 1.1)}
+_MAX_LENGTH = 20000
+
+# Pareto shape for chat lengths; lower means a heavier tail of long chats
+_CHAT_LENGTH_ALPHA = 1.2
+
+_HISTORY_DAYS = 730
+
+
+def _sentence_pool(rng, size=5000):
+    """Pre-build sentences so bodies can be assembled without per-word work."""
+    sentences = []
+    for _ in range(size):
+        words = rng.choices(VOCABULARY, k=rng.randint(4, 18))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return sentences
+
+
+def _message_body(rng, sentences, role):
+    """Build a message body with a log-normally distributed length."""
+    mu, sigma = _LENGTH_PARAMS[role]
+    target = min(int(rng.lognormvariate(mu, sigma)) + 1, _MAX_LENGTH)
+    parts = []
+    length = 0
+    while length < target:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:target]
+
+
+def chat_lengths(rng, chats, messages):
+    """Split a message total over chats with a heavy-tailed distribution.
+
+    Args:
+        rng: The random.Random to draw from
+        chats: Number of chats
+        messages: Approximate total number of messages
+
+    Returns:
+        list: Message count per chat, each at least 1
+    """
+    weights = [rng.paretovariate(_CHAT_LENGTH_ALPHA) for _ in range(chats)]
+    total = sum(weights)
+    return [max(1, round(messages * weight / total)) for weight in weights]
+
+
+def generate_records(chats=10000, messages=5000000, seed=0):
+    """Generate a synthetic history as export records.
+
+    The records have the same shape as ChatDatabase.iter_export_records(),
+    so they can be loaded with ChatDatabase.import_records().
+
+    Args:
+        chats: Number of chats
+        messages: Approximate total number of messages
+        seed: Seed for the random generator, so runs are reproducible
+
+    Yields:
+        dict: Chat and message records
+    """
+    rng = random.Random(seed)
+    sentences = _sentence_pool(rng)
+    now = datetime.datetime(2025, 1, 1)
+
+    for count in chat_lengths(rng, chats, messages):
+        chat_uuid = str(uuid.UUID(int=rng.getrandbits(128)))
+        started = now - datetime.timedelta(seconds=rng.randint(0, _HISTORY_DAYS * 86400))
+        yield {
+            "type": "chat",
+            "uuid": chat_uuid,
+            "title": " ".join(rng.choices(VOCABULARY, k=4)),
+            "created_at": started.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+        timestamp = started
+        for seq in range(1, count + 1):
+            role = "user" if seq % 2 else "assistant"
+            timestamp += datetime.timedelta(seconds=rng.randint(5, 600))
+            yield {
+                "type": "message",
+                "chat": chat_uuid,
+                "seq": seq,
+                "role": role,
+                "content": _message_body(rng, sentences, role),
+                "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+
+
+def populate(db, chats=10000, messages=5000000, seed=0, batch_size=5000):
+    """Fill a database with a synthetic history.
+
+    Args:
+        db: The ChatDatabase to fill
+        chats: Number of chats
+        messages: Approximate total number of messages
+        seed: Seed for the random generator
+        batch_size: Records written per transaction
+
+    Returns:
+        dict: ``chats`` and ``messages`` counts written
+    """
+    return db.import_records(
+        generate_records(chats, messages, seed), batch_size=batch_size
+    )
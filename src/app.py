@@ -1,20 +1,59 @@
 """Main application for TermWave."""
 
+import asyncio
 import datetime
+import functools
+import sqlite3
+import time
+from pathlib import Path
+
+from textual import work
 from textual.app import App
-from textual.widgets import Header, Footer, Input, Markdown, Button, ListView
+from textual.widgets import Header, Footer, Input, Markdown, Button
 from textual.containers import Container
 from textual.reactive import reactive
 
-from src.ui.components import ChatHistoryItem
+from src.ui.components import ChatHistoryItem, ChatHistoryList
 from src.ui.styles import APP_CSS
+from src.db.async_database import AsyncChatDatabase
+from src.db.backup import backup_database, persist_database
 from src.db.database import ChatDatabase
+from src.db.transfer import export_history, import_history
+from src.checkpoints import (
+    CHECKPOINT_RETRY_DELAY,
+    DEFAULT_CHECKPOINT_TOKENS,
+    DEFAULT_RECENT_MESSAGES,
+    SUMMARY_MAX_TOKENS,
+    checkpoint_due,
+    create_checkpoint,
+    summary_span_budget,
+)
 from src.commands import CommandHandler
 from src.config import Config
+from src.context import build_context
 from src.providers.mock import MockProvider
 from src.providers.openai import OpenAIProvider
 from src.providers.anthropic import AnthropicProvider
 from src.providers.eliza import ElizaProvider
+from src.providers.base import ProviderError
+from src.transport import TransportRegistry
+
+
+def format_size(num_bytes):
+    """Format a byte count for display.
+
+    Args:
+        num_bytes: The number of bytes
+
+    Returns:
+        str: The size with a binary unit, e.g. ``1.5 MiB``
+    """
+    size = float(num_bytes)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
 
 
 class AIChatApp(App):
@@ -31,19 +70,76 @@ class AIChatApp(App):
         "eliza": ElizaProvider
     }
 
-    def __init__(self):
-        """Initialize the application."""
+    # Number of messages fetched per page when opening or scrolling a chat
+    MESSAGE_PAGE_SIZE = 50
+
+    # Least time between re-renders of a streaming reply; one frame at 60 fps
+    STREAM_RENDER_INTERVAL = 1 / 60
+
+    def __init__(self, db_path=None, ephemeral=False, persist_path=None):
+        """Initialize the application.
+
+        Args:
+            db_path: Optional path to the chat database. If None, uses the default path.
+            ephemeral: If True, keep the chat history and settings in memory
+                and write nothing to disk
+            persist_path: Optional file to save an ephemeral session's history
+                to when the app exits
+        """
         super().__init__()
-        self.config = Config()
-        self.db = ChatDatabase()
+        self.config = Config(ephemeral=ephemeral)
+        self.db = ChatDatabase(
+            db_path=db_path,
+            ephemeral=ephemeral,
+            write_behind=self.config.get("database.write_behind", False),
+            busy_timeout=self.config.get("database.busy_timeout", 5000),
+            flush_interval=self.config.get("database.flush_interval", 0.05),
+            flush_threshold=self.config.get("database.flush_threshold", 64),
+        )
+        # All app code goes through the async facade so SQLite never
+        # blocks the event loop; self.db stays available for sync callers.
+        self.async_db = AsyncChatDatabase(self.db)
         self.command_handler = CommandHandler(self)
 
+        # Keyset cursor for the oldest message shown in the transcript
+        self.oldest_loaded_seq = None
+        self.has_older_messages = False
+        self.loading_older_messages = False
+
+        # Deleted chats can be restored with /undo until the purge runs
+        self.undo_window = self.config.get("database.undo_window", 30)
+        self.last_deleted_chat_ids = []
+
+        # A reply is being streamed into the transcript; reloading the chat
+        # would detach it, so external changes wait until it is saved
+        self.streaming_reply = False
+        self.reload_after_reply = False
+
+        # Chats already told that older messages are left out of the provider's context
+        self.context_noted_chat_ids = set()
+
+        # Chats whose checkpoint summary is being written
+        self.checkpointing_chat_ids = set()
+
+        # When each chat whose summary failed may be tried again (time.monotonic())
+        self.checkpoint_retry_at = {}
+
+        # Title for the chat row created when an unsaved chat gets its first message
+        self.new_chat_title = "New Chat"
+
+        # Where to save the history on exit, and the outcome once saved
+        self.persist_path = persist_path
+        self.persist_result = None
+
+        # Pooled HTTP clients shared by providers; closed on exit
+        self.transports = TransportRegistry.from_config(self.config)
+
         # Set up the chat provider based on config
         provider_name = self.config.get("default_provider", "mock")
         self.setup_provider(provider_name)
 
     def setup_provider(self, provider_name):
-        """Set up the chat provider.
+        """Set up the chat provider, and the provider that summarizes long chats.
 
         Args:
             provider_name: The name of the provider to use
@@ -52,21 +148,47 @@ class AIChatApp(App):
         if provider_name not in self.PROVIDER_CLASSES:
             # Default to mock provider if not found
             provider_name = "mock"
-        
-        # Get the provider class
+
+        self.chat_provider = self._create_provider(provider_name)
+
+        # Summaries use the provider's cheaper model; providers without one
+        # (the offline ones) do not summarize
+        summary_model = (
+            self.config.get(f"providers.{provider_name}.summary_model")
+            or self.chat_provider.summary_model
+        )
+        self.summary_provider = None
+        if summary_model:
+            self.summary_provider = self._create_provider(provider_name)
+            self.summary_provider.set_provider_option("model", summary_model)
+            self.summary_provider.set_provider_option("max_tokens", SUMMARY_MAX_TOKENS)
+
+    def _create_provider(self, provider_name):
+        """Create a provider and apply its options from the config.
+
+        Args:
+            provider_name: A key of PROVIDER_CLASSES
+
+        Returns:
+            ChatProvider: The new provider
+        """
         provider_class = self.PROVIDER_CLASSES[provider_name]
-        
-        # Initialize with API key if needed
+
+        # Initialize with API key if needed; HTTP providers borrow a pooled
+        # client so warm connections outlive the provider object
         if provider_name in ["openai", "anthropic"]:
             api_key = self.config.get(f"providers.{provider_name}.api_key")
-            self.chat_provider = provider_class(api_key=api_key)
+            provider = provider_class(
+                api_key=api_key, http_client=self.transports.client(provider_name)
+            )
         else:
-            self.chat_provider = provider_class()
+            provider = provider_class()
 
         # Load provider-specific options from config
         provider_config = self.config.get(f"providers.{provider_name}", {})
         for option, value in provider_config.items():
-            self.chat_provider.set_provider_option(option, value)
+            provider.set_provider_option(option, value)
+        return provider
 
     def compose(self):
         """Compose the application UI."""
@@ -75,7 +197,7 @@ class AIChatApp(App):
         with Container(id="app-grid"):
             # Left sidebar for chat history
             with Container(id="sidebar"):
-                yield ListView(id="history-list")
+                yield ChatHistoryList(id="history-list")
 
             # Main area (chat + input)
             with Container(id="main-area"):
@@ -89,74 +211,159 @@ class AIChatApp(App):
 
         yield Footer()
 
-    def on_mount(self):
+    async def on_mount(self):
         """Initialize the app when it's mounted."""
         # Set focus to the input box
         self.query_one("#user-input").focus()
 
-        # Create a new chat or load the most recent one
-        self.load_chat_history()
-        if not self.current_chat_id:
-            self.create_new_chat()
-
-    def create_new_chat(self, initial_title="New Chat"):
-        """Create a new chat session.
+        # Fetch older messages when the transcript is scrolled to the top
+        self.watch(
+            self.query_one("#chat-container"), "scroll_y", self.on_chat_scroll, init=False
+        )
+
+        # Start on an unsaved chat; its row is created with the first message
+        await self.load_chat_history()
+
+        # Follow writes made by other instances sharing the database
+        poll_interval = self.config.get("database.change_poll_interval", 1.0)
+        if poll_interval:
+            self.set_interval(poll_interval, self.check_for_external_changes)
+
+        # Tidy up the database without holding up startup
+        self.run_worker(
+            self.run_startup_maintenance(),
+            exclusive=True, group="maintenance", exit_on_error=False
+        )
+        # Finish purging chats deleted in an earlier session
+        self.purge_deleted_chats()
+
+    async def on_unmount(self):
+        """Save the history if asked to, then release HTTP and database connections."""
+        await self.transports.aclose()
+        if self.persist_path is not None:
+            try:
+                self.persist_result = await self.async_db.call(
+                    persist_database, self.db, self.persist_path
+                )
+            except (OSError, sqlite3.Error) as e:
+                self.persist_result = e
+        self.async_db.close()
+
+    async def create_new_chat(self, initial_title="New Chat"):
+        """Start a new chat session.
+
+        Nothing is written until the first message is saved, so chats that
+        are opened and abandoned never reach the database.
 
         Args:
             initial_title: The initial title for the chat
-
-        Returns:
-            int: The ID of the newly created chat
         """
-        chat_id = self.db.create_new_chat(initial_title)
-        self.current_chat_id = chat_id
-        self.load_chat_history()
+        self.current_chat_id = None
+        self.new_chat_title = initial_title
+        self.oldest_loaded_seq = None
+        self.has_older_messages = False
+        await self.load_chat_history()
 
         # Clear the chat container
         chat_container = self.query_one("#chat-container")
         chat_container.remove_children()
         chat_container.mount(Markdown("# New Chat\n\nStart typing below..."))
 
-        return chat_id
-
-    def load_chat_history(self):
+    async def load_chat_history(self):
         """Load the chat history list from the database."""
-        chats = self.db.get_all_chats()
+        chats = await self.async_db.get_all_chats()
 
         # Update the history list
         history_list = self.query_one("#history-list")
         history_list.clear()
+        history_list.extend(self._history_item(chat) for chat in chats)
+
+    def _history_item(self, chat):
+        """Build the sidebar item for a chat.
+
+        Args:
+            chat: A row as returned by ChatDatabase.get_all_chats()
+
+        Returns:
+            ChatHistoryItem: The item to show in the history list
+        """
+        chat_id, title, last_message_at, _message_count, preview = chat
+
+        # Format the time of the latest activity
+        dt = datetime.datetime.fromisoformat(last_message_at)
+        formatted_time = dt.strftime("%Y-%m-%d %H:%M")
+
+        # Truncate title if needed
+        display_title = title[:30] + "..." if len(title) > 30 else title
 
-        for chat_id, title, timestamp in chats:
-            # Format the timestamp
-            dt = datetime.datetime.fromisoformat(timestamp)
-            formatted_time = dt.strftime("%Y-%m-%d %H:%M")
+        return ChatHistoryItem(
+            chat_id, display_title, formatted_time,
+            preview=preview, last_message_at=last_message_at
+        )
 
-            # Truncate title if needed
-            display_title = title[:30] + "..." if len(title) > 30 else title
+    async def check_for_external_changes(self):
+        """Pick up chats changed by another termwave instance on the same database."""
+        changed = await self.async_db.poll_changes()
+        if changed:
+            await self.refresh_chats(changed)
 
-            # Add to the list
-            history_list.append(ChatHistoryItem(chat_id, display_title, formatted_time))
+    async def refresh_chats(self, chat_ids):
+        """Update only the sidebar rows and transcript of the given chats.
 
-    def load_chat(self, chat_id):
+        Args:
+            chat_ids: IDs of the chats that changed
+        """
+        rows = {chat[0]: chat for chat in await self.async_db.get_chats(chat_ids)}
+        history_list = self.query_one("#history-list")
+        items = {item.chat_id: item for item in history_list.query(ChatHistoryItem)}
+
+        # Chats that were deleted elsewhere
+        for chat_id in set(items) - set(rows):
+            if chat_id in chat_ids:
+                await items[chat_id].remove()
+
+        # Oldest first, so the most recently active chat ends up on top
+        for chat in sorted(rows.values(), key=lambda chat: chat[2]):
+            item = items.get(chat[0])
+            new_item = self._history_item(chat)
+            if item is not None and item.last_message_at == new_item.last_message_at:
+                item.update_summary(new_item.title, new_item.timestamp, new_item.preview)
+                continue
+            if item is not None:
+                await item.remove()
+            await history_list.insert(0, [new_item])
+
+        if self.current_chat_id in chat_ids:
+            if self.streaming_reply:
+                self.reload_after_reply = True
+            elif self.current_chat_id in rows:
+                await self.load_chat(self.current_chat_id)
+            else:
+                await self.create_new_chat()
+
+    async def load_chat(self, chat_id):
         """Load a specific chat into the main window.
 
         Args:
             chat_id: The ID of the chat to load
         """
         # Get chat info
-        chat_info = self.db.get_chat_info(chat_id)
+        chat_info = await self.async_db.get_chat_info(chat_id)
 
         if not chat_info:
             return
 
         chat_title = chat_info[0]
 
-        # Get all messages for this chat
-        messages = self.db.get_chat_messages(chat_id)
+        # Only fetch the tail; older pages are loaded on scroll
+        messages = await self.async_db.get_chat_messages_page(
+            chat_id, limit=self.MESSAGE_PAGE_SIZE
+        )
 
-        # Update current chat ID
+        # Update current chat ID and the paging cursor
         self.current_chat_id = chat_id
+        self.oldest_loaded_seq = messages[0][0] if messages else None
+        self.has_older_messages = len(messages) == self.MESSAGE_PAGE_SIZE
 
         # Clear and rebuild the chat container
         chat_container = self.query_one("#chat-container")
@@ -165,16 +372,108 @@ class AIChatApp(App):
         # Add chat title
         chat_container.mount(Markdown(f"# {chat_title}"))
 
-        # Add all messages
-        for role, content in messages:
-            if role == "user":
-                chat_container.mount(Markdown(f"**You:** {content}"))
-            else:
-                chat_container.mount(Markdown(f"**AI:** {content}"))
+        # Add the loaded messages
+        chat_container.mount_all(
+            self.render_message(content, role) for _, role, content in messages
+        )
 
         # Scroll to bottom
         chat_container.scroll_end(animate=False)
 
+    async def load_older_messages(self):
+        """Prepend the previous page of messages to the current transcript.
+
+        Returns:
+            bool: True if any messages were added
+        """
+        if not self.has_older_messages or self.oldest_loaded_seq is None:
+            return False
+
+        messages = await self.async_db.get_chat_messages_page(
+            self.current_chat_id,
+            limit=self.MESSAGE_PAGE_SIZE,
+            before_seq=self.oldest_loaded_seq,
+        )
+        self.has_older_messages = len(messages) == self.MESSAGE_PAGE_SIZE
+        if not messages:
+            return False
+        self.oldest_loaded_seq = messages[0][0]
+
+        chat_container = self.query_one("#chat-container")
+        previous_height = chat_container.virtual_size.height
+
+        # Insert below the chat title, which is always the first child
+        chat_container.mount_all(
+            (self.render_message(content, role) for _, role, content in messages),
+            after=0,
+        )
+
+        # Keep the messages that were on screen in the same place
+        def restore_scroll():
+            added = chat_container.virtual_size.height - previous_height
+            chat_container.scroll_to(y=chat_container.scroll_y + added, animate=False)
+
+        self.call_after_refresh(restore_scroll)
+        return True
+
+    async def on_chat_scroll(self, scroll_y):
+        """Load the previous page once the transcript reaches the top.
+
+        Args:
+            scroll_y: The new vertical scroll offset of the chat container
+        """
+        if scroll_y > 1 or self.loading_older_messages:
+            return
+
+        self.loading_older_messages = True
+        try:
+            await self.load_older_messages()
+        finally:
+            self.loading_older_messages = False
+
+    def render_message(self, message, role=None):
+        """Create the widget used to display a message in the transcript.
+
+        Args:
+            message: The message content
+            role: Optional role for the message (user/assistant)
+
+        Returns:
+            Markdown: The widget for the message
+        """
+        if role == "user":
+            return Markdown(f"**You:** {message}")
+        elif role == "assistant":
+            return Markdown(f"**AI:** {message}")
+        # No role, just show it as a system message
+        return Markdown(message)
+
+    def search_history(self, query):
+        """Search every chat and stream the matches into the transcript.
+
+        Args:
+            query: The words to search for
+        """
+        self.add_message_to_chat(f"## Search results for `{query}`")
+        self.stream_search_results(query)
+
+    @work(exclusive=True, group="search")
+    async def stream_search_results(self, query):
+        """Add search results to the transcript as the database returns them.
+
+        Args:
+            query: The words to search for
+        """
+        found = 0
+
+        async for chat_id, title, seq, role, snippet in self.async_db.search_messages(query):
+            found += 1
+            speaker = "You" if role == "user" else "AI"
+            self.add_message_to_chat(f"**{title}** · {speaker}: {snippet}")
+
+        if not found:
+            self.add_message_to_chat("No messages matched.")
+
     def add_message_to_chat(self, message, role=None):
         """Add a message to the current chat display.
 
@@ -183,20 +482,13 @@ class AIChatApp(App):
             role: Optional role for the message (user/assistant)
         """
         chat_container = self.query_one("#chat-container")
-
-        if role == "user":
-            chat_container.mount(Markdown(f"**You:** {message}"))
-        elif role == "assistant":
-            chat_container.mount(Markdown(f"**AI:** {message}"))
-        else:
-            # No role, just add as system message
-            chat_container.mount(Markdown(message))
+        chat_container.mount(self.render_message(message, role))
 
         # Scroll to bottom
         chat_container.scroll_end(animate=False)
 
     async def save_and_respond_to_message(self, user_message):
-        """Save a user message and generate a response.
+        """Save a user message, then stream and save the response.
 
         Args:
             user_message: The message from the user
@@ -204,36 +496,417 @@ class AIChatApp(App):
         Returns:
             str: The assistant's response
         """
-        # Save user message
-        self.db.save_message(self.current_chat_id, "user", user_message)
+        # Save user message; a new chat's row is created along with it
+        if self.current_chat_id is None:
+            self.current_chat_id = await self.async_db.start_chat(
+                "user", user_message, title=self.new_chat_title
+            )
+            await self.load_chat_history()
+        else:
+            await self.async_db.save_message(self.current_chat_id, "user", user_message)
 
         # Get all messages for context
-        messages = self.db.get_chat_messages(self.current_chat_id)
-        messages_for_provider = [{"role": role, "content": content} for role, content in messages]
+        messages_for_provider = await self.build_provider_messages(self.current_chat_id)
+
+        # Stream the response into the transcript as it arrives
+        self.streaming_reply = True
+        try:
+            response = await self.stream_assistant_reply(messages_for_provider)
+
+            # Save assistant response
+            await self.async_db.save_message(self.current_chat_id, "assistant", response)
+        finally:
+            self.streaming_reply = False
+
+        # Catch up with changes made elsewhere while the reply streamed
+        if self.reload_after_reply:
+            self.reload_after_reply = False
+            await self.refresh_chats({self.current_chat_id})
+
+        # Summarize the start of a long chat in the background
+        if self.summary_provider is not None and self.config.get("context.summarize", True):
+            self.run_worker(
+                self.update_checkpoint(self.current_chat_id),
+                group="checkpoint", exit_on_error=False
+            )
+
+        return response
 
-        # Get response from provider
-        response = await self.chat_provider.generate_response(messages_for_provider)
+    async def update_checkpoint(self, chat_id):
+        """Bring a chat's checkpoint summary up to date if its history has grown enough.
 
-        # Save assistant response
-        self.db.save_message(self.current_chat_id, "assistant", response)
+        Runs after each reply; at most one summary per chat is written at a
+        time. History too long for one summary request is folded in a
+        stretch at a time. If the provider fails, the chat is not tried
+        again for CHECKPOINT_RETRY_DELAY seconds. Summaries are used from
+        the next request on.
+
+        Args:
+            chat_id: The ID of the chat
+
+        Returns:
+            int: The number of checkpoints stored
+        """
+        if chat_id in self.checkpointing_chat_ids:
+            return 0
+        if time.monotonic() < self.checkpoint_retry_at.get(chat_id, 0):
+            return 0
+        self.checkpointing_chat_ids.add(chat_id)
+        stored = 0
+        try:
+            max_span = summary_span_budget(self.summary_provider)
+            while True:
+                through_seq = await self.async_db.call(
+                    checkpoint_due, self.db, chat_id, self.summary_provider.tokenizer_family,
+                    self.config.get("context.checkpoint_tokens", DEFAULT_CHECKPOINT_TOKENS),
+                    self.config.get("context.recent_messages", DEFAULT_RECENT_MESSAGES),
+                    max_span,
+                )
+                # A stale summary means the chat is being edited; wait for the next reply
+                if through_seq is None or not await create_checkpoint(
+                    self.async_db, chat_id, self.summary_provider, through_seq
+                ):
+                    break
+                stored += 1
+        except ProviderError:
+            self.checkpoint_retry_at[chat_id] = time.monotonic() + CHECKPOINT_RETRY_DELAY
+        finally:
+            self.checkpointing_chat_ids.discard(chat_id)
+        return stored
+
+    async def stream_assistant_reply(self, messages):
+        """Show the provider's response in the transcript as it streams in.
+
+        The message widget is mounted before the first chunk arrives and is
+        re-rendered at most once per STREAM_RENDER_INTERVAL, so a fast stream
+        does not re-parse the growing Markdown for every token. Chunks that
+        arrive too soon after a render are shown by a delayed render at the
+        end of the interval rather than waiting for the next chunk. It runs
+        as an asyncio task, not a Textual timer, because the app's message
+        loop is busy running this handler.
 
+        Args:
+            messages: The messages to send to the provider
+
+        Returns:
+            str: The complete response
+        """
+        chat_container = self.query_one("#chat-container")
+        widget = self.render_message("", "assistant")
+        await chat_container.mount(widget)
+        chat_container.scroll_end(animate=False)
+
+        chunks = []
+        rendered = 0
+        last_render = 0.0
+        pending = None
+
+        async def render(delay=0):
+            nonlocal rendered, last_render, pending
+            if delay:
+                await asyncio.sleep(delay)
+                pending = None
+            if rendered < len(chunks):
+                rendered = len(chunks)
+                last_render = time.monotonic()
+                await widget.update(f"**AI:** {''.join(chunks[:rendered])}")
+                chat_container.scroll_end(animate=False)
+
+        try:
+            async for chunk in self.chat_provider.stream_response(messages):
+                chunks.append(chunk)
+                wait = last_render + self.STREAM_RENDER_INTERVAL - time.monotonic()
+                if wait <= 0:
+                    await render()
+                elif pending is None:
+                    pending = asyncio.create_task(render(wait))
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+        # Always show the whole reply, even if a cancelled render was cut short
+        response = "".join(chunks)
+        await widget.update(f"**AI:** {response}")
+        chat_container.scroll_end(animate=False)
         return response
 
-    def delete_chat(self, chat_id):
+    async def build_provider_messages(self, chat_id):
+        """Collect the messages that fit the provider's context, with their attachments.
+
+        The newest messages that fit the model's token budget are chosen by
+        build_context(); pinned system messages are always included. If older
+        messages had to be left out, a note says how many.
+
+        Attachments are not read here; each carries a ``read`` callable that
+        streams its chunks, so the provider only reads what it uses.
+
+        Args:
+            chat_id: The ID of the chat
+
+        Returns:
+            list: Message dicts with 'role', 'content' and, where a message
+                has files, 'attachments'
+        """
+        context = await self.async_db.call(build_context, self.db, chat_id, self.chat_provider)
+        self.report_context(chat_id, context)
+        messages = context["messages"]
+        attachments = {}
+        for attachment_id, seq, name, media_type, size in await self.async_db.get_attachments(chat_id):
+            attachments.setdefault(seq, []).append({
+                "name": name,
+                "media_type": media_type,
+                "size": size,
+                "read": functools.partial(self.async_db.iter_attachment, attachment_id),
+            })
+
+        provider_messages = []
+        for seq, role, content in messages:
+            message = {"role": role, "content": content}
+            if seq in attachments:
+                message["attachments"] = attachments[seq]
+            provider_messages.append(message)
+        return provider_messages
+
+    def report_context(self, chat_id, context):
+        """Note in the transcript when older messages start being left out of the context.
+
+        Once a chat is over budget, more messages are left out with nearly
+        every reply, so the note is only added the first time.
+
+        Args:
+            chat_id: The ID of the chat
+            context: The result of build_context()
+        """
+        if context["dropped"] and chat_id not in self.context_noted_chat_ids:
+            self.context_noted_chat_ids.add(chat_id)
+            self.add_message_to_chat(
+                f"_Left out the {context['dropped']} oldest messages "
+                f"({context['dropped_tokens']:,} tokens) to fit the "
+                f"{context['budget']:,}-token context budget. Older messages "
+                "will keep being left out as the chat grows._"
+            )
+
+    async def attach_file(self, path):
+        """Attach a file to the current chat.
+
+        A note naming the file is saved as a user message and the file is
+        stored against it, a chunk at a time, on a worker thread.
+
+        Args:
+            path: The file to attach
+        """
+        path = Path(path).expanduser()
+        if not path.is_file():
+            self.add_message_to_chat(f"Cannot attach {path}: no such file.")
+            return
+
+        note = f"Attached file: {path.name}"
+        if self.current_chat_id is None:
+            self.current_chat_id = await self.async_db.start_chat(
+                "user", note, title=self.new_chat_title
+            )
+            await self.load_chat_history()
+        else:
+            await self.async_db.save_message(self.current_chat_id, "user", note)
+        self.add_message_to_chat(note, "user")
+
+        try:
+            await asyncio.to_thread(self.db.add_attachment, self.current_chat_id, path)
+        except OSError as e:
+            self.add_message_to_chat(f"Attaching {path.name} failed: {e}")
+            return
+        self.add_message_to_chat(
+            f"Stored {path.name} ({format_size(path.stat().st_size)})."
+        )
+
+    async def compact_database(self):
+        """Compress stored messages, VACUUM, and report the space saved."""
+        self.add_message_to_chat("Compacting the chat database...")
+        stats = await self.async_db.compact()
+
+        saved = stats["bytes_before"] - stats["bytes_after"]
+        self.add_message_to_chat(
+            f"Compressed {stats['rows_compressed']} messages. "
+            f"Database size: {format_size(stats['bytes_before'])} → "
+            f"{format_size(stats['bytes_after'])} ({format_size(saved)} saved)."
+        )
+
+    async def show_storage_stats(self):
+        """Report how much space deduplicating large message bodies saves."""
+        stats = await self.async_db.get_storage_stats()
+        if not stats["blobs"]:
+            self.add_message_to_chat("No large messages are stored yet.")
+            return
+
+        saved = stats["logical_bytes"] - stats["unique_bytes"]
+        self.add_message_to_chat(
+            f"{stats['references']} large messages share {stats['blobs']} stored bodies "
+            f"(dedupe ratio {stats['dedupe_ratio']:.2f}x, {format_size(saved)} saved). "
+            f"Stored size after compression: {format_size(stats['stored_bytes'])}."
+        )
+
+    async def run_startup_maintenance(self):
+        """Remove empty chats and stale uploads, trim the change log, archive idle chats and count tokens."""
+        if await self.async_db.delete_empty_chats():
+            await self.load_chat_history()
+        await self.async_db.prune_change_log()
+
+        if self.config.get("database.archive_on_startup", True):
+            await self.archive_inactive_chats(quiet=True)
+
+        # Messages saved before token counts were stored; batched off the DB thread
+        await asyncio.to_thread(self.db.backfill_token_counts)
+        await self.async_db.delete_incomplete_attachments()
+
+    async def archive_inactive_chats(self, max_age_days=None, quiet=False):
+        """Move chats that have been idle for a while to the archive database.
+
+        Args:
+            max_age_days: Archive chats idle for longer than this many days.
+                If None, uses the ``database.archive_after_days`` setting.
+            quiet: If True, only report when something was archived
+        """
+        if max_age_days is None:
+            max_age_days = self.config.get("database.archive_after_days", 90)
+
+        archived = await self.async_db.archive_inactive_chats(max_age_days)
+        if archived or not quiet:
+            self.add_message_to_chat(
+                f"Archived {archived} chats with no activity in the last "
+                f"{max_age_days} days."
+            )
+
+    async def backup_database(self, verify=False):
+        """Snapshot the database while it is in use and report the result.
+
+        Args:
+            verify: Run an integrity check on the new snapshot
+        """
+        self.add_message_to_chat("Backing up the chat database...")
+        try:
+            result = await asyncio.to_thread(
+                backup_database, self.db,
+                self.config.get("database.backup_dir") or None,
+                keep=self.config.get("database.backup_keep", 5),
+                verify=verify,
+            )
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.add_message_to_chat(f"Backup failed: {e}")
+            return
+
+        message = (
+            f"Wrote `{result['path']}` ({format_size(result['bytes'])})."
+        )
+        if result["removed"]:
+            message += f" Removed {len(result['removed'])} old snapshots."
+        if result["problems"]:
+            message += "\n\nIntegrity check failed:\n\n" + "\n".join(
+                f"- {problem}" for problem in result["problems"]
+            )
+        elif verify:
+            message += " Integrity check passed."
+        self.add_message_to_chat(message)
+
+    async def export_history(self, path):
+        """Export every chat to a JSONL file and report the result.
+
+        The export streams from its own read connection on a worker thread,
+        so it does not hold up the database thread used by the UI.
+
+        Args:
+            path: Destination file; names ending in .gz are compressed
+        """
+        self.add_message_to_chat(f"Exporting chat history to `{path}`...")
+        try:
+            counts = await asyncio.to_thread(export_history, self.db, path)
+        except (OSError, ValueError) as e:
+            self.add_message_to_chat(f"Export failed: {e}")
+            return
+
+        self.add_message_to_chat(
+            f"Exported {counts['chats']} chats and {counts['messages']} messages."
+        )
+
+    async def import_history(self, path):
+        """Import chats from a JSONL export and refresh the sidebar.
+
+        Args:
+            path: Source file, plain or gzip-compressed
+        """
+        self.add_message_to_chat(f"Importing chat history from `{path}`...")
+        try:
+            counts = await asyncio.to_thread(import_history, self.db, path)
+        except (OSError, ValueError, KeyError) as e:
+            self.add_message_to_chat(f"Import failed: {e}")
+            return
+
+        await self.load_chat_history()
+        self.add_message_to_chat(
+            f"Imported {counts['chats']} new chats and {counts['messages']} new messages."
+        )
+
+    async def delete_chat(self, chat_id):
         """Delete a chat and all its messages.
 
         Args:
             chat_id: The ID of the chat to delete
         """
-        self.db.delete_chat(chat_id)
+        await self.delete_chats([chat_id])
+
+    async def delete_chats(self, chat_ids):
+        """Delete chats, leaving them restorable with /undo for a short while.
+
+        Args:
+            chat_ids: IDs of the chats to delete
+        """
+        deleted = await self.async_db.delete_chats(chat_ids)
+        self.last_deleted_chat_ids = list(chat_ids)
 
         # If we deleted the current chat, create a new one
-        if self.current_chat_id == chat_id:
-            self.create_new_chat()
+        if self.current_chat_id in chat_ids:
+            await self.create_new_chat()
         else:
-            self.load_chat_history()
+            await self.load_chat_history()
+
+        self.add_message_to_chat(
+            f"Deleted {deleted} chat{'s' if deleted != 1 else ''}. "
+            f"Use `/undo` within {self.undo_window} seconds to restore."
+        )
+        self.set_timer(self.undo_window + 1, self.purge_deleted_chats)
+
+    async def undo_delete(self):
+        """Restore the chats removed by the most recent delete."""
+        if not self.last_deleted_chat_ids:
+            self.add_message_to_chat("Nothing to undo.")
+            return
+
+        restored = await self.async_db.undelete_chats(self.last_deleted_chat_ids)
+        self.last_deleted_chat_ids = []
+        await self.load_chat_history()
+
+        if restored:
+            self.add_message_to_chat(
+                f"Restored {restored} chat{'s' if restored != 1 else ''}."
+            )
+        else:
+            self.add_message_to_chat("Those chats have already been purged.")
+
+    @work(exclusive=True, group="purge", exit_on_error=False)
+    async def purge_deleted_chats(self):
+        """Permanently remove chats whose undo window has passed."""
+        # Runs off the database thread: the purge takes the writer in short
+        # batches, so regular saves keep going while it works
+        await asyncio.to_thread(self.db.purge_deleted_chats, self.undo_window)
 
-    def on_button_pressed(self, event: Button.Pressed):
+    async def on_chat_history_list_delete_requested(self, message):
+        """Delete the chats marked in the sidebar.
+
+        Args:
+            message: The ChatHistoryList.DeleteRequested message
+        """
+        await self.delete_chats(message.chat_ids)
+
+    async def on_button_pressed(self, event: Button.Pressed):
         """Handle button presses.
 
         Args:
@@ -243,28 +916,28 @@ class AIChatApp(App):
 
         if button_id and button_id.startswith("delete-"):
             chat_id = int(button_id.split("-")[1])
-            self.delete_chat(chat_id)
             # Stop event propagation to prevent the list item selection
             event.prevent_default()
             event.stop()
+            await self.delete_chat(chat_id)
 
-    def on_list_item_selected(self, event):
+    async def on_list_item_selected(self, event):
         """Handle selection of a chat history item.
 
         Args:
             event: The selection event
         """
         if hasattr(event, 'item') and isinstance(event.item, ChatHistoryItem):
-            self.load_chat(event.item.chat_id)
+            await self.load_chat(event.item.chat_id)
 
-    def on_list_view_selected(self, event):
+    async def on_list_view_selected(self, event):
         """Alternative handler for chat history selection.
 
         Args:
             event: The selection event
         """
         if hasattr(event, 'item') and isinstance(event.item, ChatHistoryItem):
-            self.load_chat(event.item.chat_id)
+            await self.load_chat(event.item.chat_id)
 
     async def on_input_submitted(self, event: Input.Submitted):
         """Handle user input submission.
@@ -283,11 +956,8 @@ class AIChatApp(App):
         # Add user message to chat
         self.add_message_to_chat(user_message, role="user")
 
-        # Get AI response
-        response = await self.save_and_respond_to_message(user_message)
-
-        # Add AI response to chat
-        self.add_message_to_chat(response, role="assistant")
+        # Get AI response; it is shown as it streams in
+        await self.save_and_respond_to_message(user_message)
 
         # Return focus to input after processing
         self.query_one("#user-input").focus()
\ No newline at end of file
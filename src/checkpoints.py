@@ -0,0 +1,176 @@
+"""Rolling summaries that stand in for the early part of long chats.
+
+Trimming a long chat to the newest messages that fit loses what was said at
+the start. Instead, once the messages since the last checkpoint (not
+counting the most recent ones) pass a token threshold, they are summarized
+in the background, usually by a cheaper model, together with the previous
+summary. The result is stored as a checkpoint in ChatDatabase, and later
+requests send the summary plus the messages after it (see build_context()).
+
+Each summary covers no more history than fits the summary model's context.
+A long chat that has never been summarized is worked through in steps, each
+folding the next stretch of history into the summary so far.
+
+Checkpoints are removed by the database when a message they cover is
+edited or deleted, so a stale summary is never sent.
+"""
+
+from src.context import MESSAGE_OVERHEAD, PINNED_ROLES, context_budget
+from src.providers.base import ProviderError
+from src.tokens import count_tokens
+
+# Tokens of unsummarized history, outside the recent messages, that trigger a checkpoint
+DEFAULT_CHECKPOINT_TOKENS = 6000
+
+# Newest messages that are never summarized, so the model sees them verbatim
+DEFAULT_RECENT_MESSAGES = 10
+
+# Most tokens a summary may use
+SUMMARY_MAX_TOKENS = 800
+
+# Seconds to wait before trying a chat again after the provider failed
+CHECKPOINT_RETRY_DELAY = 300
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below so it can replace the original messages "
+    "as context for continuing it. Keep facts, decisions, names, numbers, code "
+    "identifiers and open questions; drop pleasantries. If an earlier summary "
+    "is included, fold it in. Write the summary only, in at most a few paragraphs."
+)
+
+_SPEAKERS = {"user": "User", "assistant": "Assistant"}
+
+
+def summary_span_budget(provider):
+    """Return the tokens of conversation one summary request can take.
+
+    Args:
+        provider: The ChatProvider that writes the summary
+
+    Returns:
+        int: The provider's context budget less the instructions and the
+            previous summary folded into the request
+    """
+    overhead = (
+        count_tokens(SUMMARY_INSTRUCTIONS, provider.tokenizer_family)
+        + SUMMARY_MAX_TOKENS + 2 * MESSAGE_OVERHEAD
+    )
+    return max(context_budget(provider) - overhead, MESSAGE_OVERHEAD + 1)
+
+
+def checkpoint_due(db, chat_id, family, threshold=DEFAULT_CHECKPOINT_TOKENS,
+                   recent=DEFAULT_RECENT_MESSAGES, max_span=None):
+    """Decide whether a chat needs a new checkpoint.
+
+    Args:
+        db: The ChatDatabase holding the chat
+        chat_id: The ID of the chat
+        family: Tokenizer family to measure the history with
+        threshold: Tokens of unsummarized history that trigger a checkpoint
+        recent: Newest messages to leave out of the summary
+        max_span: Most tokens one checkpoint may summarize (see
+            summary_span_budget()); None for no limit. The checkpoint covers
+            at least one message, however long.
+
+    Returns:
+        int: The seq the new checkpoint should cover through, or None if
+            the chat does not need one yet
+    """
+    checkpoint = db.get_checkpoint(chat_id)
+    after_seq = checkpoint[1] if checkpoint else 0
+    pending = [(seq, tokens) for seq, tokens, _ in db.get_token_counts(chat_id, family)
+               if seq > after_seq]
+    older = pending[:-recent] if recent else pending
+    if not older or sum(tokens for _, tokens in older) < threshold:
+        return None
+    if max_span is None:
+        return older[-1][0]
+
+    through_seq, span = older[0][0], 0
+    for seq, tokens in older:
+        span += tokens + MESSAGE_OVERHEAD
+        if span > max_span and seq != older[0][0]:
+            break
+        through_seq = seq
+    return through_seq
+
+
+def format_transcript(previous_summary, messages, family=None, max_tokens=None):
+    """Write out the material for a summary as plain text.
+
+    Args:
+        previous_summary: The summary being extended, or None
+        messages: (seq, role, content) tuples to summarize; pinned system
+            messages are left out, as they are always sent anyway
+        family: Tokenizer family max_tokens is measured in
+        max_tokens: Most tokens of any one message to include; longer ones
+            are cut short. None for no limit.
+
+    Returns:
+        str: The text to summarize
+    """
+    parts = []
+    if previous_summary:
+        parts.append(f"Earlier summary:\n{previous_summary}")
+    for _, role, content in messages:
+        if role not in PINNED_ROLES:
+            if max_tokens is not None:
+                content = _truncate(content, family, max_tokens)
+            parts.append(f"{_SPEAKERS.get(role, role.title())}: {content}")
+    return "\n\n".join(parts)
+
+
+def _truncate(text, family, max_tokens):
+    """Cut text down to at most max_tokens, marking where it was cut."""
+    if count_tokens(text, family) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle], family) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return f"{text[:low].rstrip()} [... {len(text) - low:,} characters omitted]"
+
+
+async def create_checkpoint(async_db, chat_id, provider, through_seq):
+    """Summarize a chat up to through_seq and store it as a checkpoint.
+
+    The summary folds in the previous checkpoint and covers the messages
+    after it; checkpoint_due() keeps that within what the provider can take.
+    A single message too long for it is cut short.
+
+    Args:
+        async_db: The AsyncChatDatabase holding the chat
+        chat_id: The ID of the chat
+        provider: The ChatProvider that writes the summary
+        through_seq: The newest message to summarize
+
+    Returns:
+        bool: True if the checkpoint was stored; False if the messages
+            changed while the summary was written
+
+    Raises:
+        ProviderError: If the provider failed or returned an empty summary
+    """
+    checkpoint_id = await async_db.begin_checkpoint(
+        chat_id, through_seq, model=provider.get_provider_options().get("model")
+    )
+    # Read only after the pending checkpoint exists, so an edit from here
+    # on removes it rather than going unnoticed
+    previous = await async_db.get_checkpoint(chat_id)
+    messages = await async_db.get_chat_messages_range(
+        chat_id, previous[1] if previous else 0, through_seq
+    )
+    transcript = format_transcript(
+        previous[2] if previous else None, messages,
+        family=provider.tokenizer_family, max_tokens=summary_span_budget(provider),
+    )
+    summary = (await provider.complete([
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": transcript},
+    ])).strip()
+    if not summary:
+        raise ProviderError(f"{provider.name} returned an empty summary")
+    return await async_db.complete_checkpoint(checkpoint_id, summary)
@@ -10,7 +10,16 @@ class CommandHandler:
         "/help": "Show available commands",
         "/new": "Start a new chat session",
         "/provider": "Switch or configure the chat provider",
-        "/providers": "List all available chat providers"
+        "/providers": "List all available chat providers",
+        "/search": "Search all chats for messages containing the given words",
+        "/compact": "Compress large stored messages and shrink the database file",
+        "/stats": "Show how much space storing repeated messages once saves",
+        "/attach": "Attach a file to the current chat for the provider to read",
+        "/archive": "Move chats idle for more than N days (default from config) to the archive",
+        "/undo": "Restore the chats removed by the last delete",
+        "/backup": "Snapshot the database while it is in use (add --verify to check it)",
+        "/export": "Export all chats to a JSONL file (use a .gz name to compress)",
+        "/import": "Import chats from a JSONL export file"
     }
     
     def __init__(self, app):
@@ -43,7 +52,7 @@ class CommandHandler:
             return True
         
         elif cmd == "/new":
-            self.app.create_new_chat()
+            self.app.run_worker(self.app.create_new_chat())
             return True
         
         elif cmd == "/provider":
@@ -53,6 +62,40 @@ class CommandHandler:
         elif cmd == "/providers":
             self._list_providers()
             return True
+
+        elif cmd == "/search":
+            self._handle_search_command(args)
+            return True
+
+        elif cmd in ("/export", "/import"):
+            self._handle_transfer_command(cmd, args)
+            return True
+
+        elif cmd == "/compact":
+            self.app.run_worker(
+                self.app.compact_database(), exclusive=True, group="maintenance"
+            )
+            return True
+
+        elif cmd == "/stats":
+            self.app.run_worker(self.app.show_storage_stats())
+            return True
+
+        elif cmd == "/attach":
+            self._handle_attach_command(args)
+            return True
+
+        elif cmd == "/archive":
+            self._handle_archive_command(args)
+            return True
+
+        elif cmd == "/backup":
+            self._handle_backup_command(args)
+            return True
+
+        elif cmd == "/undo":
+            self.app.run_worker(self.app.undo_delete())
+            return True
         
         else:
             self._show_unknown_command(command)
@@ -72,6 +115,61 @@ class CommandHandler:
             f"Unknown command: `{command}`\nType `/help` to see available commands."
         )
     
+    def _handle_search_command(self, args):
+        """Search the chat history for the given words."""
+        query = args.strip()
+        if not query:
+            self.app.add_message_to_chat("Usage: `/search <words>`")
+            return
+
+        self.app.search_history(query)
+
+    def _handle_transfer_command(self, cmd, args):
+        """Start a JSONL export or import of the chat history."""
+        path = args.strip()
+        if not path:
+            self.app.add_message_to_chat(f"Usage: `{cmd} <path>`")
+            return
+
+        if cmd == "/export":
+            work = self.app.export_history(path)
+        else:
+            work = self.app.import_history(path)
+        self.app.run_worker(work, exclusive=True, group="transfer")
+
+    def _handle_attach_command(self, args):
+        """Start storing a file as an attachment of the current chat."""
+        path = args.strip()
+        if not path:
+            self.app.add_message_to_chat("Usage: `/attach <path>`")
+            return
+
+        self.app.run_worker(self.app.attach_file(path), group="attach")
+
+    def _handle_archive_command(self, args):
+        """Start archiving chats that have been idle for longer than N days."""
+        days = args.strip()
+        if days and not days.isdigit():
+            self.app.add_message_to_chat("Usage: `/archive [days]`")
+            return
+
+        self.app.run_worker(
+            self.app.archive_inactive_chats(int(days) if days else None),
+            exclusive=True, group="maintenance"
+        )
+
+    def _handle_backup_command(self, args):
+        """Start an online backup, optionally verifying the snapshot."""
+        options = args.split()
+        if any(option != "--verify" for option in options):
+            self.app.add_message_to_chat("Usage: `/backup [--verify]`")
+            return
+
+        self.app.run_worker(
+            self.app.backup_database(verify=bool(options)),
+            exclusive=True, group="backup"
+        )
+
     def _list_providers(self):
         """List all available providers."""
         available_providers = list(self.app.PROVIDER_CLASSES.keys())
@@ -105,6 +203,16 @@ class CommandHandler:
             
             for option, value in provider_options.items():
                 message += f"- `{option}`: {value}\n"
+
+            cache_stats = self.app.chat_provider.get_cache_stats()
+            if cache_stats and cache_stats["requests"]:
+                message += (
+                    f"\n### Prompt Cache:\n\n"
+                    f"- {cache_stats['hits']} hits, {cache_stats['misses']} misses\n"
+                    f"- {cache_stats['cache_read_input_tokens']} tokens read from the cache, "
+                    f"{cache_stats['cache_creation_input_tokens']} written "
+                    f"({cache_stats['hit_rate']:.0%} of prompt tokens cached)\n"
+                )
             
             message += "\nUse `/provider [name]` to switch providers or `/provider option=value` to set options."
             message += "\nUse `/providers` to see all available providers."
@@ -118,8 +226,10 @@ class CommandHandler:
             option = option.strip()
             value = value.strip()
             
-            # Try to parse value as a number if it looks like one
-            if value.replace(".", "", 1).isdigit():
+            # Try to parse value as a boolean or number if it looks like one
+            if value.lower() in ("true", "false"):
+                value = value.lower() == "true"
+            elif value.replace(".", "", 1).isdigit():
                 try:
                     if "." in value:
                         value = float(value)
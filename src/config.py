@@ -1,5 +1,6 @@
 """Configuration management for TermWave."""
 
+import copy
 import json
 import os
 from pathlib import Path
@@ -8,16 +9,20 @@ from pathlib import Path
 class Config:
     """Manages application configuration."""
     
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, ephemeral=False):
         """Initialize the configuration.
         
         Args:
             config_path: Optional path to the config file. If None, uses default path.
+            ephemeral: If True, start from the defaults and keep every change in
+                memory; the config file is never read, created or written.
         """
+        self.ephemeral = ephemeral
         if config_path is None:
             self.config_path = Path.home() / ".aichat" / "config.json"
             self.config_dir = self.config_path.parent
-            self.config_dir.mkdir(exist_ok=True)
+            if not ephemeral:
+                self.config_dir.mkdir(exist_ok=True)
         else:
             self.config_path = Path(config_path)
             self.config_dir = self.config_path.parent
@@ -48,6 +53,30 @@ class Config:
             },
             "ui": {
                 "theme": "dark"
+            },
+            "http": {
+                "max_connections": 20,
+                "max_keepalive_connections": 10,
+                "keepalive_expiry": 120.0,
+                "http2": True,
+                "timeout": 60.0
+            },
+            "context": {
+                "summarize": True,
+                "checkpoint_tokens": 6000,
+                "recent_messages": 10
+            },
+            "database": {
+                "write_behind": False,
+                "flush_interval": 0.05,
+                "flush_threshold": 64,
+                "archive_after_days": 90,
+                "archive_on_startup": True,
+                "undo_window": 30,
+                "busy_timeout": 5000,
+                "change_poll_interval": 1.0,
+                "backup_dir": "",
+                "backup_keep": 5
             }
         }
         
@@ -59,6 +88,9 @@ class Config:
         Returns:
             dict: The loaded configuration
         """
+        if self.ephemeral:
+            return copy.deepcopy(self.defaults)
+
         if not self.config_path.exists():
             # Create default config
             self.save_config(self.defaults)
@@ -87,6 +119,9 @@ class Config:
         """
         if config is None:
             config = self.config
+
+        if self.ephemeral:
+            return True
         
         try:
             with open(self.config_path, 'w') as f:
@@ -0,0 +1,124 @@
+"""Fit a chat into the context window of the model it is sent to.
+
+Sending every message on every turn makes long chats slow and expensive,
+and eventually fails once they outgrow the model's context window. The
+context builder sends the newest messages that fit instead. The budget is
+the model's window minus the tokens reserved for its reply (the provider's
+``max_tokens`` option). System and persona messages are pinned and always
+sent. If the chat has a summary checkpoint (see src/checkpoints.py), the
+summary is sent in place of the messages it covers. The result says how many
+older messages were left out.
+"""
+
+from src.tokens import count_tokens
+
+# Context window, in tokens, by model name or model name prefix
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o1-mini": 128000,
+    "o3": 200000,
+    "o3-mini": 200000,
+    "o4-mini": 200000,
+    "claude-2": 100000,
+    "claude-2.1": 200000,
+    "claude-3": 200000,
+}
+
+# Window assumed for models not in the table, and for local providers
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens a provider wraps around each message (role markers and separators)
+MESSAGE_OVERHEAD = 4
+
+# Roles of messages that are always sent, however long the chat
+PINNED_ROLES = ("system",)
+
+# Introduces a checkpoint summary among the messages sent
+SUMMARY_HEADING = "Summary of the earlier conversation:"
+
+
+def context_window(model):
+    """Look up the context window of a model.
+
+    Dated or otherwise suffixed names fall back to the longest table entry
+    they start with, e.g. ``gpt-4o-2024-08-06`` to ``gpt-4o``.
+
+    Args:
+        model: The model name, or None
+
+    Returns:
+        int: The context window in tokens
+    """
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    prefixes = [name for name in MODEL_CONTEXT_WINDOWS if model and model.startswith(name)]
+    if prefixes:
+        return MODEL_CONTEXT_WINDOWS[max(prefixes, key=len)]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def context_budget(provider):
+    """Return the tokens available for a provider's prompt.
+
+    Args:
+        provider: The ChatProvider the messages are sent to
+
+    Returns:
+        int: The model's context window less the tokens reserved for the reply
+    """
+    options = provider.get_provider_options()
+    window = context_window(options.get("model"))
+    reserved = options.get("max_tokens") or 0
+    return max(window - reserved, 0)
+
+
+def build_context(db, chat_id, provider, budget=None):
+    """Choose the messages of a chat to send to a provider.
+
+    Args:
+        db: The ChatDatabase holding the chat
+        chat_id: The ID of the chat
+        provider: The ChatProvider the messages are sent to; its tokenizer
+            family and model decide how tokens are counted and the budget
+        budget: Tokens available for the messages. If None, uses
+            context_budget().
+
+    Returns:
+        dict: ``messages`` as (seq, role, content) tuples oldest first,
+            ``tokens`` they use, the ``budget``, the seq a checkpoint
+            summary covers messages ``summarized_through`` (None without
+            one), and the number of older messages ``dropped`` with their
+            ``dropped_tokens``. A summary is a system message with seq None.
+    """
+    if budget is None:
+        budget = context_budget(provider)
+
+    checkpoint = db.get_checkpoint(chat_id)
+    summarized_through, summary, reserved = None, None, 0
+    if checkpoint is not None:
+        summarized_through = checkpoint[1]
+        summary = f"{SUMMARY_HEADING}\n\n{checkpoint[2]}"
+        reserved = count_tokens(summary, provider.tokenizer_family) + MESSAGE_OVERHEAD
+
+    context = db.select_context(
+        chat_id, provider.tokenizer_family, budget,
+        per_message=MESSAGE_OVERHEAD, pinned_roles=PINNED_ROLES,
+        after_seq=summarized_through or 0, reserved=reserved,
+    )
+    if summary is not None:
+        # In place of the messages it covers, after any pinned ones before them
+        messages = context["messages"]
+        position = next(
+            (i for i, (seq, _, _) in enumerate(messages) if seq > summarized_through),
+            len(messages),
+        )
+        messages.insert(position, (None, "system", summary))
+    context["budget"] = budget
+    context["summarized_through"] = summarized_through
+    return context
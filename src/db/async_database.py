@@ -0,0 +1,187 @@
+"""Async facade that keeps SQLite work off the event loop."""
+
+import asyncio
+import queue
+import threading
+
+# Marks the end of a streamed result set
+_END_OF_STREAM = object()
+
+
+def _resolve(future, result=None, error=None):
+    """Complete a future from the event loop thread unless it was cancelled."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class AsyncChatDatabase:
+    """Runs ChatDatabase calls on a dedicated thread and awaits their results.
+
+    Every public ChatDatabase method is available here as a coroutine with the
+    same arguments, e.g. ``await async_db.get_chat_info(chat_id)``. Requests
+    are queued and executed one at a time on the database thread, so the
+    Textual event loop never waits on disk I/O. The wrapped ChatDatabase keeps
+    working synchronously for tests and scripts.
+    """
+
+    def __init__(self, db):
+        """Wrap a database.
+
+        Args:
+            db: The ChatDatabase to run queries against
+        """
+        self.db = db
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_thread(self):
+        """Start the database thread on first use."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AsyncChatDatabase is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="termwave-db", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        """Execute queued requests until the stop sentinel arrives."""
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+
+            func, args, kwargs, loop, future = request
+            result, error = None, None
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as exc:
+                error = exc
+
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                # The caller's event loop has already shut down
+                pass
+
+    async def call(self, func, *args, **kwargs):
+        """Run a function on the database thread and wait for its result.
+
+        Args:
+            func: The callable to run
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            Whatever func returns. Exceptions raised by func are re-raised here.
+        """
+        self._ensure_thread()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests.put((func, args, kwargs, loop, future))
+        return await future
+
+    async def stream(self, func, *args, **kwargs):
+        """Iterate a generator on the database thread, yielding rows as they arrive.
+
+        Args:
+            func: A callable returning an iterable of rows
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Yields:
+            Each item produced by the iterable
+        """
+        loop = asyncio.get_running_loop()
+        rows = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for row in func(*args, **kwargs):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(rows.put_nowait, row)
+            except BaseException as error:
+                loop.call_soon_threadsafe(rows.put_nowait, error)
+            finally:
+                loop.call_soon_threadsafe(rows.put_nowait, _END_OF_STREAM)
+
+        self._ensure_thread()
+        self._requests.put((produce, (), {}, loop, loop.create_future()))
+
+        try:
+            while True:
+                row = await rows.get()
+                if row is _END_OF_STREAM:
+                    return
+                if isinstance(row, BaseException):
+                    raise row
+                yield row
+        finally:
+            # Let the producer stop early if the consumer goes away
+            stop.set()
+
+    def search_messages(self, query, limit=50):
+        """Stream full-text search results. See ChatDatabase.search_messages."""
+        return self.stream(self.db.search_messages, query, limit)
+
+    async def iter_attachment(self, attachment_id):
+        """Read an attachment one chunk at a time. See ChatDatabase.iter_attachment.
+
+        Unlike stream(), each chunk is only read once the previous one has been
+        consumed, so a slow consumer never has the whole file queued in memory.
+        Chunks are read on a worker thread to keep the database thread free for
+        other requests.
+
+        Args:
+            attachment_id: The ID of the attachment
+
+        Yields:
+            bytes: Successive chunks of the file
+        """
+        chunks = self.db.iter_attachment(attachment_id)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await asyncio.to_thread(chunks.close)
+
+    def __getattr__(self, name):
+        """Expose public ChatDatabase methods as coroutines."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            return await self.call(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    def close(self):
+        """Finish queued requests, stop the thread and close the database."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+
+        if thread is not None:
+            self._requests.put(None)
+            thread.join()
+        self.db.close()
@@ -0,0 +1,195 @@
+"""Online snapshots of the chat database.
+
+Snapshots are taken with ``VACUUM INTO``, which copies the database as of
+a single read transaction. Under WAL, other connections keep reading and
+writing meanwhile, and unlike the online backup API their commits do not
+restart the copy. Each snapshot is written to a temporary name and renamed
+once complete, so a snapshot file is never half written.
+
+Snapshots are named ``<db name>-<UTC timestamp>.db``, with the timestamp to
+the microsecond so that snapshots never replace each other. If the database has an
+archive, it is copied alongside as ``<db name>-<UTC timestamp>.archive.db``,
+the name ChatDatabase looks for, so a snapshot can be opened directly.
+
+persist_database() uses the same copy to save an ephemeral, in-memory
+database to a file that can be opened later with ``--db``.
+"""
+
+import datetime
+import os
+import sqlite3
+from pathlib import Path
+
+from src.db.database import ARCHIVE_SCHEMA
+
+# Number of snapshots kept by default
+DEFAULT_KEEP = 5
+
+_ARCHIVE_SUFFIX = ".archive.db"
+
+
+def default_backup_dir(db):
+    """Return the default snapshot directory for a database.
+
+    Args:
+        db: The ChatDatabase being backed up
+
+    Returns:
+        Path: A ``backups`` directory next to the database file
+
+    Raises:
+        ValueError: If the database is ephemeral and so has no file to sit next to
+    """
+    if db.ephemeral:
+        raise ValueError("An in-memory database has no default backup directory")
+    return Path(db.db_path).parent / "backups"
+
+
+def _snapshot_stem(db):
+    """Return the name snapshots of a database start with."""
+    return "ephemeral" if db.ephemeral else Path(db.db_path).stem
+
+
+def _copy_database(source_path, dest_path):
+    """Copy one database file with VACUUM INTO.
+
+    Args:
+        source_path: The live database file, or a ``file:`` URI
+        dest_path: Where to write the copy
+
+    Returns:
+        int: The number of pages copied
+    """
+    partial_path = dest_path.with_name(dest_path.name + ".partial")
+    partial_path.unlink(missing_ok=True)
+    source = sqlite3.connect(source_path, uri=str(source_path).startswith("file:"))
+    try:
+        # The copy is a self-contained file in rollback-journal mode
+        source.execute("VACUUM INTO ?", (str(partial_path),))
+    finally:
+        source.close()
+
+    dest = sqlite3.connect(partial_path)
+    try:
+        page_count = dest.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dest.close()
+
+    os.replace(partial_path, dest_path)
+    return page_count
+
+
+def verify_snapshot(path):
+    """Run SQLite's integrity check on a snapshot.
+
+    Args:
+        path: The snapshot file
+
+    Returns:
+        list: Problems reported by ``PRAGMA integrity_check``; empty if the
+            snapshot is sound
+    """
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def list_snapshots(db, directory=None):
+    """List a database's snapshots, oldest first.
+
+    Args:
+        db: The ChatDatabase whose snapshots to list
+        directory: Snapshot directory. If None, uses default_backup_dir().
+
+    Returns:
+        list: Paths of the main snapshot files
+    """
+    directory = Path(directory).expanduser() if directory else default_backup_dir(db)
+    stem = _snapshot_stem(db)
+    return sorted(
+        path for path in directory.glob(f"{stem}-*.db")
+        if not path.name.endswith(_ARCHIVE_SUFFIX)
+    )
+
+
+def backup_database(db, directory=None, keep=DEFAULT_KEEP, verify=False):
+    """Write a snapshot of the database and rotate out old ones.
+
+    Args:
+        db: The ChatDatabase to back up
+        directory: Snapshot directory. If None, uses default_backup_dir().
+        keep: Number of snapshots to keep, including the new one
+        verify: Run an integrity check on the new snapshot
+
+    Returns:
+        dict: ``path`` of the snapshot, ``bytes`` written, ``removed`` list of
+            rotated-out snapshots, and ``problems`` found by the integrity
+            check (None if verify is False)
+    """
+    directory = Path(directory).expanduser() if directory else default_backup_dir(db)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Queued messages belong in the snapshot
+    db.flush()
+
+    stamp = datetime.datetime.now(datetime.UTC).strftime("%Y%m%d-%H%M%S%f")
+    base = f"{_snapshot_stem(db)}-{stamp}"
+    snapshot = directory / f"{base}.db"
+
+    _copy_database(db.db_path, snapshot)
+    written = snapshot.stat().st_size
+
+    snapshots = [snapshot]
+    if db.pool.is_attached(ARCHIVE_SCHEMA):
+        archive_snapshot = directory / f"{base}{_ARCHIVE_SUFFIX}"
+        _copy_database(db.archive_path, archive_snapshot)
+        written += archive_snapshot.stat().st_size
+        snapshots.append(archive_snapshot)
+
+    problems = None
+    if verify:
+        problems = [problem for path in snapshots for problem in verify_snapshot(path)]
+
+    removed = []
+    for old in list_snapshots(db, directory)[:-keep] if keep > 0 else []:
+        old.unlink()
+        old.with_name(old.stem + _ARCHIVE_SUFFIX).unlink(missing_ok=True)
+        removed.append(old)
+
+    return {
+        "path": snapshot,
+        "bytes": written,
+        "removed": removed,
+        "problems": problems,
+    }
+
+
+def persist_database(db, path, overwrite=False):
+    """Save a copy of the database, typically an ephemeral one, to a file.
+
+    The copy is a self-contained database file that ChatDatabase can open
+    directly. Unlike backup_database() it is written to exactly ``path`` and
+    nothing is rotated.
+
+    Args:
+        db: The ChatDatabase to save
+        path: The file to write
+        overwrite: Replace the file if it already exists
+
+    Returns:
+        dict: ``path`` written and its size in ``bytes``
+
+    Raises:
+        FileExistsError: If the file exists and overwrite is False
+    """
+    path = Path(path).expanduser()
+    if path.exists() and not overwrite:
+        raise FileExistsError(f"{path} already exists")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    db.flush()
+    _copy_database(db.db_path, path)
+    return {"path": path, "bytes": path.stat().st_size}
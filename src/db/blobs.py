@@ -0,0 +1,82 @@
+"""Content-addressed storage of large message bodies.
+
+A body of at least ``BLOB_THRESHOLD`` bytes is stored once in the ``blobs``
+table, keyed by the SHA-256 of its text, and each message holding it points
+there through ``messages.blob_hash`` with its own content left NULL. Pasting
+the same file into many chats therefore stores it once.
+
+``blobs.refcount`` counts the messages pointing at each blob. Triggers on
+``messages`` keep it up to date and drop a blob once nothing refers to it,
+so insert and delete paths only have to make sure the blob exists first.
+The live and archive databases each have their own blobs table.
+"""
+
+import hashlib
+
+from src.db.compression import compress
+
+# Bodies smaller than this many UTF-8 bytes are kept inline in messages
+BLOB_THRESHOLD = 2048
+
+# SQL for a message's plain text, wherever it is stored. ``{row}`` is the
+# messages alias (or new/old in a trigger) and ``{blobs}`` the blobs table.
+_BODY_SQL = (
+    "CASE WHEN {row}.blob_hash IS NULL THEN tw_decompress({row}.codec, {row}.content) "
+    "ELSE (SELECT tw_decompress(b.codec, b.content) FROM {blobs} b "
+    "WHERE b.hash = {row}.blob_hash) END"
+)
+
+
+def body_sql(row="m", schema=None):
+    """Return a SQL expression for the plain text of a message row.
+
+    Args:
+        row: The alias of the messages table in the query
+        schema: Schema holding the blobs table. If None, the name is left
+            unqualified, as triggers and views require.
+
+    Returns:
+        str: The SQL expression
+    """
+    blobs = f"{schema}.blobs" if schema else "blobs"
+    return _BODY_SQL.format(row=row, blobs=blobs)
+
+
+def content_hash(text):
+    """Return the key a message body is stored under.
+
+    Args:
+        text: The message body
+
+    Returns:
+        str: The hex SHA-256 digest of the UTF-8 text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def store_blob(conn, text, compression_threshold, schema="main"):
+    """Make sure a body is stored as a blob and return its hash.
+
+    The body is only compressed and written if no identical blob exists.
+    The reference itself is counted by the messages insert trigger.
+
+    Args:
+        conn: The writer connection, inside a transaction
+        text: The message body
+        compression_threshold: Passed to compress() for new blobs
+        schema: Schema holding the blobs table
+
+    Returns:
+        str: The blob's hash, for messages.blob_hash
+    """
+    digest = content_hash(text)
+    exists = conn.execute(
+        f"SELECT 1 FROM {schema}.blobs WHERE hash = ?", (digest,)
+    ).fetchone()
+    if exists is None:
+        codec, payload = compress(text, compression_threshold)
+        conn.execute(
+            f"INSERT INTO {schema}.blobs (hash, codec, content, size) VALUES (?, ?, ?, ?)",
+            (digest, codec, payload, len(text.encode("utf-8")))
+        )
+    return digest
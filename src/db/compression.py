@@ -0,0 +1,88 @@
+"""Transparent compression of large message bodies.
+
+Bodies at or above a size threshold are stored compressed, with the codec
+recorded next to the row. Small bodies stay plain TEXT (codec NULL), since
+compressing them costs more than it saves. zstd is used when the optional
+``zstandard`` package is installed; zlib is always available.
+"""
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+
+# Bodies smaller than this many UTF-8 bytes are stored as plain text
+COMPRESSION_THRESHOLD = 1024
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+
+def default_codec():
+    """Return the best codec available in this environment.
+
+    Returns:
+        str: CODEC_ZSTD if zstandard is installed, otherwise CODEC_ZLIB
+    """
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def compress(text, threshold=COMPRESSION_THRESHOLD, codec=None):
+    """Encode a message body for storage.
+
+    Args:
+        text: The message body
+        threshold: Minimum size in bytes before compression is attempted
+        codec: Codec to use. If None, uses default_codec().
+
+    Returns:
+        tuple: (codec, payload) where codec is None and payload is the original
+            text if the body was left uncompressed
+    """
+    if text is None:
+        return None, None
+
+    raw = text.encode("utf-8")
+    if len(raw) < threshold:
+        return None, text
+
+    codec = codec or default_codec()
+    if codec == CODEC_ZSTD:
+        payload = zstandard.ZstdCompressor(level=3).compress(raw)
+    else:
+        codec = CODEC_ZLIB
+        payload = zlib.compress(raw, 6)
+
+    # Incompressible data (already compressed, random) is kept as is
+    if len(payload) >= len(raw):
+        return None, text
+    return codec, payload
+
+
+def decompress(codec, payload):
+    """Decode a stored message body.
+
+    Also registered as the ``tw_decompress`` SQL function on every connection
+    of the app, so its queries can read plain text.
+
+    Args:
+        codec: The codec recorded for the row, or None for plain text
+        payload: The stored content
+
+    Returns:
+        str: The original message body
+    """
+    if codec is None or payload is None:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError(
+                "This message is zstd-compressed; install the 'zstandard' package to read it"
+            )
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown message codec: {codec}")
@@ -0,0 +1,295 @@
+"""Connection management for the chat database."""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from src.db.compression import decompress
+
+# Settings applied to every connection. WAL lets readers run alongside the
+# writer, and NORMAL sync is safe under WAL while avoiding an fsync per commit.
+DEFAULT_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # Negative values are KiB, so this is ~16 MB
+    "mmap_size": 268435456,  # 256 MB
+    "temp_store": "MEMORY",
+    # Wait up to 5 s for another process's write to finish instead of failing
+    "busy_timeout": 5000,
+}
+
+# Errors that mean another connection holds the lock and a retry may succeed
+_BUSY_MESSAGES = ("database is locked", "database is busy")
+
+# URI of a named in-memory database shared by every connection that opens it
+_MEMORY_URI = "file:{name}?mode=memory&cache=shared"
+
+
+def memory_uri(name):
+    """Return the URI of a named, shared-cache in-memory database.
+
+    Every connection in the process that opens the same URI sees the same
+    database, and it is freed when the last of them closes.
+
+    Args:
+        name: Name that identifies the database within the process
+
+    Returns:
+        str: A ``file:`` URI to pass as a ConnectionPool's db_path
+    """
+    return _MEMORY_URI.format(name=name)
+
+
+def is_memory_path(db_path):
+    """Return True if db_path names an in-memory database rather than a file."""
+    path = str(db_path)
+    return path == ":memory:" or (path.startswith("file:") and "mode=memory" in path)
+
+
+class ConnectionPool:
+    """Owns one writer connection and a small pool of reader connections.
+
+    Connections are opened once and reused for the lifetime of the pool, so
+    individual queries no longer pay for opening the file, parsing the schema
+    and warming the page cache.
+
+    ``db_path`` may also be a ``file:`` URI from memory_uri(), in which case
+    every connection shares one in-memory database and nothing is written
+    to disk.
+    """
+
+    def __init__(self, db_path, readers=2, cached_statements=256, pragmas=None,
+                 busy_retries=3, retry_delay=0.1):
+        """Open the connections.
+
+        Args:
+            db_path: Path to the SQLite database file, or a ``file:`` URI
+            readers: Number of read-only connections to keep in the pool
+            cached_statements: Size of each connection's prepared statement cache
+            pragmas: Optional dict of PRAGMA overrides merged over DEFAULT_PRAGMAS
+            busy_retries: How many more times to try starting a write
+                transaction when another process still holds the lock after
+                ``busy_timeout``
+            retry_delay: Seconds to wait before the first retry; doubles each time
+        """
+        self.db_path = db_path
+        self.in_memory = is_memory_path(db_path)
+        self.cached_statements = cached_statements
+        self.busy_retries = busy_retries
+        self.retry_delay = retry_delay
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._closed = False
+
+        # Databases to ATTACH, applied lazily to each connection on its next use
+        self._attachments = {}
+        self._attached = {}
+
+        self._writer = self._connect()
+        if not self.in_memory:
+            self._writer.execute("PRAGMA journal_mode=WAL")
+
+        # Shared-cache connections lock whole tables, and a locked table fails
+        # at once rather than waiting out busy_timeout. An in-memory database
+        # is therefore read through the writer, under the write lock.
+        self._readers = queue.Queue()
+        self._all_readers = []
+        for _ in range(0 if self.in_memory else max(1, readers)):
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.put(conn)
+            self._all_readers.append(conn)
+
+    def _connect(self):
+        """Open a single connection with the pool's settings applied.
+
+        Returns:
+            sqlite3.Connection: The new connection
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            uri=str(self.db_path).startswith("file:"),
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+
+        # Lets the app's queries read compressed message bodies. The schema
+        # itself never calls it, so other tools can still write to the file.
+        conn.create_function("tw_decompress", 2, decompress, deterministic=True)
+        self._attached[conn] = set()
+        return conn
+
+    def attach(self, alias, path, synchronous=None):
+        """ATTACH another database file to every connection under an alias.
+
+        ATTACH is not allowed inside a transaction, so each connection picks
+        the database up the next time it is borrowed rather than immediately.
+
+        Args:
+            alias: Schema name the database is queried under
+            path: Path to the database file
+            synchronous: Optional ``PRAGMA synchronous`` level for the attached
+                database. If None, uses the pool's own setting.
+        """
+        self._attachments[alias] = (str(path), synchronous or self.pragmas["synchronous"])
+
+    def is_attached(self, alias):
+        """Return True if ``alias`` has been registered with attach()."""
+        return alias in self._attachments
+
+    def _apply_attachments(self, conn):
+        """ATTACH any registered databases this connection is still missing."""
+        attached = self._attached[conn]
+        for alias, (path, synchronous) in list(self._attachments.items()):
+            if alias not in attached and not conn.in_transaction:
+                # Reload a stale main schema first, otherwise unqualified table
+                # names can resolve to the attached database instead
+                conn.execute("SELECT 1 FROM main.sqlite_master LIMIT 1").fetchall()
+                conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+                conn.execute(f"PRAGMA {alias}.synchronous={synchronous}")
+                attached.add(alias)
+
+    @contextmanager
+    def writer(self):
+        """Borrow the writer connection inside a transaction.
+
+        Nested use from the same thread joins the outer transaction; only the
+        outermost block commits, and any exception rolls the whole thing back.
+
+        Yields:
+            sqlite3.Connection: The writer connection
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                if self._write_depth == 1 and not self._writer.in_transaction:
+                    self._apply_attachments(self._writer)
+                    # Take the write lock up front so DDL is transactional too
+                    self._begin_immediate()
+                yield self._writer
+            except BaseException:
+                if self._write_depth == 1:
+                    self._writer.rollback()
+                raise
+            else:
+                if self._write_depth == 1:
+                    self._writer.commit()
+            finally:
+                self._write_depth -= 1
+
+    def _begin_immediate(self):
+        """Start a write transaction, retrying while another process holds the lock."""
+        delay = self.retry_delay
+        for attempt in range(self.busy_retries + 1):
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == self.busy_retries or not is_busy_error(e):
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def data_version(self):
+        """Return a number that changes whenever another connection commits.
+
+        Every write in this process goes through the writer connection, so
+        reading ``PRAGMA data_version`` there only changes when a different
+        process has written to the file. It does not touch the database
+        pages, so polling it is cheap.
+
+        Returns:
+            int: The writer connection's data_version
+        """
+        with self._write_lock:
+            return self._writer.execute("PRAGMA data_version").fetchone()[0]
+
+    @contextmanager
+    def writer_connection(self):
+        """Borrow the writer connection outside of a transaction.
+
+        For reading and tidying the writer's TEMP tables, which no other
+        connection can see. Statements commit as they run and must not
+        touch the main database.
+
+        Yields:
+            sqlite3.Connection: The writer connection
+        """
+        with self._write_lock:
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    self._writer.commit()
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool.
+
+        For an in-memory database this is the writer connection, held under
+        the write lock so reads wait for a write in progress to finish.
+
+        Yields:
+            sqlite3.Connection: A reader connection
+        """
+        if self.in_memory:
+            with self._write_lock:
+                self._apply_attachments(self._writer)
+                yield self._writer
+            return
+
+        conn = self._readers.get()
+        try:
+            self._apply_attachments(conn)
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def vacuum(self):
+        """Rebuild the database file to release free pages.
+
+        VACUUM cannot run inside a transaction, so this takes the write lock
+        and runs it directly on the writer connection.
+        """
+        with self._write_lock:
+            if self._writer.in_transaction:
+                self._writer.commit()
+            self._writer.execute("VACUUM")
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Close every connection. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+
+        with self._write_lock:
+            self._writer.close()
+        for conn in self._all_readers:
+            conn.close()
+
+    @property
+    def closed(self):
+        """Return True once the pool has been closed."""
+        return self._closed
+
+
+def is_busy_error(error):
+    """Return True if a SQLite error means the database was locked by someone else.
+
+    Args:
+        error: The exception raised by sqlite3
+
+    Returns:
+        bool: True for ``database is locked`` and ``database is busy`` errors
+    """
+    return isinstance(error, sqlite3.OperationalError) and any(
+        message in str(error) for message in _BUSY_MESSAGES
+    )
@@ -1,193 +1,1750 @@
 """Database operations for storing chat history."""
 
-import sqlite3
+import hashlib
+import itertools
+import mimetypes
+import mmap
+import uuid
 from pathlib import Path
 
+from src.db.blobs import BLOB_THRESHOLD, body_sql, store_blob
+from src.db.compression import COMPRESSION_THRESHOLD, compress
+from src.db.connection import ConnectionPool, is_memory_path, memory_uri
+from src.db.migrations import migrate
+from src.db.text import make_preview
+from src.db.write_behind import WriteBehindQueue
+from src.tokens import TOKENIZER_FAMILIES, count_tokens_by_family
+
+# Schema name the archive database is attached under
+ARCHIVE_SCHEMA = "archive"
+
+# Attachments are stored in chunks of this many bytes
+ATTACHMENT_CHUNK_SIZE = 1 << 20
+
+# Chunks written per transaction, so a large upload lets other writes through
+_CHUNKS_PER_TRANSACTION = 16
+
+# Completed checkpoints kept per chat; older ones are superseded
+CHECKPOINTS_KEPT = 3
+
+# Number of change_log entries kept for other processes to catch up from
+CHANGE_LOG_RETENTION = 10000
+
+# Each message's (seq, tokens) for one tokenizer family. Messages the
+# backfill has not reached yet are estimated from their length.
+_TOKENS_SQL = (
+    "SELECT m.seq AS seq, m.role AS role, "
+    "COALESCE(t.tokens, (length({body}) + 3) / 4) AS tokens "
+    "FROM {schema}.messages m "
+    "LEFT JOIN main.message_tokens t "
+    "ON t.chat_id = m.chat_id AND t.family = ? AND t.seq = m.seq "
+    "WHERE m.chat_id = ?"
+)
+
+# Columns copied when messages move between the live and archive databases.
+# Row ids are left out so each side assigns its own.
+_MESSAGE_COLUMNS = "chat_id, seq, role, codec, content, blob_hash, timestamp"
+
 
 class ChatDatabase:
     """Handles all database operations for chat storage."""
-    
-    def __init__(self, db_path=None):
+
+    def __init__(self, db_path=None, read_pool_size=2, write_behind=False,
+                 flush_interval=0.05, flush_threshold=64,
+                 compression_threshold=COMPRESSION_THRESHOLD, archive_path=None,
+                 busy_timeout=5000, ephemeral=False, token_families=TOKENIZER_FAMILIES,
+                 blob_threshold=BLOB_THRESHOLD):
         """Initialize the database.
-        
+
         Args:
             db_path: Optional path to the database file. If None, uses default path.
+            read_pool_size: Number of pooled read-only connections to keep open
+            write_behind: If True, save_message queues messages in memory and
+                writes them in grouped transactions instead of one commit each
+            flush_interval: Seconds a queued message may wait before being written
+            flush_threshold: Number of queued messages that forces a write
+            compression_threshold: Message bodies of at least this many bytes
+                are stored compressed
+            archive_path: Optional path to the archive database that inactive
+                chats are moved to. If None, uses ``<db name>.archive.db``
+                next to the database file.
+            busy_timeout: Milliseconds to wait for another process's write
+                before giving up on the lock
+            ephemeral: If True, keep the database in memory instead of a file.
+                db_path is ignored, nothing is written to disk, and the
+                history is gone once the database is closed unless it is
+                saved with persist_database() first.
+            token_families: Tokenizer families whose token counts are stored
+                for each message as it is written
+            blob_threshold: Message bodies of at least this many bytes are
+                stored once per distinct text in the blobs table
         """
-        if db_path is None:
+        if ephemeral:
+            # A unique name keeps separate ephemeral databases apart
+            self.db_path = memory_uri(f"termwave-{uuid.uuid4().hex}")
+        elif db_path is None:
             self.db_path = Path.home() / ".aichat" / "chat_history.db"
             self.db_path.parent.mkdir(exist_ok=True)
         else:
             self.db_path = db_path
-            
+
+        self.read_pool_size = read_pool_size
+        self.compression_threshold = compression_threshold
+        self.blob_threshold = blob_threshold
+        self.archive_path_option = archive_path
+        self.archive_path = None
+        self.busy_timeout = busy_timeout
+        self.token_families = tuple(token_families)
+        self.pool = None
+
+        # Where poll_changes() left off
+        self._data_version = None
+        self._change_cursor = 0
+
+        # Reads flush this first, so callers always see their own writes
+        self.write_queue = None
+        if write_behind:
+            self.write_queue = WriteBehindQueue(
+                self._write_messages, interval=flush_interval, threshold=flush_threshold
+            )
+
         self.init_database()
-    
+
     def init_database(self):
-        """Initialize the SQLite database with required tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create chats table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chats (
-            id INTEGER PRIMARY KEY,
-            title TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create messages table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY,
-            chat_id INTEGER,
-            role TEXT,
-            content TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (chat_id) REFERENCES chats (id)
+        """Open the connection pool and migrate the schema to the latest version.
+
+        If the pool is already open on a different path (for example after
+        ``db_path`` was reassigned), it is closed and reopened on the new path.
+        An existing archive database is migrated and attached as well.
+        """
+        if self.pool is not None:
+            if not self.pool.closed and self.pool.db_path == self.db_path:
+                migrate(self.pool)
+                return
+            self.flush()
+            self.pool.close()
+
+        self.pool = ConnectionPool(
+            self.db_path, readers=self.read_pool_size,
+            pragmas={"busy_timeout": self.busy_timeout}
         )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
+        migrate(self.pool)
+
+        # Note the change log entries our own writes add, so poll_changes()
+        # can skip them; TEMP objects only exist on the writer connection
+        with self.pool.writer() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS own_changes (id INTEGER PRIMARY KEY)")
+            conn.execute(
+                "CREATE TEMP TRIGGER IF NOT EXISTS change_log_own AFTER INSERT ON main.change_log "
+                "BEGIN INSERT OR REPLACE INTO own_changes (id) VALUES (new.id); END"
+            )
+
+        # Changes made before we opened the file are already on screen
+        self._data_version = self.pool.data_version()
+        with self.pool.reader() as conn:
+            self._change_cursor = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM change_log"
+            ).fetchone()[0]
+
+        self.archive_path = self.archive_path_option
+        if self.archive_path is None and not self.ephemeral:
+            db_path = Path(self.db_path)
+            self.archive_path = db_path.with_name(db_path.stem + ".archive.db")
+        self._open_archive(create=False)
+
+    @property
+    def ephemeral(self):
+        """Return True if the database lives in memory rather than in a file."""
+        return is_memory_path(self.db_path)
+
+    def _open_archive(self, create):
+        """Migrate the archive database and attach it to the pool.
+
+        Args:
+            create: Create the archive file if it does not exist yet
+
+        Returns:
+            bool: True if the archive is attached. An ephemeral database has
+                no archive, so this is always False for one.
+        """
+        if self.pool.is_attached(ARCHIVE_SCHEMA):
+            return True
+        if self.archive_path is None:
+            return False
+        if not create and not Path(self.archive_path).exists():
+            return False
+
+        # The archive shares the live schema, search index included
+        archive_pool = ConnectionPool(self.archive_path, readers=1)
+        try:
+            migrate(archive_pool)
+        finally:
+            archive_pool.close()
+
+        # Archived messages are deleted from the live database once the copy
+        # commits, so that commit must reach the disk first
+        self.pool.attach(ARCHIVE_SCHEMA, self.archive_path, synchronous="FULL")
+        return True
+
+    def _message_schema(self, conn, chat_id):
+        """Return the schema that holds a chat's messages.
+
+        Args:
+            conn: An open pool connection
+            chat_id: The ID of the chat
+
+        Returns:
+            str: ``"main"``, or ARCHIVE_SCHEMA if the chat has been archived
+        """
+        row = conn.execute(
+            "SELECT archived_at FROM main.chats WHERE id = ?", (chat_id,)
+        ).fetchone()
+        if row and row[0] is not None and self.pool.is_attached(ARCHIVE_SCHEMA):
+            return ARCHIVE_SCHEMA
+        return "main"
+
+    def flush(self):
+        """Write any messages queued in write-behind mode.
+
+        Returns:
+            int: The number of messages written
+        """
+        if self.write_queue is None or self.pool is None or self.pool.closed:
+            return 0
+        return self.write_queue.flush()
+
+    def close(self):
+        """Flush queued messages and close all database connections.
+
+        Safe to call more than once.
+        """
+        if self.pool is not None:
+            self.flush()
+            self.pool.close()
+
     def create_new_chat(self, title="New Chat"):
         """Create a new chat in the database.
-        
+
         Args:
             title: The title for the new chat
-            
+
         Returns:
             int: The ID of the newly created chat
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO chats (title) VALUES (?)",
-            (title,)
-        )
-        chat_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
+        with self.pool.writer() as conn:
+            return self._insert_chat(conn, title)
+
+    def start_chat(self, role, content, title="New Chat"):
+        """Create a chat together with its first message in one transaction.
+
+        The chat row never exists without a message, so an interrupted start
+        or a concurrent delete_empty_chats() cannot leave an empty chat.
+
+        Args:
+            role: The role of the first message's sender
+            content: The content of the first message
+            title: The title for the chat, replaced by the first user message
+
+        Returns:
+            int: The ID of the new chat
+        """
+        with self.pool.writer() as conn:
+            chat_id = self._insert_chat(conn, title)
+            self._insert_message(conn, chat_id, role, content)
         return chat_id
-    
-    def get_all_chats(self):
-        """Get all chats from the database.
-        
+
+    def _insert_chat(self, conn, title):
+        """Insert a chat row.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            title: The title for the chat
+
         Returns:
-            list: List of tuples containing (id, title, timestamp)
+            int: The ID of the new chat
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, title, created_at FROM chats ORDER BY created_at DESC"
+        cursor = conn.execute(
+            "INSERT INTO chats (uuid, title, last_message_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (str(uuid.uuid4()), title)
         )
-        chats = cursor.fetchall()
-        conn.close()
-        
-        return chats
-    
+        return cursor.lastrowid
+
+    def get_all_chats(self):
+        """Get all chats from the database, most recently active first.
+
+        Deleted chats waiting to be purged are left out.
+
+        Returns:
+            list: List of tuples containing
+                (id, title, last_message_at, message_count, preview)
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT id, title, last_message_at, message_count, preview "
+                "FROM chats WHERE deleted_at IS NULL ORDER BY last_message_at DESC"
+            ).fetchall()
+
+    def get_chats(self, chat_ids):
+        """Get the sidebar rows of specific chats.
+
+        Args:
+            chat_ids: IDs of the chats to fetch
+
+        Returns:
+            list: Tuples as returned by get_all_chats() for the chats that
+                exist and are not deleted, most recently active first
+        """
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return []
+
+        self.flush()
+        placeholders = ",".join("?" * len(chat_ids))
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT id, title, last_message_at, message_count, preview FROM chats "
+                f"WHERE id IN ({placeholders}) AND deleted_at IS NULL "
+                "ORDER BY last_message_at DESC",
+                chat_ids
+            ).fetchall()
+
+    def poll_changes(self):
+        """Find chats that another process has changed since the last poll.
+
+        The check is a single ``PRAGMA data_version`` when nothing changed;
+        only then is the change log read. Entries made by our own writes are
+        skipped, so a chat we are writing to is not reported as changed.
+
+        Returns:
+            set: IDs of the chats that changed, including deleted ones. If the
+                log was pruned past our last poll, every chat ID is returned.
+        """
+        version = self.pool.data_version()
+        if version == self._data_version:
+            return set()
+        self._data_version = version
+
+        # Another process may have created the archive file
+        self._open_archive(create=False)
+
+        with self.pool.reader() as conn:
+            oldest = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+            if oldest is not None and oldest > self._change_cursor + 1:
+                changed = {row[0] for row in conn.execute("SELECT id FROM chats")}
+                self._change_cursor = conn.execute(
+                    "SELECT MAX(id) FROM change_log"
+                ).fetchone()[0]
+                self._forget_own_changes()
+                return changed
+
+            entries = conn.execute(
+                "SELECT id, chat_id FROM change_log WHERE id > ? ORDER BY id",
+                (self._change_cursor,)
+            ).fetchall()
+
+        if not entries:
+            return set()
+        own = self._forget_own_changes(entries[-1][0])
+        self._change_cursor = entries[-1][0]
+        return {chat_id for change_id, chat_id in entries if change_id not in own}
+
+    def _forget_own_changes(self, through_id=None):
+        """Take the IDs of change log entries our own writes made.
+
+        Args:
+            through_id: Take entries up to this ID; if None, take them all
+
+        Returns:
+            set: The IDs taken
+        """
+        where = "" if through_id is None else " WHERE id <= ?"
+        params = () if through_id is None else (through_id,)
+        with self.pool.writer_connection() as conn:
+            own = {row[0] for row in conn.execute(
+                f"SELECT id FROM temp.own_changes{where}", params
+            )}
+            conn.execute(f"DELETE FROM temp.own_changes{where}", params)
+        return own
+
+    def prune_change_log(self, keep=CHANGE_LOG_RETENTION):
+        """Drop old change log entries.
+
+        Args:
+            keep: Number of most recent entries to keep
+
+        Returns:
+            int: The number of entries removed
+        """
+        with self.pool.writer() as conn:
+            removed = conn.execute(
+                "DELETE FROM change_log WHERE id <= (SELECT MAX(id) FROM change_log) - ?",
+                (keep,)
+            ).rowcount
+            conn.execute(
+                "DELETE FROM own_changes WHERE id < (SELECT COALESCE(MIN(id), 0) FROM change_log)"
+            )
+            return removed
+
     def get_chat_info(self, chat_id):
         """Get information about a specific chat.
-        
+
         Args:
             chat_id: The ID of the chat to retrieve
-            
-        Returns:
-            tuple: (title,) or None if chat not found
-        """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT title FROM chats WHERE id = ?", (chat_id,))
-        chat_info = cursor.fetchone()
-        conn.close()
-        
-        return chat_info
-    
-    def get_chat_messages(self, chat_id):
+
+        Returns:
+            tuple: (title,) or None if chat not found or deleted
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT title FROM chats WHERE id = ? AND deleted_at IS NULL", (chat_id,)
+            ).fetchone()
+
+    def get_chat_messages(self, chat_id, with_seq=False):
         """Get all messages for a specific chat.
-        
+
         Args:
             chat_id: The ID of the chat to retrieve messages for
-            
+            with_seq: Include each message's sequence number
+
         Returns:
-            list: List of tuples containing (role, content)
+            list: List of tuples containing (role, content), or
+                (seq, role, content) if with_seq is True
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY timestamp",
-            (chat_id,)
-        )
-        messages = cursor.fetchall()
-        conn.close()
-        
-        return messages
-    
+        columns = "m.seq, m.role" if with_seq else "m.role"
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            return conn.execute(
+                f"SELECT {columns}, {body_sql('m', schema)} FROM {schema}.messages m "
+                "WHERE m.chat_id = ? ORDER BY m.seq",
+                (chat_id,)
+            ).fetchall()
+
+    def get_chat_messages_page(self, chat_id, limit=50, before_seq=None):
+        """Get the latest messages of a chat that come before a cursor.
+
+        This is a keyset query on (chat_id, seq), so fetching any page costs
+        the same no matter how long the chat is.
+
+        Args:
+            chat_id: The ID of the chat to retrieve messages for
+            limit: Maximum number of messages to return
+            before_seq: Only return messages with a seq lower than this.
+                If None, the page ends at the newest message.
+
+        Returns:
+            list: List of tuples containing (seq, role, content), oldest first
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            columns = f"m.seq, m.role, {body_sql('m', schema)} FROM {schema}.messages m"
+            if before_seq is None:
+                rows = conn.execute(
+                    f"SELECT {columns} WHERE m.chat_id = ? ORDER BY m.seq DESC LIMIT ?",
+                    (chat_id, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {columns} WHERE m.chat_id = ? AND m.seq < ? "
+                    "ORDER BY m.seq DESC LIMIT ?",
+                    (chat_id, before_seq, limit)
+                ).fetchall()
+
+        return rows[::-1]
+
+    def search_messages(self, query, limit=50):
+        """Full-text search across the messages of every chat.
+
+        Results are ranked by BM25 and yielded straight off the cursor, so
+        callers can display the best matches before the rest are read. Live
+        chats are searched first, then the archive if there is room left.
+
+        Args:
+            query: Free text to search for. Every word must match.
+            limit: Maximum number of results
+
+        Yields:
+            tuple: (chat_id, chat_title, seq, role, snippet) where the snippet
+                has the matched terms wrapped in ``**`` for Markdown
+        """
+        match = _fts_query(query)
+        if not match:
+            return
+
+        self.flush()
+        with self.pool.reader() as conn:
+            schemas = ["main"]
+            if self.pool.is_attached(ARCHIVE_SCHEMA):
+                schemas.append(ARCHIVE_SCHEMA)
+
+            for schema in schemas:
+                cursor = conn.execute(
+                    "SELECT m.chat_id, c.title, m.seq, m.role, "
+                    "snippet(messages_fts, 0, '**', '**', '...', 12) "
+                    f"FROM {schema}.messages_fts "
+                    f"JOIN {schema}.messages m ON m.id = messages_fts.rowid "
+                    "JOIN main.chats c ON c.id = m.chat_id "
+                    "WHERE messages_fts MATCH ? AND c.deleted_at IS NULL "
+                    "ORDER BY rank LIMIT ?",
+                    (match, limit)
+                )
+                for row in cursor:
+                    yield row
+                    limit -= 1
+                if limit <= 0:
+                    return
+
     def save_message(self, chat_id, role, content):
         """Save a message to the specified chat.
-        
+
         Args:
             chat_id: The ID of the chat to save the message to
             role: The role of the message sender ('user' or 'assistant')
             content: The content of the message
-            
+
         Returns:
-            bool: True if the message was saved successfully
+            bool: True if the message was saved (or queued, in write-behind mode)
         """
         if chat_id is None:
             return False
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Save the message
-        cursor.execute(
-            "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
-            (chat_id, role, content)
+
+        if self.write_queue is not None:
+            self.write_queue.add((chat_id, role, content))
+            return True
+
+        with self.pool.writer() as conn:
+            self._insert_message(conn, chat_id, role, content)
+
+        return True
+
+    def _write_messages(self, batch):
+        """Write a batch of queued messages in a single transaction.
+
+        Args:
+            batch: List of (chat_id, role, content) tuples
+        """
+        with self.pool.writer() as conn:
+            for chat_id, role, content in batch:
+                self._insert_message(conn, chat_id, role, content)
+
+    def _insert_message(self, conn, chat_id, role, content):
+        """Insert one message and set the chat title from the first user message.
+
+        Writing to an archived chat moves it back to the live database first.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            chat_id: The ID of the chat to save the message to
+            role: The role of the message sender
+            content: The content of the message
+        """
+        row = conn.execute(
+            "SELECT message_count, archived_at FROM chats WHERE id = ?", (chat_id,)
+        ).fetchone()
+        previous_count = row[0] if row else 0
+        if row and row[1] is not None:
+            self._restore_chats(conn, [chat_id])
+
+        # Save the message as the next entry in the chat's sequence. A seq is
+        # never handed out twice, even after the newest message is deleted.
+        row = conn.execute(
+            "UPDATE chats SET next_seq = next_seq + 1, message_count = message_count + 1, "
+            "last_message_at = CURRENT_TIMESTAMP, preview = ? WHERE id = ? "
+            "RETURNING next_seq - 1",
+            (make_preview(content), chat_id)
+        ).fetchone()
+        seq = row[0] if row else 1
+        codec, payload, blob_hash = self._encode_body(conn, content)
+        message_id = conn.execute(
+            "INSERT INTO main.messages (chat_id, seq, role, codec, content, blob_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, seq, role, codec, payload, blob_hash)
+        ).lastrowid
+        _index_text(conn, "main", [(message_id, content)])
+        self._store_token_counts(conn, [(chat_id, seq, content)])
+
+        # If this is the first message and it is from the user, use it as the title
+        if role == "user" and previous_count == 0:
+            # Use first few words as title
+            title = content.split()[:5]
+            title = " ".join(title) + ("..." if len(content.split()) > 5 else "")
+
+            conn.execute(
+                "UPDATE chats SET title = ? WHERE id = ?",
+                (title, chat_id)
+            )
+
+    def _encode_body(self, conn, content):
+        """Prepare a message body for the messages table.
+
+        Large bodies go to the blobs table and the row only refers to them;
+        the rest are stored inline, compressed if big enough.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            content: The message body
+
+        Returns:
+            tuple: (codec, content, blob_hash) column values for the row
+        """
+        if content is not None and len(content.encode("utf-8")) >= self.blob_threshold:
+            return None, None, store_blob(conn, content, self.compression_threshold)
+        codec, payload = compress(content, self.compression_threshold)
+        return codec, payload, None
+
+    def _store_token_counts(self, conn, messages):
+        """Record the token counts of messages for every configured family.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            messages: List of (chat_id, seq, content) tuples
+        """
+        rows = []
+        for chat_id, seq, content in messages:
+            counts = count_tokens_by_family(content, self.token_families)
+            rows.extend((chat_id, family, seq, tokens) for family, tokens in counts.items())
+        conn.executemany(
+            "INSERT OR REPLACE INTO main.message_tokens (chat_id, family, seq, tokens) "
+            "VALUES (?, ?, ?, ?)",
+            rows
         )
-        
-        # If this is the first user message, update the chat title
-        if role == "user":
-            cursor.execute(
-                "SELECT COUNT(*) FROM messages WHERE chat_id = ?",
-                (chat_id,)
+
+    def delete_message(self, chat_id, seq):
+        """Delete a single message and update the chat's summary columns.
+
+        Args:
+            chat_id: The ID of the chat the message belongs to
+            seq: The sequence number of the message within the chat
+
+        Returns:
+            bool: True if a message was deleted
+        """
+        self.flush()
+        with self.pool.writer() as conn:
+            schema = self._message_schema(conn, chat_id)
+            cursor = conn.execute(
+                f"DELETE FROM {schema}.messages WHERE chat_id = ? AND seq = ?",
+                (chat_id, seq)
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute(
+                "DELETE FROM main.message_tokens WHERE chat_id = ? AND seq = ?",
+                (chat_id, seq)
             )
-            count = cursor.fetchone()[0]
-            
-            if count <= 1:  # This is the first message (we just inserted it)
-                # Use first few words as title
-                title = content.split()[:5]
-                title = " ".join(title) + ("..." if len(content.split()) > 5 else "")
-                
-                cursor.execute(
-                    "UPDATE chats SET title = ? WHERE id = ?",
-                    (title, chat_id)
+            _delete_attachments(conn, "chat_id = ? AND seq = ?", (chat_id, seq))
+            # The messages trigger only covers live chats
+            conn.execute(
+                "DELETE FROM main.chat_checkpoints WHERE chat_id = ? AND through_seq >= ?",
+                (chat_id, seq)
+            )
+
+            # The new latest message supplies the preview and activity time
+            latest = conn.execute(
+                f"SELECT {body_sql('m', schema)}, m.timestamp FROM {schema}.messages m "
+                "WHERE m.chat_id = ? ORDER BY m.seq DESC LIMIT 1",
+                (chat_id,)
+            ).fetchone()
+            if latest is None:
+                conn.execute(
+                    "UPDATE chats SET message_count = 0, preview = '', "
+                    "last_message_at = created_at WHERE id = ?",
+                    (chat_id,)
                 )
-        
-        conn.commit()
-        conn.close()
-        
-        return True
-    
+            else:
+                conn.execute(
+                    "UPDATE chats SET message_count = message_count - 1, "
+                    "preview = ?, last_message_at = ? WHERE id = ?",
+                    (make_preview(latest[0]), latest[1], chat_id)
+                )
+            return True
+
+    def add_attachment(self, chat_id, path, seq=None, name=None, media_type=None,
+                       chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """Store a file as an attachment of a message.
+
+        The file is memory-mapped and copied into chunk rows with SQLite's
+        incremental blob I/O, so no more than one chunk is ever copied into
+        Python memory. Chunks are written a few per transaction; the
+        attachment is only listed once the last one is in.
+
+        Args:
+            chat_id: The ID of the chat
+            path: The file to attach
+            seq: The message to attach it to. If None, the chat's latest message.
+            name: Name to show for the file. If None, uses the file name.
+            media_type: MIME type. If None, it is guessed from the name.
+            chunk_size: Bytes per stored chunk
+
+        Returns:
+            int: The ID of the new attachment
+
+        Raises:
+            ValueError: If the chat has no message to attach the file to
+        """
+        path = Path(path).expanduser()
+        name = name or path.name
+        media_type = media_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+        self.flush()
+        with self.pool.writer() as conn:
+            if seq is None:
+                schema = self._message_schema(conn, chat_id)
+                seq = conn.execute(
+                    f"SELECT MAX(seq) FROM {schema}.messages WHERE chat_id = ?", (chat_id,)
+                ).fetchone()[0]
+            if seq is None:
+                raise ValueError(f"Chat {chat_id} has no message to attach {name} to")
+            attachment_id = conn.execute(
+                "INSERT INTO main.attachments (chat_id, seq, name, media_type, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chat_id, seq, name, media_type, path.stat().st_size)
+            ).lastrowid
+
+        try:
+            digest, size = self._write_attachment_chunks(attachment_id, path, chunk_size)
+            with self.pool.writer() as conn:
+                conn.execute(
+                    "UPDATE main.attachments SET complete = 1, sha256 = ?, size = ? WHERE id = ?",
+                    (digest, size, attachment_id)
+                )
+        except BaseException:
+            with self.pool.writer() as conn:
+                _delete_attachments(conn, "id = ?", (attachment_id,))
+            raise
+        return attachment_id
+
+    def _write_attachment_chunks(self, attachment_id, path, chunk_size):
+        """Copy a file into an attachment's chunk rows.
+
+        Args:
+            attachment_id: The ID of the attachment being written
+            path: The file to copy
+            chunk_size: Bytes per chunk
+
+        Returns:
+            tuple: (sha256 hex digest, size in bytes) of what was stored
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            # mmap cannot map an empty file
+            if f.seek(0, 2) == 0:
+                return digest.hexdigest(), 0
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source, \
+                    memoryview(source) as view:
+                size = len(view)
+                per_transaction = chunk_size * _CHUNKS_PER_TRANSACTION
+                for start in range(0, size, per_transaction):
+                    with self.pool.writer() as conn:
+                        for offset in range(start, min(start + per_transaction, size), chunk_size):
+                            with view[offset:offset + chunk_size] as piece:
+                                digest.update(piece)
+                                rowid = conn.execute(
+                                    "INSERT INTO main.attachment_chunks "
+                                    "(attachment_id, chunk, data) VALUES (?, ?, zeroblob(?))",
+                                    (attachment_id, offset // chunk_size, len(piece))
+                                ).lastrowid
+                                with conn.blobopen("attachment_chunks", "data", rowid) as blob:
+                                    blob.write(piece)
+        return digest.hexdigest(), size
+
+    def get_attachments(self, chat_id):
+        """Get the complete attachments of a chat.
+
+        Args:
+            chat_id: The ID of the chat
+
+        Returns:
+            list: Tuples of (id, seq, name, media_type, size), in the order
+                they were attached
+        """
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT id, seq, name, media_type, size FROM main.attachments "
+                "WHERE chat_id = ? AND complete = 1 ORDER BY id",
+                (chat_id,)
+            ).fetchall()
+
+    def iter_attachment(self, attachment_id):
+        """Read an attachment's contents one chunk at a time.
+
+        Each chunk is read with incremental blob I/O, so memory use is
+        bounded by the chunk size however large the file is.
+
+        Args:
+            attachment_id: The ID of the attachment
+
+        Yields:
+            bytes: Successive chunks of the file
+        """
+        with self.pool.reader() as conn:
+            for (rowid,) in conn.execute(
+                "SELECT id FROM main.attachment_chunks WHERE attachment_id = ? ORDER BY chunk",
+                (attachment_id,)
+            ).fetchall():
+                with conn.blobopen("attachment_chunks", "data", rowid, readonly=True) as blob:
+                    yield blob.read()
+
+    def delete_incomplete_attachments(self, older_than=86400):
+        """Remove attachments whose upload was interrupted.
+
+        Args:
+            older_than: Only remove uploads started at least this many seconds
+                ago, so ones still in progress in another process are left alone
+
+        Returns:
+            int: The number of attachments removed
+        """
+        with self.pool.writer() as conn:
+            return _delete_attachments(
+                conn, "complete = 0 AND created_at <= datetime('now', ?)",
+                (f"-{int(older_than)} seconds",)
+            )
+
+    def compact(self, batch_size=500):
+        """Compress existing large message bodies and shrink the file.
+
+        Both inline bodies and blobs are compressed. Rows are rewritten in
+        batches, each in its own short transaction, and the file is then
+        VACUUMed to return the freed pages.
+
+        Args:
+            batch_size: Number of rows rewritten per transaction
+
+        Returns:
+            dict: ``rows_compressed``, ``bytes_before`` and ``bytes_after``
+        """
+        self.flush()
+        bytes_before = self._database_size()
+        rows_compressed = 0
+
+        # Inline bodies and shared blobs are encoded the same way
+        for table in ("messages", "blobs"):
+            last_id = 0
+            while True:
+                with self.pool.writer() as conn:
+                    rows = conn.execute(
+                        f"SELECT rowid, content FROM main.{table} "
+                        "WHERE rowid > ? AND codec IS NULL "
+                        "AND length(CAST(content AS BLOB)) >= ? ORDER BY rowid LIMIT ?",
+                        (last_id, self.compression_threshold, batch_size)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+
+                    updates = []
+                    for rowid, content in rows:
+                        codec, payload = compress(content, self.compression_threshold)
+                        if codec is not None:
+                            updates.append((codec, payload, rowid))
+                    conn.executemany(
+                        f"UPDATE main.{table} SET codec = ?, content = ? WHERE rowid = ?",
+                        updates
+                    )
+                    rows_compressed += len(updates)
+
+        self.pool.vacuum()
+        return {
+            "rows_compressed": rows_compressed,
+            "bytes_before": bytes_before,
+            "bytes_after": self._database_size(),
+        }
+
+    def get_storage_stats(self):
+        """Report how much storing repeated bodies once as blobs saves.
+
+        Returns:
+            dict: ``blobs`` distinct bodies stored, ``references`` messages
+                pointing at them, ``logical_bytes`` their size if every
+                message held its own copy, ``unique_bytes`` the size of each
+                body once, ``stored_bytes`` what is on disk after compression,
+                and ``dedupe_ratio``, logical_bytes / unique_bytes
+        """
+        self.flush()
+        schemas = ["main"]
+        if self.pool.is_attached(ARCHIVE_SCHEMA):
+            schemas.append(ARCHIVE_SCHEMA)
+
+        totals = [0, 0, 0, 0, 0]
+        with self.pool.reader() as conn:
+            for schema in schemas:
+                row = conn.execute(
+                    "SELECT COUNT(*), TOTAL(refcount), TOTAL(size * refcount), TOTAL(size), "
+                    f"TOTAL(length(CAST(content AS BLOB))) FROM {schema}.blobs"
+                ).fetchone()
+                totals = [total + int(value) for total, value in zip(totals, row)]
+
+        blobs, references, logical_bytes, unique_bytes, stored_bytes = totals
+        return {
+            "blobs": blobs,
+            "references": references,
+            "logical_bytes": logical_bytes,
+            "unique_bytes": unique_bytes,
+            "stored_bytes": stored_bytes,
+            "dedupe_ratio": logical_bytes / unique_bytes if unique_bytes else 1.0,
+        }
+
+    def _database_size(self):
+        """Return the logical size of the database in bytes."""
+        with self.pool.writer() as conn:
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def backfill_token_counts(self, batch_size=500):
+        """Count tokens for messages stored before their counts were recorded.
+
+        Uncounted messages are found and counted on a reader connection; the
+        write lock is only taken to insert each batch's counts, so a history
+        that is already counted costs a read and never blocks other writers.
+
+        Args:
+            batch_size: Number of messages counted per transaction
+
+        Returns:
+            int: The number of messages counted
+        """
+        self.flush()
+        schemas = ["main"]
+        if self.pool.is_attached(ARCHIVE_SCHEMA):
+            schemas.append(ARCHIVE_SCHEMA)
+
+        families = self.token_families
+        placeholders = ",".join("?" * len(families))
+        counted = 0
+        for schema in schemas:
+            last_id = 0
+            while True:
+                with self.pool.reader() as conn:
+                    rows = conn.execute(
+                        f"SELECT m.id, m.chat_id, m.seq, {body_sql('m', schema)} "
+                        f"FROM {schema}.messages m WHERE m.id > ? AND ("
+                        "SELECT COUNT(*) FROM main.message_tokens t "
+                        "WHERE t.chat_id = m.chat_id AND t.seq = m.seq "
+                        f"AND t.family IN ({placeholders})) < ? "
+                        "ORDER BY m.id LIMIT ?",
+                        (last_id, *families, len(families), batch_size)
+                    ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                counts = []
+                for message_id, chat_id, seq, content in rows:
+                    counts.extend(
+                        (message_id, chat_id, family, seq, tokens)
+                        for family, tokens in count_tokens_by_family(content, families).items()
+                    )
+                with self.pool.writer() as conn:
+                    # Skip messages deleted or moved since they were read, and
+                    # keep counts a save or edit has written in the meantime
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO main.message_tokens (chat_id, family, seq, tokens) "
+                        f"SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM {schema}.messages "
+                        "WHERE id = ? AND chat_id = ? AND seq = ?)",
+                        [(chat_id, family, seq, tokens, message_id, chat_id, seq)
+                         for message_id, chat_id, family, seq, tokens in counts]
+                    )
+                counted += len(rows)
+        return counted
+
+    def get_token_counts(self, chat_id, family):
+        """Get the token count of each message in a chat, with running totals.
+
+        Messages that have not been counted yet, because the backfill has
+        not reached them, are estimated at one token per four characters.
+
+        Args:
+            chat_id: The ID of the chat
+            family: The tokenizer family to report
+
+        Returns:
+            list: Tuples of (seq, tokens, total), oldest first, where total
+                is the sum of tokens up to and including that message
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            return conn.execute(
+                f"SELECT seq, tokens, SUM(tokens) OVER (ORDER BY seq) FROM ("
+                f"{_TOKENS_SQL.format(schema=schema, body=body_sql('m', schema))})",
+                (family, chat_id)
+            ).fetchall()
+
+    def fit_token_budget(self, chat_id, family, budget, per_message=0):
+        """Find the longest run of a chat's newest messages that fits a token budget.
+
+        The sums are computed in SQLite from the stored counts, so nothing
+        is re-tokenized.
+
+        Args:
+            chat_id: The ID of the chat
+            family: The tokenizer family to count with
+            budget: Maximum number of tokens
+            per_message: Tokens added for each message on top of its content,
+                for the framing a provider wraps around every message
+
+        Returns:
+            tuple: (seq, tokens) where seq is the oldest message that still
+                fits and tokens is the total from there to the newest
+                message, or (None, 0) if not even the newest message fits
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            row = conn.execute(
+                "SELECT seq, total FROM ("
+                "SELECT seq, SUM(tokens + ?) OVER (ORDER BY seq DESC) AS total FROM ("
+                f"{_TOKENS_SQL.format(schema=schema, body=body_sql('m', schema))})"
+                ") WHERE total <= ? ORDER BY seq LIMIT 1",
+                (per_message, family, chat_id, budget)
+            ).fetchone()
+        return tuple(row) if row else (None, 0)
+
+    def select_context(self, chat_id, family, budget, per_message=0, pinned_roles=("system",),
+                       after_seq=0, reserved=0):
+        """Choose the messages of a chat to send to a model with a limited context.
+
+        Messages whose role is in pinned_roles are always kept. The rest of
+        the budget goes to the newest messages, walking back until the next
+        one would not fit; everything older is dropped. The newest message
+        is kept even if it alone is over budget. Only the stored token
+        counts are read to decide, and only the kept messages' bodies are
+        loaded.
+
+        Args:
+            chat_id: The ID of the chat
+            family: The tokenizer family to count with
+            budget: Maximum number of tokens for the messages
+            per_message: Tokens added for each message on top of its content
+            pinned_roles: Roles of messages that are never dropped
+            after_seq: Leave out unpinned messages up to this seq, e.g. the
+                ones a checkpoint summary stands in for
+            reserved: Tokens of the budget already spoken for, e.g. by that summary
+
+        Returns:
+            dict: ``messages`` as (seq, role, content) tuples oldest first,
+                their ``tokens`` (including reserved), and the number of
+                messages ``dropped`` and ``dropped_tokens``
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            counts = conn.execute(
+                f"SELECT seq, role, tokens + ? FROM ("
+                f"{_TOKENS_SQL.format(schema=schema, body=body_sql('m', schema))}"
+                ") ORDER BY seq",
+                (per_message, family, chat_id)
+            ).fetchall()
+
+            pinned = sum(tokens for _, role, tokens in counts if role in pinned_roles)
+            used, oldest = pinned + reserved, None
+            for seq, role, tokens in reversed(counts):
+                if role in pinned_roles:
+                    continue
+                if seq <= after_seq:
+                    break
+                if used + tokens > budget and oldest is not None:
+                    break
+                used += tokens
+                oldest = seq
+
+            # With nothing unpinned to keep, start past the newest message
+            if oldest is None:
+                oldest = counts[-1][0] + 1 if counts else 0
+            dropped = [
+                tokens for seq, role, tokens in counts
+                if role not in pinned_roles and after_seq < seq < oldest
+            ]
+            placeholders = ",".join("?" * len(pinned_roles)) or "NULL"
+            messages = conn.execute(
+                f"SELECT m.seq, m.role, {body_sql('m', schema)} FROM {schema}.messages m "
+                f"WHERE m.chat_id = ? AND (m.seq >= ? OR m.role IN ({placeholders})) "
+                "ORDER BY m.seq",
+                (chat_id, oldest, *pinned_roles)
+            ).fetchall()
+
+        return {
+            "messages": messages,
+            "tokens": used,
+            "dropped": len(dropped),
+            "dropped_tokens": sum(dropped),
+        }
+
+    def begin_checkpoint(self, chat_id, through_seq, model=None):
+        """Start a summary checkpoint of a chat's messages up to through_seq.
+
+        The checkpoint is recorded before the messages are read for
+        summarizing, so an edit or delete made while the summary is being
+        written removes it, and complete_checkpoint() then reports that the
+        summary is stale. Any other unfinished checkpoint of the chat is
+        discarded.
+
+        Args:
+            chat_id: The ID of the chat
+            through_seq: The newest message the summary will cover
+            model: The model writing the summary, for reference
+
+        Returns:
+            int: The ID of the pending checkpoint
+        """
+        self.flush()
+        with self.pool.writer() as conn:
+            conn.execute(
+                "DELETE FROM main.chat_checkpoints WHERE chat_id = ? AND summary IS NULL",
+                (chat_id,)
+            )
+            return conn.execute(
+                "INSERT INTO main.chat_checkpoints (chat_id, through_seq, model) VALUES (?, ?, ?)",
+                (chat_id, through_seq, model)
+            ).lastrowid
+
+    def complete_checkpoint(self, checkpoint_id, summary):
+        """Store the summary of a pending checkpoint.
+
+        Older checkpoints of the chat beyond the newest CHECKPOINTS_KEPT are
+        removed, since each summary builds on the one before it.
+
+        Args:
+            checkpoint_id: The ID returned by begin_checkpoint()
+            summary: The summary text
+
+        Returns:
+            bool: True if stored; False if the messages it covers changed
+                since begin_checkpoint() and the summary should be discarded
+        """
+        with self.pool.writer() as conn:
+            row = conn.execute(
+                "UPDATE main.chat_checkpoints SET summary = ?, created_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND summary IS NULL RETURNING chat_id",
+                (summary, checkpoint_id)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "DELETE FROM main.chat_checkpoints WHERE chat_id = ? AND summary IS NOT NULL "
+                "AND id NOT IN (SELECT id FROM main.chat_checkpoints WHERE chat_id = ? "
+                "AND summary IS NOT NULL ORDER BY through_seq DESC LIMIT ?)",
+                (row[0], row[0], CHECKPOINTS_KEPT)
+            )
+            return True
+
+    def get_checkpoint(self, chat_id):
+        """Get the newest summary checkpoint of a chat.
+
+        Args:
+            chat_id: The ID of the chat
+
+        Returns:
+            tuple: (id, through_seq, summary), or None if the chat has none
+        """
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT id, through_seq, summary FROM main.chat_checkpoints "
+                "WHERE chat_id = ? AND summary IS NOT NULL "
+                "ORDER BY through_seq DESC LIMIT 1",
+                (chat_id,)
+            ).fetchone()
+
+    def get_chat_messages_range(self, chat_id, after_seq, through_seq):
+        """Get the messages of a chat within a range of sequence numbers.
+
+        Args:
+            chat_id: The ID of the chat
+            after_seq: Only messages with a seq greater than this
+            through_seq: Only messages with a seq up to and including this
+
+        Returns:
+            list: List of tuples containing (seq, role, content), oldest first
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            schema = self._message_schema(conn, chat_id)
+            return conn.execute(
+                f"SELECT m.seq, m.role, {body_sql('m', schema)} FROM {schema}.messages m "
+                "WHERE m.chat_id = ? AND m.seq > ? AND m.seq <= ? ORDER BY m.seq",
+                (chat_id, after_seq, through_seq)
+            ).fetchall()
+
+    def archive_inactive_chats(self, max_age_days, batch_size=50):
+        """Move the messages of chats idle for longer than max_age_days to the archive.
+
+        Archived chats keep their row (title, preview, counts) in the live
+        database, so they still appear in the chat list; only their messages
+        and search index entries move. Reads of an archived chat go to the
+        archive transparently, and saving a new message to it moves it back.
+        Chats are moved ``batch_size`` at a time, and the archive file is
+        only created once there is something to put in it. Each batch is
+        copied to the archive and committed before the live copies are
+        deleted in a second transaction, so a crash in between leaves the
+        messages in both places rather than in neither.
+
+        Args:
+            max_age_days: Archive chats with no activity for this many days
+            batch_size: Number of chats moved per batch
+
+        Returns:
+            int: The number of chats archived; always 0 for an ephemeral
+                database, which has no archive
+        """
+        if self.archive_path is None:
+            return 0
+
+        self.flush()
+        cutoff = f"-{max_age_days} days"
+        candidates_sql = (
+            "SELECT id FROM main.chats WHERE deleted_at IS NULL AND archived_at IS NULL "
+            "AND message_count > 0 AND last_message_at < datetime('now', ?) "
+            "ORDER BY last_message_at LIMIT ?"
+        )
+
+        with self.pool.reader() as conn:
+            if conn.execute(candidates_sql, (cutoff, 1)).fetchone() is None:
+                return 0
+        self._open_archive(create=True)
+
+        archived = 0
+        while True:
+            with self.pool.writer() as conn:
+                chat_ids = [row[0] for row in conn.execute(candidates_sql, (cutoff, batch_size))]
+                if not chat_ids:
+                    break
+                self._copy_to_archive(conn, chat_ids)
+            with self.pool.writer() as conn:
+                archived += self._drop_archived_messages(conn, chat_ids)
+        return archived
+
+    def _copy_to_archive(self, conn, chat_ids):
+        """Copy live chats' messages to the archive, replacing any earlier copy.
+
+        An earlier copy is left behind by a move that did not finish; the
+        live messages are what count, so it is thrown away.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            chat_ids: IDs of the chats to archive
+        """
+        placeholders = ",".join("?" * len(chat_ids))
+        conn.execute(
+            f"DELETE FROM {ARCHIVE_SCHEMA}.messages WHERE chat_id IN ({placeholders})",
+            chat_ids
+        )
+        # A copy of the chat row keeps the archive file self-describing
+        conn.execute(
+            f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.chats "
+            f"SELECT * FROM main.chats WHERE id IN ({placeholders})",
+            chat_ids
+        )
+        conn.execute(
+            f"UPDATE {ARCHIVE_SCHEMA}.chats SET archived_at = CURRENT_TIMESTAMP "
+            f"WHERE id IN ({placeholders})",
+            chat_ids
+        )
+        self._copy_blobs(conn, "main", ARCHIVE_SCHEMA, chat_ids)
+        conn.execute(
+            f"INSERT INTO {ARCHIVE_SCHEMA}.messages ({_MESSAGE_COLUMNS}) "
+            f"SELECT {_MESSAGE_COLUMNS} FROM main.messages "
+            f"WHERE chat_id IN ({placeholders}) ORDER BY chat_id, seq",
+            chat_ids
+        )
+        _index_moved_messages(conn, ARCHIVE_SCHEMA, chat_ids)
+        _drop_unreferenced_blobs(conn, ARCHIVE_SCHEMA)
+
+    def _drop_archived_messages(self, conn, chat_ids):
+        """Delete live messages that have been copied to the archive.
+
+        A chat only counts as archived if every one of its live messages has
+        an identical copy in the archive. One written to or edited since the
+        copy keeps all its messages and stays live until the next run.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            chat_ids: IDs of the chats copied by _copy_to_archive()
+
+        Returns:
+            int: The number of chats archived
+        """
+        placeholders = ",".join("?" * len(chat_ids))
+        copied = [row[0] for row in conn.execute(
+            f"SELECT c.id FROM main.chats c WHERE c.id IN ({placeholders}) "
+            "AND c.archived_at IS NULL AND NOT EXISTS ("
+            "SELECT 1 FROM main.messages m WHERE m.chat_id = c.id AND NOT EXISTS ("
+            f"SELECT 1 FROM {ARCHIVE_SCHEMA}.messages a "
+            "WHERE a.chat_id = m.chat_id AND a.seq = m.seq AND a.role IS m.role "
+            "AND a.codec IS m.codec AND a.content IS m.content "
+            "AND a.blob_hash IS m.blob_hash AND a.timestamp IS m.timestamp))",
+            chat_ids
+        )]
+        if not copied:
+            return 0
+
+        placeholders = ",".join("?" * len(copied))
+        conn.execute(
+            f"UPDATE main.chats SET archived_at = CURRENT_TIMESTAMP "
+            f"WHERE id IN ({placeholders})",
+            copied
+        )
+        conn.execute(
+            f"DELETE FROM main.messages WHERE chat_id IN ({placeholders})", copied
+        )
+        return len(copied)
+
+    def _restore_chats(self, conn, chat_ids):
+        """Move archived chats' messages back to the live database.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            chat_ids: IDs of the chats to restore
+        """
+        placeholders = ",".join("?" * len(chat_ids))
+        if self.pool.is_attached(ARCHIVE_SCHEMA):
+            self._copy_blobs(conn, ARCHIVE_SCHEMA, "main", chat_ids)
+            conn.execute(
+                f"INSERT OR IGNORE INTO main.messages ({_MESSAGE_COLUMNS}) "
+                f"SELECT {_MESSAGE_COLUMNS} FROM {ARCHIVE_SCHEMA}.messages "
+                f"WHERE chat_id IN ({placeholders}) ORDER BY chat_id, seq",
+                chat_ids
+            )
+            _index_moved_messages(conn, "main", chat_ids)
+            _drop_unreferenced_blobs(conn, "main")
+            conn.execute(
+                f"DELETE FROM {ARCHIVE_SCHEMA}.messages WHERE chat_id IN ({placeholders})",
+                chat_ids
+            )
+            conn.execute(
+                f"DELETE FROM {ARCHIVE_SCHEMA}.chats WHERE id IN ({placeholders})",
+                chat_ids
+            )
+        # Chats archived before next_seq existed were numbered without their messages
+        conn.execute(
+            "UPDATE main.chats SET archived_at = NULL, next_seq = MAX(next_seq, ("
+            "SELECT COALESCE(MAX(seq), 0) + 1 FROM main.messages WHERE chat_id = chats.id)) "
+            f"WHERE id IN ({placeholders})",
+            chat_ids
+        )
+
+    def _copy_blobs(self, conn, source, dest, chat_ids):
+        """Copy the blobs that chats' messages refer to into another schema.
+
+        Copies start unreferenced; the messages insert trigger counts each
+        message as it moves across.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            source: Schema the messages are moving from
+            dest: Schema the messages are moving to
+            chat_ids: IDs of the chats being moved
+        """
+        placeholders = ",".join("?" * len(chat_ids))
+        conn.execute(
+            f"INSERT OR IGNORE INTO {dest}.blobs (hash, codec, content, size) "
+            f"SELECT hash, codec, content, size FROM {source}.blobs WHERE hash IN ("
+            f"SELECT blob_hash FROM {source}.messages WHERE chat_id IN ({placeholders}))",
+            chat_ids
+        )
+
+    def iter_export_records(self):
+        """Stream every live chat and message as plain dicts, ready for serializing.
+
+        A single cursor walks chats in id order and their messages in seq
+        order, so memory use stays flat and the export is one consistent
+        snapshot. Each chat record is followed by its message records; the
+        messages of archived chats are read from the archive.
+
+        Yields:
+            dict: Records with ``type`` set to ``"chat"`` or ``"message"``
+        """
+        self.flush()
+        with self.pool.reader() as conn:
+            cursor = conn.execute(
+                "SELECT c.id, c.uuid, c.title, c.created_at, c.archived_at, "
+                f"m.seq, m.role, {body_sql('m', 'main')}, m.timestamp "
+                "FROM main.chats c LEFT JOIN main.messages m ON m.chat_id = c.id "
+                "WHERE c.deleted_at IS NULL ORDER BY c.id, m.seq"
+            )
+
+            current_chat = None
+            for (chat_id, chat_uuid, title, created_at, archived_at,
+                 seq, role, content, timestamp) in cursor:
+                if chat_id != current_chat:
+                    current_chat = chat_id
+                    yield {
+                        "type": "chat",
+                        "uuid": chat_uuid,
+                        "title": title,
+                        "created_at": created_at,
+                    }
+                    if archived_at is not None and self.pool.is_attached(ARCHIVE_SCHEMA):
+                        archived = conn.execute(
+                            f"SELECT m.seq, m.role, {body_sql('m', ARCHIVE_SCHEMA)}, "
+                            f"m.timestamp FROM {ARCHIVE_SCHEMA}.messages m "
+                            "WHERE m.chat_id = ? ORDER BY m.seq",
+                            (chat_id,)
+                        )
+                        for row in archived:
+                            yield _message_record(chat_uuid, *row)
+                if seq is not None:
+                    yield _message_record(chat_uuid, seq, role, content, timestamp)
+
+    def import_records(self, records, batch_size=1000):
+        """Insert exported chat and message records.
+
+        Records are written in transactions of ``batch_size``. Chats are
+        matched by UUID and messages by (chat, seq), so importing the same
+        data twice adds nothing.
+
+        Args:
+            records: Iterable of dicts as produced by iter_export_records
+            batch_size: Number of records written per transaction
+
+        Returns:
+            dict: ``chats`` and ``messages`` counts of newly added rows
+        """
+        self.flush()
+        chat_ids = {}
+        added = {"chats": 0, "messages": 0}
+        records = iter(records)
+
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+
+            with self.pool.writer() as conn:
+                messages = []
+                texts = []
+                for record in batch:
+                    if record.get("type") == "chat":
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO chats "
+                            "(uuid, title, created_at, last_message_at) "
+                            "VALUES (?, ?, ?, ?)",
+                            (record["uuid"], record["title"],
+                             record["created_at"], record["created_at"])
+                        )
+                        added["chats"] += cursor.rowcount
+                        chat_id, archived_at = conn.execute(
+                            "SELECT id, archived_at FROM chats WHERE uuid = ?",
+                            (record["uuid"],)
+                        ).fetchone()
+                        # Merge into the live copy so seq de-duplication still works
+                        if archived_at is not None:
+                            self._restore_chats(conn, [chat_id])
+                        chat_ids[record["uuid"]] = chat_id
+                    elif record.get("type") == "message":
+                        codec, payload, blob_hash = self._encode_body(conn, record["content"])
+                        messages.append((
+                            chat_ids[record["chat"]], record["seq"], record["role"],
+                            codec, payload, blob_hash, record["timestamp"]
+                        ))
+                        texts.append(record["content"])
+
+                # RETURNING tells the new rows apart from skipped duplicates
+                indexed = []
+                counted = []
+                for message, content in zip(messages, texts):
+                    row = conn.execute(
+                        "INSERT OR IGNORE INTO main.messages "
+                        "(chat_id, seq, role, codec, content, blob_hash, timestamp) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                        message
+                    ).fetchone()
+                    if row is not None:
+                        indexed.append((row[0], content))
+                        counted.append((message[0], message[1], content))
+                added["messages"] += len(indexed)
+                _index_text(conn, "main", indexed)
+                # Blobs stored for messages that turned out to exist already
+                _drop_unreferenced_blobs(conn, "main")
+                # A skipped duplicate keeps the counts of the row already there
+                self._store_token_counts(conn, counted)
+
+                self._refresh_chat_summaries(conn, {m[0] for m in messages})
+
+        return added
+
+    def _refresh_chat_summaries(self, conn, chat_ids):
+        """Recompute message_count, last_message_at, preview and next_seq for chats.
+
+        Used after bulk inserts, where maintaining them per row is wasteful.
+
+        Args:
+            conn: The writer connection, inside a transaction
+            chat_ids: IDs of the chats to refresh
+        """
+        for chat_id in chat_ids:
+            count, last_message_at, last_seq = conn.execute(
+                "SELECT COUNT(*), MAX(timestamp), COALESCE(MAX(seq), 0) FROM messages "
+                "WHERE chat_id = ?",
+                (chat_id,)
+            ).fetchone()
+            latest = conn.execute(
+                f"SELECT {body_sql('m', 'main')} FROM main.messages m "
+                "WHERE m.chat_id = ? ORDER BY m.seq DESC LIMIT 1",
+                (chat_id,)
+            ).fetchone()
+            conn.execute(
+                "UPDATE chats SET message_count = ?, last_message_at = COALESCE(?, created_at), "
+                "preview = ?, next_seq = MAX(next_seq, ? + 1) WHERE id = ?",
+                (count, last_message_at, make_preview(latest[0]) if latest else "",
+                 last_seq, chat_id)
+            )
+
     def delete_chat(self, chat_id):
-        """Delete a chat and all its messages.
-        
+        """Delete a chat. See delete_chats().
+
         Args:
             chat_id: The ID of the chat to delete
+
+        Returns:
+            int: 1 if the chat was deleted, 0 if it was already gone
+        """
+        return self.delete_chats([chat_id])
+
+    def delete_chats(self, chat_ids):
+        """Mark chats as deleted.
+
+        This only writes a tombstone, so it returns immediately however long
+        the chats are. Deleted chats disappear from listings, search and
+        export, can be brought back with undelete_chats(), and have their
+        rows removed later by purge_deleted_chats().
+
+        Args:
+            chat_ids: IDs of the chats to delete
+
+        Returns:
+            int: The number of chats deleted
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Delete messages first (foreign key constraint)
-        cursor.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
-        
-        # Delete the chat
-        cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
-        
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return 0
+
+        # Queued messages for these chats must land before the tombstone
+        self.flush()
+        placeholders = ",".join("?" * len(chat_ids))
+        with self.pool.writer() as conn:
+            return conn.execute(
+                f"UPDATE chats SET deleted_at = CURRENT_TIMESTAMP "
+                f"WHERE id IN ({placeholders}) AND deleted_at IS NULL",
+                chat_ids
+            ).rowcount
+
+    def delete_empty_chats(self, batch_size=500):
+        """Remove chats that have no messages.
+
+        Args:
+            batch_size: Number of chats removed per transaction
+
+        Returns:
+            int: The number of chats removed
+        """
+        self.flush()
+        removed = 0
+        while True:
+            with self.pool.writer() as conn:
+                count = conn.execute(
+                    "DELETE FROM chats WHERE id IN (SELECT id FROM chats "
+                    "WHERE message_count = 0 AND deleted_at IS NULL LIMIT ?)",
+                    (batch_size,)
+                ).rowcount
+            removed += count
+            if count < batch_size:
+                return removed
+
+    def undelete_chats(self, chat_ids):
+        """Restore chats deleted with delete_chats() that have not been purged yet.
+
+        Args:
+            chat_ids: IDs of the chats to restore
+
+        Returns:
+            int: The number of chats restored
+        """
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return 0
+
+        placeholders = ",".join("?" * len(chat_ids))
+        with self.pool.writer() as conn:
+            return conn.execute(
+                f"UPDATE chats SET deleted_at = NULL "
+                f"WHERE id IN ({placeholders}) AND deleted_at IS NOT NULL",
+                chat_ids
+            ).rowcount
+
+    def purge_deleted_chats(self, older_than=0, batch_size=1000):
+        """Permanently remove chats that were deleted at least ``older_than`` seconds ago.
+
+        Messages are removed ``batch_size`` rows per transaction, so the
+        writer is only held briefly and other writes interleave with a large
+        purge. Each batch re-checks the tombstone, so a chat restored
+        mid-purge stops losing messages.
+
+        Args:
+            older_than: Undo window in seconds; newer deletions are kept
+            batch_size: Number of messages removed per transaction
+
+        Returns:
+            int: The number of chats purged
+        """
+        cutoff = f"-{int(older_than)} seconds"
+        with self.pool.reader() as conn:
+            chat_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM chats WHERE deleted_at IS NOT NULL "
+                "AND deleted_at <= datetime('now', ?) ORDER BY deleted_at",
+                (cutoff,)
+            )]
+
+        schemas = ["main"]
+        if self.pool.is_attached(ARCHIVE_SCHEMA):
+            schemas.append(ARCHIVE_SCHEMA)
+
+        purged = 0
+        for chat_id in chat_ids:
+            for schema in schemas:
+                while self._purge_batch(schema, chat_id, batch_size) == batch_size:
+                    pass
+
+            with self.pool.writer() as conn:
+                deleted = conn.execute(
+                    "DELETE FROM main.chats WHERE id = ? AND deleted_at IS NOT NULL",
+                    (chat_id,)
+                ).rowcount
+                if deleted:
+                    conn.execute(
+                        "DELETE FROM main.message_tokens WHERE chat_id = ?", (chat_id,)
+                    )
+                    _delete_attachments(conn, "chat_id = ?", (chat_id,))
+                    conn.execute(
+                        "DELETE FROM main.chat_checkpoints WHERE chat_id = ?", (chat_id,)
+                    )
+                if deleted and ARCHIVE_SCHEMA in schemas:
+                    conn.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.chats WHERE id = ?", (chat_id,))
+                purged += deleted
+        return purged
+
+    def _purge_batch(self, schema, chat_id, batch_size):
+        """Delete up to batch_size messages of a tombstoned chat in one transaction.
+
+        Args:
+            schema: Schema holding the messages
+            chat_id: The ID of the deleted chat
+            batch_size: Maximum number of messages to delete
+
+        Returns:
+            int: The number of messages deleted; 0 if the chat was restored
+        """
+        with self.pool.writer() as conn:
+            row = conn.execute(
+                "SELECT deleted_at FROM main.chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+            if row is None or row[0] is None:
+                return 0
+            return conn.execute(
+                f"DELETE FROM {schema}.messages WHERE id IN "
+                f"(SELECT id FROM {schema}.messages WHERE chat_id = ? LIMIT ?)",
+                (chat_id, batch_size)
+            ).rowcount
+
+
+def _delete_attachments(conn, where, params):
+    """Delete attachments and their chunks.
+
+    Args:
+        conn: The writer connection, inside a transaction
+        where: SQL condition on the attachments table
+        params: Parameters for the condition
+
+    Returns:
+        int: The number of attachments deleted
+    """
+    conn.execute(
+        "DELETE FROM main.attachment_chunks WHERE attachment_id IN "
+        f"(SELECT id FROM main.attachments WHERE {where})",
+        params
+    )
+    return conn.execute(f"DELETE FROM main.attachments WHERE {where}", params).rowcount
+
+
+def _drop_unreferenced_blobs(conn, schema):
+    """Delete blobs that no message refers to.
+
+    store_blob() and _copy_blobs() write a blob before the message that
+    refers to it. When that message is then skipped as a duplicate, the
+    blob is left unreferenced and is removed here, in the same transaction.
+
+    Args:
+        conn: The writer connection, inside a transaction
+        schema: Schema holding the blobs table
+    """
+    conn.execute(f"DELETE FROM {schema}.blobs WHERE refcount = 0")
+
+
+def _index_text(conn, schema, messages):
+    """Add messages' plain text to the search index.
+
+    The index keeps its own copy of the text, so it is written here from
+    Python rather than read back through the app's decompression function.
+
+    Args:
+        conn: The writer connection, inside a transaction
+        schema: Schema holding the messages
+        messages: List of (message id, text) tuples
+    """
+    conn.executemany(
+        f"INSERT INTO {schema}.messages_fts (rowid, content) VALUES (?, ?)", messages
+    )
+
+
+def _index_moved_messages(conn, schema, chat_ids):
+    """Index chats' messages that were copied in from another schema.
+
+    Rows the index already holds, such as duplicates skipped by the copy,
+    are left alone.
+
+    Args:
+        conn: The writer connection, inside a transaction
+        schema: Schema the messages were copied into
+        chat_ids: IDs of the chats that moved
+    """
+    placeholders = ",".join("?" * len(chat_ids))
+    conn.execute(
+        f"INSERT INTO {schema}.messages_fts (rowid, content) "
+        f"SELECT m.id, {body_sql('m', schema)} FROM {schema}.messages m "
+        f"WHERE m.chat_id IN ({placeholders}) AND NOT EXISTS ("
+        f"SELECT 1 FROM {schema}.messages_fts f WHERE f.rowid = m.id)",
+        chat_ids
+    )
+
+
+def _message_record(chat_uuid, seq, role, content, timestamp):
+    """Build the export record for one message."""
+    return {
+        "type": "message",
+        "chat": chat_uuid,
+        "seq": seq,
+        "role": role,
+        "content": content,
+        "timestamp": timestamp,
+    }
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query that matches every word literally.
+
+    Each word is quoted so that characters such as ``-``, ``:`` or ``*`` in
+    user input are searched for rather than parsed as FTS5 operators.
+
+    Args:
+        text: The user's search text
+
+    Returns:
+        str: The FTS5 MATCH expression, or an empty string if there are no words
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
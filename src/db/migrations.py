@@ -0,0 +1,576 @@
+"""Versioned schema migrations for the chat database.
+
+The schema version is stored in SQLite's ``PRAGMA user_version``. Each entry
+in ``MIGRATIONS`` upgrades the schema by exactly one version, so an existing
+``chat_history.db`` is evolved in place by running every step above its
+current version, in order, each inside its own transaction.
+"""
+
+import uuid
+
+from src.db.blobs import BLOB_THRESHOLD, body_sql, content_hash
+from src.db.compression import decompress
+from src.db.text import make_preview
+
+
+def _create_base_tables(conn):
+    """Create the original chats and messages tables."""
+    # IF NOT EXISTS keeps this a no-op for databases created before versioning
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS chats (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        chat_id INTEGER,
+        role TEXT,
+        content TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES chats (id)
+    )
+    ''')
+
+
+def _index_messages_by_chat(conn):
+    """Index messages by chat so per-chat reads no longer scan the whole table.
+
+    This is not a covering index for message loads: they still read role
+    and content from each matching row. Copying the bodies into the index
+    would store every message twice. The rowid is implicitly part of every
+    index, so it does cover the per-chat COUNT(*).
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat "
+        "ON messages (chat_id, timestamp)"
+    )
+
+
+def _index_chats_by_created_at(conn):
+    """Index chats by creation time for the sidebar listing."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chats_created_at ON chats (created_at)"
+    )
+
+
+def _add_message_seq(conn):
+    """Add a per-chat sequence number and order messages by it.
+
+    ``timestamp`` only has one-second resolution, so a prompt and a fast reply
+    can tie. Existing rows are numbered by (timestamp, id), which matches the
+    insertion order the old ORDER BY was approximating.
+    """
+    conn.execute("ALTER TABLE messages ADD COLUMN seq INTEGER")
+
+    conn.execute(
+        "CREATE TEMP TABLE _message_seq (id INTEGER PRIMARY KEY, seq INTEGER)"
+    )
+    conn.execute('''
+    INSERT INTO _message_seq (id, seq)
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY timestamp, id)
+    FROM messages
+    ''')
+    conn.execute(
+        "UPDATE messages SET seq = "
+        "(SELECT seq FROM _message_seq WHERE _message_seq.id = messages.id)"
+    )
+    conn.execute("DROP TABLE _message_seq")
+
+    # (chat_id, seq) replaces (chat_id, timestamp) for every per-chat read
+    conn.execute("DROP INDEX IF EXISTS idx_messages_chat")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_messages_chat_seq ON messages (chat_id, seq)"
+    )
+
+
+def _add_message_search(conn):
+    """Add an FTS5 index over message content, kept in sync by triggers."""
+    # External content table: the text lives only in messages, FTS5 stores
+    # just the inverted index and reads rows back for snippets.
+    conn.execute('''
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content,
+        content='messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    ''')
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _add_chat_summary_columns(conn):
+    """Denormalize per-chat message count, last activity and preview.
+
+    These are maintained by the message insert and delete paths so the sidebar
+    and the title logic never have to scan or count a chat's messages.
+    """
+    conn.execute(
+        "ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.execute("ALTER TABLE chats ADD COLUMN last_message_at TIMESTAMP")
+    conn.execute("ALTER TABLE chats ADD COLUMN preview TEXT NOT NULL DEFAULT ''")
+
+    conn.execute('''
+    CREATE TEMP TABLE _chat_stats AS
+    SELECT chat_id, COUNT(*) AS message_count, MAX(timestamp) AS last_message_at
+    FROM messages GROUP BY chat_id
+    ''')
+    conn.execute("CREATE UNIQUE INDEX temp._chat_stats_id ON _chat_stats (chat_id)")
+    conn.execute('''
+    UPDATE chats SET
+        message_count = COALESCE(
+            (SELECT message_count FROM _chat_stats WHERE chat_id = chats.id), 0
+        ),
+        last_message_at = COALESCE(
+            (SELECT last_message_at FROM _chat_stats WHERE chat_id = chats.id),
+            created_at
+        )
+    ''')
+    conn.execute("DROP TABLE _chat_stats")
+
+    latest = conn.execute('''
+    SELECT m.chat_id, m.content FROM messages m
+    JOIN (SELECT chat_id, MAX(seq) AS seq FROM messages GROUP BY chat_id) last
+        ON last.chat_id = m.chat_id AND last.seq = m.seq
+    ''')
+    conn.executemany(
+        "UPDATE chats SET preview = ? WHERE id = ?",
+        ((make_preview(content), chat_id) for chat_id, content in latest.fetchall())
+    )
+
+    # The sidebar now orders by recency instead of creation time
+    conn.execute("DROP INDEX IF EXISTS idx_chats_created_at")
+    conn.execute(
+        "CREATE INDEX idx_chats_last_message_at ON chats (last_message_at)"
+    )
+
+
+def _add_message_codec(conn):
+    """Add a codec column so large message bodies can be stored compressed.
+
+    The search index can no longer read ``messages.content`` directly, so it
+    is rebuilt on top of a view that decompresses bodies with tw_decompress.
+    """
+    conn.execute("ALTER TABLE messages ADD COLUMN codec TEXT")
+
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS messages_fts_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS messages_fts")
+
+    conn.execute('''
+    CREATE VIEW message_text AS
+    SELECT id, tw_decompress(codec, content) AS content FROM messages
+    ''')
+    conn.execute('''
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content,
+        content='message_text',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content)
+        VALUES (new.id, tw_decompress(new.codec, new.content));
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, tw_decompress(old.codec, old.content));
+    END
+    ''')
+    # Compaction rewrites content without changing the text, so skip those
+    conn.execute('''
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages
+    WHEN tw_decompress(old.codec, old.content) IS NOT tw_decompress(new.codec, new.content)
+    BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, tw_decompress(old.codec, old.content));
+        INSERT INTO messages_fts (rowid, content)
+        VALUES (new.id, tw_decompress(new.codec, new.content));
+    END
+    ''')
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _add_chat_uuid(conn):
+    """Give every chat a stable UUID so exports can be re-imported idempotently."""
+    conn.execute("ALTER TABLE chats ADD COLUMN uuid TEXT")
+    chat_ids = [row[0] for row in conn.execute("SELECT id FROM chats")]
+    conn.executemany(
+        "UPDATE chats SET uuid = ? WHERE id = ?",
+        ((str(uuid.uuid4()), chat_id) for chat_id in chat_ids)
+    )
+    conn.execute("CREATE UNIQUE INDEX idx_chats_uuid ON chats (uuid)")
+
+
+def _add_chat_archived_at(conn):
+    """Mark chats whose messages have been moved to the archive database."""
+    conn.execute("ALTER TABLE chats ADD COLUMN archived_at TIMESTAMP")
+
+
+def _add_chat_deleted_at(conn):
+    """Add soft-delete tombstones for chats.
+
+    The sidebar index becomes partial so tombstoned chats cost nothing to
+    skip, and a second partial index lets the purger find them directly.
+    """
+    conn.execute("ALTER TABLE chats ADD COLUMN deleted_at TIMESTAMP")
+    conn.execute("DROP INDEX IF EXISTS idx_chats_last_message_at")
+    conn.execute(
+        "CREATE INDEX idx_chats_last_message_at ON chats (last_message_at) "
+        "WHERE deleted_at IS NULL"
+    )
+    conn.execute(
+        "CREATE INDEX idx_chats_deleted_at ON chats (deleted_at) "
+        "WHERE deleted_at IS NOT NULL"
+    )
+
+
+def _add_change_log(conn):
+    """Record which chats change, so other processes can refresh just those.
+
+    Every change to a message also updates its chat's summary columns, so
+    triggers on chats alone catch new, edited and deleted messages too.
+    """
+    conn.execute(
+        "CREATE TABLE change_log ("
+        "id INTEGER PRIMARY KEY, "
+        "chat_id INTEGER NOT NULL)"
+    )
+    for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+        conn.execute(
+            f"CREATE TRIGGER chats_change_{event.lower()} AFTER {event} ON chats BEGIN "
+            f"INSERT INTO change_log (chat_id) VALUES ({row}.id); "
+            "END"
+        )
+
+
+def _add_message_tokens(conn):
+    """Store each message's token count per tokenizer family.
+
+    Rows are keyed by the message's (chat_id, seq) rather than its id, since
+    messages get new ids when they move to and from the archive. Existing
+    messages are counted afterwards by ChatDatabase.backfill_token_counts().
+    """
+    conn.execute(
+        "CREATE TABLE message_tokens ("
+        "chat_id INTEGER NOT NULL, "
+        "family TEXT NOT NULL, "
+        "seq INTEGER NOT NULL, "
+        "tokens INTEGER NOT NULL, "
+        "PRIMARY KEY (chat_id, family, seq)"
+        ") WITHOUT ROWID"
+    )
+
+
+def _add_message_blobs(conn):
+    """Store large message bodies once per distinct text in a blobs table.
+
+    Existing large bodies are moved into blobs as they are, without
+    recompressing. Their text does not change, so the search index stays
+    valid; only the triggers and the view it reads through are replaced.
+    """
+    conn.execute("ALTER TABLE messages ADD COLUMN blob_hash TEXT")
+    conn.execute(
+        "CREATE TABLE blobs ("
+        "hash TEXT PRIMARY KEY, "
+        "codec TEXT, "
+        "content, "
+        "size INTEGER NOT NULL, "
+        "refcount INTEGER NOT NULL DEFAULT 0)"
+    )
+    # Blobs only sit at zero references inside the transaction that drops them
+    conn.execute("CREATE INDEX idx_blobs_unreferenced ON blobs (hash) WHERE refcount = 0")
+
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER messages_fts_{trigger}")
+    conn.execute("DROP VIEW message_text")
+
+    # Compressed rows are the large ones; plain rows are checked by length
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, codec, content FROM messages WHERE id > ? "
+            "AND (codec IS NOT NULL OR length(CAST(content AS BLOB)) >= ?) "
+            "ORDER BY id LIMIT 1000",
+            (last_id, BLOB_THRESHOLD)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        for message_id, codec, content in rows:
+            text = decompress(codec, content)
+            size = len(text.encode("utf-8"))
+            if size < BLOB_THRESHOLD:
+                continue
+            digest = content_hash(text)
+            conn.execute(
+                "INSERT INTO blobs (hash, codec, content, size, refcount) "
+                "VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (hash) DO UPDATE SET refcount = refcount + 1",
+                (digest, codec, content, size)
+            )
+            conn.execute(
+                "UPDATE messages SET blob_hash = ?, codec = NULL, content = NULL "
+                "WHERE id = ?",
+                (digest, message_id)
+            )
+
+    conn.execute(f'''
+    CREATE VIEW message_text AS
+    SELECT m.id, {body_sql("m")} AS content FROM messages m
+    ''')
+    # One trigger per event, so the search index reads a deleted body
+    # before the blob holding it can be dropped
+    conn.execute(f'''
+    CREATE TRIGGER messages_after_insert AFTER INSERT ON messages BEGIN
+        UPDATE blobs SET refcount = refcount + 1 WHERE hash = new.blob_hash;
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, {body_sql("new")});
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER messages_after_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, {body_sql("old")});
+        UPDATE blobs SET refcount = refcount - 1 WHERE hash = old.blob_hash;
+        DELETE FROM blobs WHERE hash = old.blob_hash AND refcount <= 0;
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages
+    WHEN {body_sql("old")} IS NOT {body_sql("new")}
+    BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, {body_sql("old")});
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, {body_sql("new")});
+    END
+    ''')
+
+
+def _add_attachments(conn):
+    """Store files attached to messages, split into fixed-size chunks.
+
+    Each chunk is a row of its own, written and read with incremental blob
+    I/O, so a large file is never held in memory at once. An attachment is
+    only listed once ``complete`` is set after its last chunk is written.
+    """
+    conn.execute(
+        "CREATE TABLE attachments ("
+        "id INTEGER PRIMARY KEY, "
+        "chat_id INTEGER NOT NULL, "
+        "seq INTEGER, "
+        "name TEXT NOT NULL, "
+        "media_type TEXT NOT NULL, "
+        "size INTEGER NOT NULL, "
+        "sha256 TEXT, "
+        "complete INTEGER NOT NULL DEFAULT 0, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute("CREATE INDEX idx_attachments_chat ON attachments (chat_id, seq)")
+    # A rowid table, since incremental blob I/O addresses rows by rowid
+    conn.execute(
+        "CREATE TABLE attachment_chunks ("
+        "id INTEGER PRIMARY KEY, "
+        "attachment_id INTEGER NOT NULL, "
+        "chunk INTEGER NOT NULL, "
+        "data BLOB NOT NULL)"
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_attachment_chunks ON attachment_chunks (attachment_id, chunk)"
+    )
+
+
+def _add_chat_checkpoints(conn):
+    """Store rolling summaries of the early part of long chats.
+
+    A checkpoint summarizes a chat's messages up to ``through_seq``. A row
+    with no summary yet is a summary being written. Triggers remove every
+    checkpoint covering a message that is deleted or whose text or role
+    changes, including one still being written, so a summary never
+    outlives the messages it was made from. Moving a chat to the archive
+    changes nothing, so deletes from archived chats do not count.
+    """
+    conn.execute(
+        "CREATE TABLE chat_checkpoints ("
+        "id INTEGER PRIMARY KEY, "
+        "chat_id INTEGER NOT NULL, "
+        "through_seq INTEGER NOT NULL, "
+        "summary TEXT, "
+        "model TEXT, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute(
+        "CREATE INDEX idx_chat_checkpoints ON chat_checkpoints (chat_id, through_seq)"
+    )
+    conn.execute("""
+    CREATE TRIGGER messages_checkpoint_delete AFTER DELETE ON messages
+    WHEN (SELECT archived_at FROM chats WHERE id = old.chat_id) IS NULL
+    BEGIN
+        DELETE FROM chat_checkpoints
+        WHERE chat_id = old.chat_id AND through_seq >= old.seq;
+    END
+    """)
+    conn.execute(f'''
+    CREATE TRIGGER messages_checkpoint_update
+    AFTER UPDATE OF role, content, codec, blob_hash ON messages
+    WHEN old.role IS NOT new.role OR {body_sql("old")} IS NOT {body_sql("new")}
+    BEGIN
+        DELETE FROM chat_checkpoints
+        WHERE chat_id = old.chat_id AND through_seq >= old.seq;
+    END
+    ''')
+
+
+def _add_chat_next_seq(conn):
+    """Keep each chat's next message sequence number on the chat row.
+
+    Numbering from MAX(seq) handed a deleted newest message's seq to the
+    next message, which an import then took for the deleted one. The
+    counter only ever goes up. Messages of archived chats are not in this
+    file, so those chats catch up when they are restored.
+    """
+    conn.execute("ALTER TABLE chats ADD COLUMN next_seq INTEGER NOT NULL DEFAULT 1")
+    conn.execute(
+        "UPDATE chats SET next_seq = "
+        "(SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE chat_id = chats.id)"
+    )
+
+
+def _store_search_text(conn):
+    """Let the search index keep its own copy of each message's text.
+
+    The index used to read bodies through a view and triggers that called
+    the app's tw_decompress function, so any other tool writing to messages
+    failed with "no such function". The index now stores the plain text
+    itself, written by the app as messages are inserted or moved, and
+    nothing in the schema calls an app-defined function. Deleting a message
+    still drops its entry through a trigger.
+
+    A rewrite that changes a row's codec is a compaction, which keeps the
+    text, so checkpoints now watch the stored columns rather than the text.
+    """
+    for trigger in ("messages_after_insert", "messages_after_delete",
+                    "messages_fts_update", "messages_checkpoint_update"):
+        conn.execute(f"DROP TRIGGER {trigger}")
+    conn.execute("DROP TABLE messages_fts")
+    conn.execute("DROP VIEW message_text")
+
+    conn.execute('''
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        content,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute(
+        "INSERT INTO messages_fts (rowid, content) "
+        f"SELECT m.id, {body_sql('m')} FROM messages m"
+    )
+
+    conn.execute('''
+    CREATE TRIGGER messages_after_insert AFTER INSERT ON messages BEGIN
+        UPDATE blobs SET refcount = refcount + 1 WHERE hash = new.blob_hash;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_after_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.id;
+        UPDATE blobs SET refcount = refcount - 1 WHERE hash = old.blob_hash;
+        DELETE FROM blobs WHERE hash = old.blob_hash AND refcount <= 0;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER messages_checkpoint_update
+    AFTER UPDATE OF role, content, codec, blob_hash ON messages
+    WHEN old.role IS NOT new.role OR old.blob_hash IS NOT new.blob_hash
+        OR (old.codec IS new.codec AND old.content IS NOT new.content)
+    BEGIN
+        DELETE FROM chat_checkpoints
+        WHERE chat_id = old.chat_id AND through_seq >= old.seq;
+    END
+    ''')
+
+
+# Position in this list is the schema version the step upgrades to.
+# Never reorder or edit a released step; append a new one instead.
+MIGRATIONS = [
+    _create_base_tables,
+    _index_messages_by_chat,
+    _index_chats_by_created_at,
+    _add_message_seq,
+    _add_message_search,
+    _add_chat_summary_columns,
+    _add_message_codec,
+    _add_chat_uuid,
+    _add_chat_archived_at,
+    _add_chat_deleted_at,
+    _add_change_log,
+    _add_message_tokens,
+    _add_message_blobs,
+    _add_attachments,
+    _add_chat_checkpoints,
+    _add_chat_next_seq,
+    _store_search_text,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database.
+
+    Args:
+        conn: An open SQLite connection
+
+    Returns:
+        int: The current ``user_version``
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(pool):
+    """Bring the database schema up to SCHEMA_VERSION.
+
+    Args:
+        pool: The ConnectionPool whose writer connection should be migrated
+
+    Returns:
+        int: The schema version after migrating
+    """
+    with pool.writer() as conn:
+        version = get_schema_version(conn)
+
+    # A database written by a newer release is left untouched
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        with pool.writer() as conn:
+            # Another process sharing the file may have applied it meanwhile
+            if get_schema_version(conn) < target:
+                MIGRATIONS[target - 1](conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+        version = target
+
+    return version
@@ -0,0 +1,19 @@
+"""Text helpers shared by the database layer."""
+
+# Maximum number of characters kept for a chat's sidebar preview
+PREVIEW_LENGTH = 80
+
+
+def make_preview(content):
+    """Build the one-line preview stored for a chat's latest message.
+
+    Args:
+        content: The full message text
+
+    Returns:
+        str: The text with whitespace collapsed, cut to PREVIEW_LENGTH characters
+    """
+    text = " ".join((content or "").split())
+    if len(text) > PREVIEW_LENGTH:
+        text = text[:PREVIEW_LENGTH - 3] + "..."
+    return text
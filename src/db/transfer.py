@@ -0,0 +1,153 @@
+"""Streaming JSONL import and export of chat history.
+
+The format is one JSON object per line. The first line is a header, and
+each chat record is followed by the records of its messages::
+
+    {"type": "termwave-export", "version": 1}
+    {"type": "chat", "uuid": "...", "title": "...", "created_at": "..."}
+    {"type": "message", "chat": "<chat uuid>", "seq": 1, "role": "user", ...}
+
+Files ending in ``.gz`` are gzip-compressed on export; gzip input is detected
+automatically on import. A path of ``-`` means stdout or stdin.
+"""
+
+import gzip
+import io
+import json
+import sys
+from pathlib import Path
+
+FORMAT_NAME = "termwave-export"
+FORMAT_VERSION = 1
+
+# Large buffers keep the disk busy instead of issuing many small writes
+_BUFFER_SIZE = 1 << 20
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _open_for_export(path, use_gzip):
+    """Open the export destination as a text stream.
+
+    Returns:
+        tuple: The text stream, and the file opened for it, or None when
+            writing to stdout. GzipFile does not close the file it wraps,
+            so the caller closes it after the stream.
+    """
+    if str(path) == "-":
+        raw = sys.stdout.buffer
+        file = None
+    else:
+        raw = file = open(Path(path).expanduser(), "wb", buffering=_BUFFER_SIZE)
+
+    if use_gzip:
+        raw = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+    return io.TextIOWrapper(raw, encoding="utf-8", write_through=False), file
+
+
+def _open_for_import(path):
+    """Open the import source as a text stream, detecting gzip input.
+
+    Returns:
+        tuple: The text stream, and the file opened for it, or None when
+            reading from stdin
+    """
+    if str(path) == "-":
+        raw = sys.stdin.buffer
+        file = None
+    else:
+        raw = file = open(Path(path).expanduser(), "rb", buffering=_BUFFER_SIZE)
+
+    raw = io.BufferedReader(raw) if not hasattr(raw, "peek") else raw
+    if raw.peek(2)[:2] == _GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw, mode="rb")
+    return io.TextIOWrapper(raw, encoding="utf-8"), file
+
+
+def export_history(db, path, use_gzip=None):
+    """Write every chat and message in the database to a JSONL file.
+
+    Args:
+        db: The ChatDatabase to export
+        path: Destination file, or ``-`` for stdout
+        use_gzip: Compress the output. If None, compresses when path ends in .gz.
+
+    Returns:
+        dict: ``chats`` and ``messages`` counts written
+    """
+    if use_gzip is None:
+        use_gzip = str(path).endswith(".gz")
+
+    counts = {"chats": 0, "messages": 0}
+    stream, file = _open_for_export(path, use_gzip)
+    try:
+        stream.write(json.dumps({"type": FORMAT_NAME, "version": FORMAT_VERSION}) + "\n")
+        for record in db.iter_export_records():
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts["chats" if record["type"] == "chat" else "messages"] += 1
+    finally:
+        if file is None and not use_gzip:
+            stream.flush()
+            stream.detach()
+        else:
+            # Closing a gzip stream writes its trailer, then the file is closed
+            stream.close()
+            if file is not None:
+                file.close()
+
+    return counts
+
+
+def read_records(stream):
+    """Parse export records from a text stream, one line at a time.
+
+    Args:
+        stream: A text stream of JSONL data
+
+    Yields:
+        dict: Each chat or message record
+
+    Raises:
+        ValueError: If a line is not valid JSON or the file is from a newer version
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}") from e
+
+        if record.get("type") == FORMAT_NAME:
+            if record.get("version", 1) > FORMAT_VERSION:
+                raise ValueError(
+                    f"Export format version {record['version']} is not supported"
+                )
+            continue
+        yield record
+
+
+def import_history(db, path, batch_size=1000):
+    """Import chats and messages from a JSONL export.
+
+    Importing the same file more than once is safe: chats are matched by
+    UUID and messages by their position in the chat.
+
+    Args:
+        db: The ChatDatabase to import into
+        path: Source file, or ``-`` for stdin
+        batch_size: Number of records written per transaction
+
+    Returns:
+        dict: ``chats`` and ``messages`` counts of newly added rows
+    """
+    stream, file = _open_for_import(path)
+    try:
+        return db.import_records(read_records(stream), batch_size=batch_size)
+    finally:
+        if file is None:
+            stream.detach()
+        else:
+            stream.close()
+            file.close()
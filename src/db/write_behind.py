@@ -0,0 +1,75 @@
+"""Write-behind buffering with group commit."""
+
+import threading
+
+
+class WriteBehindQueue:
+    """Buffers writes in memory and flushes them in batches.
+
+    Items are handed to ``flush_batch`` as a list, which is expected to write
+    them all in one transaction. A flush happens when ``threshold`` items are
+    waiting, ``interval`` seconds after the first item was queued, or when
+    ``flush()`` is called explicitly, whichever comes first.
+    """
+
+    def __init__(self, flush_batch, interval=0.05, threshold=64):
+        """Initialize the queue.
+
+        Args:
+            flush_batch: Callable that persists a list of queued items
+            interval: Maximum seconds an item may wait before being flushed
+            threshold: Number of queued items that triggers an immediate flush
+        """
+        self.flush_batch = flush_batch
+        self.interval = interval
+        self.threshold = threshold
+
+        # Held for the whole flush so readers that flush first always see it
+        self._lock = threading.RLock()
+        self._items = []
+        self._timer = None
+
+    def __len__(self):
+        """Return the number of items waiting to be flushed."""
+        with self._lock:
+            return len(self._items)
+
+    def add(self, item):
+        """Queue an item, flushing if the batch is full.
+
+        Args:
+            item: The item to write
+        """
+        with self._lock:
+            self._items.append(item)
+            if len(self._items) >= self.threshold:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write every queued item now.
+
+        If the write fails the items are put back at the front of the queue
+        and the error is re-raised.
+
+        Returns:
+            int: The number of items written
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._items:
+                return 0
+
+            batch, self._items = self._items, []
+            try:
+                self.flush_batch(batch)
+            except BaseException:
+                self._items = batch + self._items
+                raise
+            return len(batch)
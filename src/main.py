@@ -1,17 +1,139 @@
 """Main entry point for TermWave."""
 
+import argparse
+import sys
+from pathlib import Path
+
 from src.app import AIChatApp
+from src.db.backup import DEFAULT_KEEP, backup_database
+from src.db.database import ChatDatabase
+from src.db.transfer import export_history, import_history
+
+
+def build_parser():
+    """Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser for the termwave command
+    """
+    parser = argparse.ArgumentParser(prog="termwave", description="Simple CLUI AI chat")
+    parser.add_argument(
+        "--db", dest="db_path", default=None,
+        help="Path to the chat database (default: ~/.aichat/chat_history.db)"
+    )
+    parser.add_argument(
+        "--ephemeral", action="store_true",
+        help="Keep history and settings in memory and write nothing to disk"
+    )
+    parser.add_argument(
+        "--persist", dest="persist_path", default=None, metavar="PATH",
+        help="With --ephemeral, save the session's history to this new file on exit"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    export_parser = subparsers.add_parser("export", help="Export all chats as JSONL")
+    export_parser.add_argument("path", help="Output file, or - for stdout")
+    export_parser.add_argument(
+        "--gzip", action="store_true", default=None,
+        help="Compress the output (default when the path ends in .gz)"
+    )
+
+    import_parser = subparsers.add_parser("import", help="Import chats from a JSONL export")
+    import_parser.add_argument("path", help="Input file, or - for stdin")
+    import_parser.add_argument(
+        "--batch-size", type=int, default=1000,
+        help="Records written per transaction"
+    )
+
+    backup_parser = subparsers.add_parser(
+        "backup", help="Write a consistent snapshot of the database while it is in use"
+    )
+    backup_parser.add_argument(
+        "--dir", dest="directory", default=None,
+        help="Snapshot directory (default: backups/ next to the database)"
+    )
+    backup_parser.add_argument(
+        "--keep", type=int, default=DEFAULT_KEEP,
+        help="Number of snapshots to keep"
+    )
+    backup_parser.add_argument(
+        "--verify", action="store_true",
+        help="Run an integrity check on the new snapshot"
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """Run the TermWave application or one of its maintenance commands.
+
+    Args:
+        argv: Command line arguments. If None, uses sys.argv.
+
+    Returns:
+        int: Process exit status
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    db_path = Path(args.db_path).expanduser() if args.db_path else None
+    persist_path = Path(args.persist_path).expanduser() if args.persist_path else None
+
+    if args.ephemeral:
+        if db_path is not None:
+            parser.error("--db cannot be used with --ephemeral")
+        if args.command is not None:
+            parser.error(f"{args.command} cannot be used with --ephemeral")
+        if persist_path is not None and persist_path.exists():
+            parser.error(f"--persist: {persist_path} already exists")
+    elif persist_path is not None:
+        parser.error("--persist requires --ephemeral")
+
+    if args.command is None:
+        app = AIChatApp(db_path=db_path, ephemeral=args.ephemeral, persist_path=persist_path)
+        app.run()
+        if isinstance(app.persist_result, Exception):
+            print(f"Could not save the session: {app.persist_result}", file=sys.stderr)
+            return 1
+        if app.persist_result:
+            print(f"Saved the session to {app.persist_result['path']}.", file=sys.stderr)
+        return 0
 
+    status = 0
+    db = ChatDatabase(db_path=db_path)
+    try:
+        if args.command == "export":
+            counts = export_history(db, args.path, use_gzip=args.gzip)
+            print(
+                f"Exported {counts['chats']} chats and {counts['messages']} messages.",
+                file=sys.stderr,
+            )
+        elif args.command == "import":
+            counts = import_history(db, args.path, batch_size=args.batch_size)
+            print(
+                f"Imported {counts['chats']} new chats and {counts['messages']} new messages.",
+                file=sys.stderr,
+            )
+        elif args.command == "backup":
+            result = backup_database(
+                db, args.directory, keep=args.keep, verify=args.verify
+            )
+            print(f"Wrote snapshot {result['path']}.", file=sys.stderr)
+            if result["problems"]:
+                print("Integrity check failed:", file=sys.stderr)
+                for problem in result["problems"]:
+                    print(f"  {problem}", file=sys.stderr)
+                status = 1
+            elif args.verify:
+                print("Integrity check passed.", file=sys.stderr)
+    finally:
+        db.close()
 
-def main():
-    """Run the TermWave application."""
-    app = AIChatApp()
-    app.run()
+    return status
 
 
 # This function helps with testing the __main__ block
 def _run_if_main():
-    main()
+    sys.exit(main())
 
 
 # This allows us to test in a controlled way
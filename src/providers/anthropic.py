@@ -1,27 +1,75 @@
-"""Anthropic chat provider implementation."""
+"""Anthropic chat provider implementation.
 
-from .base import ChatProvider
+Responses are streamed from the Messages API over server-sent events.
+
+With prompt caching on, cache breakpoints are placed so that the stable
+start of the conversation is only processed and billed in full once: the
+system prompt and the last message are marked, and so is the user message
+that ended the previous request, so everything that request wrote to the
+cache is read back. Each response reports how many input tokens were
+written to or read from the cache; the counts are totalled in
+``cache_stats``.
+"""
+
+import json
+import os
+
+from src.tokens import FAMILY_ANTHROPIC
+from src.transport import TransportRegistry
+
+from .base import ChatProvider, ProviderError
+
+API_URL = "https://api.anthropic.com"
+API_VERSION = "2023-06-01"
+
+# The API accepts at most this many cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+_CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class AnthropicProvider(ChatProvider):
     """Chat provider using Anthropic's API."""
 
+    tokenizer_family = FAMILY_ANTHROPIC
+    summary_model = "claude-3-5-haiku-latest"
+
     @property
     def name(self):
         """Return the name of the provider."""
         return "Anthropic"
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, http_client=None):
         """Initialize the Anthropic provider.
 
         Args:
             api_key: API key for Anthropic. If None, will try to use environment variable.
+            http_client: Shared pooled client to send requests through, borrowed
+                from the app's TransportRegistry. If None, a client of its own is
+                used, which aclose() closes.
         """
-        self.api_key = api_key
+        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        self._own_transports = None
+        if http_client is None:
+            self._own_transports = TransportRegistry()
+            http_client = self._own_transports.client("anthropic")
+        self.http_client = http_client
         self.options = {
-            "model": "claude-2",
+            "model": "claude-3-7-sonnet-latest",
             "temperature": 0.7,
             "max_tokens": 1000,
+            "prompt_caching": True,
+            "base_url": API_URL,
+        }
+        self.last_usage = None
+        self.cache_stats = {
+            "requests": 0,
+            "hits": 0,
+            "misses": 0,
+            "input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "output_tokens": 0,
         }
 
     def get_provider_model_list(self):
@@ -35,19 +83,189 @@ class AnthropicProvider(ChatProvider):
     async def generate_response(self, messages):
         """Generate a response using Anthropic's API.
 
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Returns:
+            str: The assistant's response, or the error if there is none
+        """
+        try:
+            return await self.complete(messages)
+        except ProviderError as e:
+            return str(e)
+
+    async def complete(self, messages):
+        """Generate a response using Anthropic's API, raising on failure.
+
         Args:
             messages: List of message objects with 'role' and 'content'
 
         Returns:
             str: The assistant's response
+
+        Raises:
+            ProviderError: If the request could not be made or failed
+        """
+        return "".join([chunk async for chunk in self._stream(messages)])
+
+    async def stream_response(self, messages):
+        """Stream a response from Anthropic's Messages API as it is generated.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Yields:
+            str: Successive pieces of the assistant's response, ending with
+                the error if the request failed
+        """
+        try:
+            async for chunk in self._stream(messages):
+                yield chunk
+        except ProviderError as e:
+            yield str(e)
+
+    async def _stream(self, messages):
+        """Send a Messages API request and yield the text of its stream.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Yields:
+            str: Successive pieces of the assistant's response
+
+        Raises:
+            ProviderError: If the request could not be made or failed
         """
-        import asyncio
+        if not self.api_key:
+            raise ProviderError(
+                "Error: Anthropic API key not found. Please set the ANTHROPIC_API_KEY environment variable."
+            )
+        if self.http_client is None:
+            raise ProviderError("Error: the Anthropic provider needs the httpx package.")
 
-        # Simulate a small delay to mimic network latency
-        await asyncio.sleep(0.5)
+        try:
+            body = await self.build_request(messages)
+            usage = {}
+            async with self.http_client.stream(
+                "POST",
+                f"{self.options['base_url'].rstrip('/')}/v1/messages",
+                json=body,
+                headers={
+                    "x-api-key": self.api_key,
+                    "anthropic-version": API_VERSION,
+                    "content-type": "application/json",
+                },
+            ) as response:
+                if response.status_code >= 400:
+                    detail = _error_message(await response.aread())
+                    raise ProviderError(
+                        f"Error generating response from Anthropic: {response.status_code} {detail}"
+                    )
 
-        # TODO: Implement Anthropic API integration
-        return "Anthropic integration not yet implemented. This is a placeholder."
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    kind = event.get("type")
+                    if kind == "message_start":
+                        usage.update(event["message"].get("usage", {}))
+                    elif kind == "content_block_delta":
+                        delta = event.get("delta", {})
+                        if delta.get("type") == "text_delta" and delta.get("text"):
+                            yield delta["text"]
+                    elif kind == "message_delta":
+                        usage.update(event.get("usage", {}))
+                    elif kind == "error":
+                        raise ProviderError(
+                            f"Error generating response from Anthropic: {event['error'].get('message')}"
+                        )
+
+            self._record_usage(usage)
+
+        except ProviderError:
+            raise
+        except Exception as e:
+            raise ProviderError(f"Error generating response from Anthropic: {str(e)}") from e
+
+    async def build_request(self, messages):
+        """Build the Messages API request body for a conversation.
+
+        System messages become the system prompt. Consecutive messages from
+        the same role are merged, as the API requires turns to alternate.
+        Text attachments are added as extra content blocks.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Returns:
+            dict: The JSON request body
+        """
+        system = []
+        turns = []
+        for message in messages:
+            blocks = [{"type": "text", "text": message["content"]}]
+            for attachment in message.get("attachments", ()):
+                text = await self.read_attachment_text(attachment)
+                if text is not None:
+                    blocks.append({"type": "text", "text": f"--- {attachment['name']} ---\n{text}"})
+
+            if message["role"] == "system":
+                system.extend(blocks)
+            elif turns and turns[-1]["role"] == message["role"]:
+                turns[-1]["content"].extend(blocks)
+            else:
+                turns.append({"role": message["role"], "content": blocks})
+
+        if self.options["prompt_caching"]:
+            add_cache_breakpoints(system, turns)
+
+        body = {
+            "model": self.options["model"],
+            "max_tokens": self.options["max_tokens"],
+            "temperature": self.options["temperature"],
+            "messages": turns,
+            "stream": True,
+        }
+        if system:
+            body["system"] = system
+        return body
+
+    def _record_usage(self, usage):
+        """Add a response's token usage to the cache statistics.
+
+        Args:
+            usage: The merged usage reported by the stream
+        """
+        self.last_usage = usage
+        stats = self.cache_stats
+        stats["requests"] += 1
+        for key in ("input_tokens", "cache_creation_input_tokens",
+                    "cache_read_input_tokens", "output_tokens"):
+            stats[key] += usage.get(key) or 0
+        if usage.get("cache_read_input_tokens"):
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+
+    def get_cache_stats(self):
+        """Summarise prompt cache use since the provider was created.
+
+        Returns:
+            dict: The totals in ``cache_stats``, plus ``hit_rate``, the share
+                of prompt tokens served from the cache
+        """
+        stats = dict(self.cache_stats)
+        prompt_tokens = (
+            stats["input_tokens"] + stats["cache_creation_input_tokens"]
+            + stats["cache_read_input_tokens"]
+        )
+        stats["hit_rate"] = stats["cache_read_input_tokens"] / prompt_tokens if prompt_tokens else 0.0
+        return stats
+
+    async def aclose(self):
+        """Close the client of our own, if the provider was not given one."""
+        if self._own_transports is not None:
+            await self._own_transports.aclose()
 
     def get_provider_options(self):
         """Get provider-specific options.
@@ -71,3 +289,34 @@ class AnthropicProvider(ChatProvider):
             self.options[option_name] = option_value
             return True
         return False
+
+
+def add_cache_breakpoints(system, turns):
+    """Mark the stable prefix of a request for prompt caching.
+
+    Breakpoints go on the end of the system prompt, on the last turn, and on
+    the user turn before it. The last turn's breakpoint writes the whole
+    conversation to the cache. The earlier user turn ended the previous
+    request, so its breakpoint matches the prefix that request wrote and
+    that prefix is read from the cache.
+
+    Args:
+        system: System prompt content blocks, modified in place
+        turns: Message turns with lists of content blocks, modified in place
+    """
+    targets = [system[-1]] if system else []
+    previous = [turn for turn in turns[:-1] if turn["role"] == "user"]
+    if previous:
+        targets.append(previous[-1]["content"][-1])
+    if turns:
+        targets.append(turns[-1]["content"][-1])
+    for block in targets[-MAX_CACHE_BREAKPOINTS:]:
+        block["cache_control"] = dict(_CACHE_CONTROL)
+
+
+def _error_message(body):
+    """Pull the message out of an API error response body."""
+    try:
+        return json.loads(body)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return body.decode("utf-8", "replace")
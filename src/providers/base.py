@@ -1,11 +1,44 @@
 """Base class for chat providers."""
 
+import codecs
+import re
 from abc import ABC, abstractmethod
 
+from src.tokens import FAMILY_APPROX
+
+# Most characters of an attachment inlined into a prompt
+ATTACHMENT_TEXT_LIMIT = 100_000
+
+# A word with the whitespace before it, the unit simulated streams emit
+_WORD_CHUNK_PATTERN = re.compile(r"\s*\S+|\s+$")
+
+# Non-text/* media types whose contents are readable text
+_TEXT_MEDIA_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-sh",
+    "application/x-yaml",
+}
+
+
+class ProviderError(Exception):
+    """A provider could not produce a response.
+
+    The message is worded for the user, as generate_response() returns it
+    in place of a response.
+    """
+
 
 class ChatProvider(ABC):
     """Base class that all chat providers must implement."""
 
+    # Tokenizer family used to measure this provider's context
+    tokenizer_family = FAMILY_APPROX
+
+    # Cheaper model that writes checkpoint summaries; None if the provider does not summarize
+    summary_model = None
+
     @property
     @abstractmethod
     def name(self):
@@ -17,13 +50,96 @@ class ChatProvider(ABC):
         """Generate a response based on the conversation history.
 
         Args:
-            messages: List of message objects with 'role' and 'content'
+            messages: List of message objects with 'role' and 'content', and
+                optionally 'attachments' (see read_attachment_text)
 
         Returns:
             str: The assistant's response
         """
         pass
 
+    async def complete(self, messages):
+        """Generate a response, raising ProviderError if there is none.
+
+        generate_response() reports failures as the response text, which
+        suits the transcript; callers that use the text for anything else
+        call this instead. Providers that can fail should override it.
+
+        Args:
+            messages: List of message objects, as for generate_response()
+
+        Returns:
+            str: The assistant's response
+
+        Raises:
+            ProviderError: If the provider could not produce a response
+        """
+        return await self.generate_response(messages)
+
+    async def stream_response(self, messages):
+        """Generate a response, yielding it piece by piece as it is produced.
+
+        Providers that can stream should override this; the default yields
+        the whole of generate_response() as a single chunk.
+
+        Args:
+            messages: List of message objects, as for generate_response()
+
+        Yields:
+            str: Successive pieces of the assistant's response
+        """
+        yield await self.generate_response(messages)
+
+    def get_cache_stats(self):
+        """Summarise prompt cache use, for providers that cache prompts.
+
+        Returns:
+            dict: Cache totals including ``hits``, ``misses`` and ``hit_rate``,
+                or None if the provider does not cache prompts
+        """
+        return
+
+    async def aclose(self):
+        """Release connections the provider opened for itself.
+
+        A client borrowed from the app's TransportRegistry is left open for
+        the registry to close. The default does nothing.
+        """
+
+    async def read_attachment_text(self, attachment, limit=ATTACHMENT_TEXT_LIMIT):
+        """Read the text of an attachment, streaming it chunk by chunk.
+
+        Only as much of the file as fits in the limit is read, so large
+        attachments are never loaded whole.
+
+        Args:
+            attachment: Dict with 'name', 'media_type', 'size' and 'read', a
+                callable returning an async iterator of byte chunks
+            limit: Most characters to return
+
+        Returns:
+            str: The decoded text, or None if the attachment is not text
+        """
+        media_type = attachment["media_type"]
+        if not (media_type.startswith("text/") or media_type in _TEXT_MEDIA_TYPES):
+            return None
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parts, length = [], 0
+        chunks = attachment["read"]()
+        try:
+            async for chunk in chunks:
+                text = decoder.decode(chunk)
+                parts.append(text[:limit - length])
+                length += len(parts[-1])
+                if length >= limit:
+                    break
+            else:
+                parts.append(decoder.decode(b"", final=True))
+        finally:
+            await chunks.aclose()
+        return "".join(parts)[:limit]
+
     @abstractmethod
     def get_provider_model_list(self):
         """Get a list of available models for the provider.
@@ -54,3 +170,16 @@ class ChatProvider(ABC):
             bool: True if the option was set successfully
         """
         pass
+
+
+def split_into_chunks(text):
+    """Split text into the word-sized pieces a streaming model would send.
+
+    Args:
+        text: The complete response
+
+    Returns:
+        list: Pieces that join back into text, each a word and the
+            whitespace before it
+    """
+    return _WORD_CHUNK_PATTERN.findall(text)
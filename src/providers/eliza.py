@@ -11,7 +11,7 @@ import os
 import asyncio
 from pathlib import Path
 
-from .base import ChatProvider
+from .base import ChatProvider, split_into_chunks
 
 # Import the Eliza class from the eliza module we copied locally
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
@@ -30,6 +30,7 @@ class ElizaProvider(ChatProvider):
         """Initialize the Eliza provider with default options."""
         self.options = {
             "response_delay": 0.5,  # Seconds to delay before responding
+            "stream_delay": 0.02,  # Seconds between streamed words
             "model": "doctor",  # Can be 'doctor' only for now
         }
         
@@ -78,6 +79,34 @@ class ElizaProvider(ChatProvider):
         if self.options["response_delay"] > 0:
             await asyncio.sleep(self.options["response_delay"])
 
+        return self._compose_response(messages)
+
+    async def stream_response(self, messages):
+        """Stream Eliza's response a word at a time, as a typist would.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Yields:
+            str: Successive words of the response
+        """
+        if self.options["response_delay"] > 0:
+            await asyncio.sleep(self.options["response_delay"])
+
+        for chunk in split_into_chunks(self._compose_response(messages)):
+            yield chunk
+            if self.options["stream_delay"] > 0:
+                await asyncio.sleep(self.options["stream_delay"])
+
+    def _compose_response(self, messages):
+        """Pick Eliza's reply to the last user message.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Returns:
+            str: The assistant's response
+        """
         if not messages:
             return self.eliza.initial()
 
@@ -1,6 +1,8 @@
 """Mock chat provider for testing and development."""
 
-from .base import ChatProvider
+import asyncio
+
+from .base import ChatProvider, split_into_chunks
 
 
 class MockProvider(ChatProvider):
@@ -15,6 +17,7 @@ class MockProvider(ChatProvider):
         """Initialize the mock provider with default options."""
         self.options = {
             "response_delay": 0.5,  # Seconds to delay before responding
+            "stream_delay": 0.02,  # Seconds between streamed words
             "response_type": "normal",  # Can be 'normal', 'code', 'error'
         }
 
@@ -27,12 +30,39 @@ class MockProvider(ChatProvider):
         Returns:
             str: A mock response based on the last user message
         """
-        import asyncio
-
         # Simulate a small delay to mimic network latency
         if self.options["response_delay"] > 0:
             await asyncio.sleep(self.options["response_delay"])
 
+        return self._compose_response(messages)
+
+    async def stream_response(self, messages):
+        """Stream a mock response a word at a time.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Yields:
+            str: Successive words of the mock response
+        """
+        # The latency before the first token, as a real API would have
+        if self.options["response_delay"] > 0:
+            await asyncio.sleep(self.options["response_delay"])
+
+        for chunk in split_into_chunks(self._compose_response(messages)):
+            yield chunk
+            if self.options["stream_delay"] > 0:
+                await asyncio.sleep(self.options["stream_delay"])
+
+    def _compose_response(self, messages):
+        """Build the mock response text.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Returns:
+            str: A mock response based on the last user message
+        """
         if not messages:
             return "I don't have any messages to respond to."
 
@@ -1,29 +1,36 @@
 """OpenAI chat provider implementation."""
 
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 
 from openai import AsyncOpenAI
 
-from .base import ChatProvider
+from src.tokens import FAMILY_OPENAI
+
+from .base import ChatProvider, ProviderError
 
 
 class OpenAIProvider(ChatProvider):
     """Chat provider using OpenAI's API."""
 
+    tokenizer_family = FAMILY_OPENAI
+    summary_model = "gpt-4o-mini"
+
     @property
     def name(self):
         """Return the name of the provider."""
         return "OpenAI"
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, http_client=None):
         """Initialize the OpenAI provider.
 
         Args:
             api_key: API key for OpenAI. If None, will try to use environment variable.
+            http_client: Shared pooled client to send requests through, borrowed
+                from the app's TransportRegistry. If None, the SDK creates its own.
         """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        self.client = AsyncOpenAI(api_key=self.api_key, http_client=http_client)
         self.options = {
             "model": "o3-mini",
             "temperature": 0.7,
@@ -33,18 +40,40 @@ class OpenAIProvider(ChatProvider):
     async def generate_response(self, messages: List[Dict[str, str]]) -> str:
         """Generate a response using OpenAI's API.
 
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Returns:
+            str: The assistant's response, or the error if there is none
+        """
+        try:
+            return await self.complete(messages)
+        except ProviderError as e:
+            return str(e)
+
+    async def complete(self, messages: List[Dict[str, Any]]) -> str:
+        """Generate a response using OpenAI's API, raising on failure.
+
         Args:
             messages: List of message objects with 'role' and 'content'
 
         Returns:
             str: The assistant's response
+
+        Raises:
+            ProviderError: If the API key is missing or the request failed
         """
         if not self.api_key:
-            return "Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
+            raise ProviderError(
+                "Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
+            )
 
         try:
             # Convert messages to format expected by OpenAI API
-            api_messages = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+            api_messages = [
+                {"role": msg["role"], "content": await self._message_content(msg)}
+                for msg in messages
+            ]
 
             # Call OpenAI API
             response = await self.client.chat.completions.create(
@@ -55,10 +84,59 @@ class OpenAIProvider(ChatProvider):
             )
 
             # Extract response text
-            return response.choices[0].message.content
+            return response.choices[0].message.content or ""
 
         except Exception as e:
-            return f"Error generating response from OpenAI: {str(e)}"
+            raise ProviderError(f"Error generating response from OpenAI: {str(e)}") from e
+
+    async def stream_response(self, messages: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Stream a response from OpenAI's API as it is generated.
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+
+        Yields:
+            str: Successive pieces of the assistant's response
+        """
+        if not self.api_key:
+            yield "Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
+            return
+
+        try:
+            api_messages = [
+                {"role": msg["role"], "content": await self._message_content(msg)}
+                for msg in messages
+            ]
+
+            stream = await self.client.chat.completions.create(
+                model=self.options["model"],
+                messages=api_messages,
+                temperature=self.options["temperature"],
+                max_tokens=self.options["max_tokens"],
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            yield f"Error generating response from OpenAI: {str(e)}"
+
+    async def _message_content(self, message: Dict[str, Any]) -> str:
+        """Return a message's content with its text attachments inlined.
+
+        Args:
+            message: Message object, optionally with 'attachments'
+
+        Returns:
+            str: The content to send to the API
+        """
+        content = message["content"]
+        for attachment in message.get("attachments", ()):
+            text = await self.read_attachment_text(attachment)
+            if text is not None:
+                content += f"\n\n--- {attachment['name']} ---\n{text}"
+        return content
 
     def get_provider_model_list(self) -> List[str]:
         """Get a list of available models for the provider.
@@ -0,0 +1,100 @@
+"""Token counting for context budgeting.
+
+Providers count tokens differently, so counts are kept per tokenizer
+family. The ``openai`` family uses the real tokenizer when the optional
+``tiktoken`` package is installed. Anthropic does not publish a local
+tokenizer, and the ``approx`` family is meant for providers without one, so
+both use an estimate: about one token per four characters of each word,
+at least one per word, and one per punctuation mark.
+"""
+
+import re
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+
+FAMILY_APPROX = "approx"
+FAMILY_OPENAI = "openai"
+FAMILY_ANTHROPIC = "anthropic"
+
+# Every family ChatDatabase stores counts for
+TOKENIZER_FAMILIES = (FAMILY_APPROX, FAMILY_OPENAI, FAMILY_ANTHROPIC)
+
+# Encoding used by current OpenAI chat models
+_OPENAI_ENCODING = "o200k_base"
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_encodings = {}
+
+
+def estimate_tokens(text):
+    """Estimate the token count of text without a tokenizer.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        int: The estimated number of tokens
+    """
+    return sum(max(1, (len(piece) + 2) // 4) for piece in _WORD_PATTERN.findall(text))
+
+
+def _tiktoken_count(text, encoding_name):
+    """Count tokens with tiktoken, loading the encoding on first use."""
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        encoding = _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text, family=FAMILY_APPROX):
+    """Count the tokens in text as a tokenizer family would.
+
+    Args:
+        text: The text to measure
+        family: One of TOKENIZER_FAMILIES
+
+    Returns:
+        int: The number of tokens
+
+    Raises:
+        ValueError: If the family is not known
+    """
+    if family not in TOKENIZER_FAMILIES:
+        raise ValueError(f"Unknown tokenizer family: {family}")
+    if family == FAMILY_OPENAI and tiktoken is not None:
+        return _tiktoken_count(text, _OPENAI_ENCODING)
+    return estimate_tokens(text)
+
+
+def count_tokens_by_family(text, families=TOKENIZER_FAMILIES):
+    """Count the tokens in text for several tokenizer families at once.
+
+    Families that fall back to the estimate share a single count.
+
+    Args:
+        text: The text to measure
+        families: Tokenizer families to count for
+
+    Returns:
+        dict: Family name mapped to its token count
+
+    Raises:
+        ValueError: If a family is not known
+    """
+    counts = {}
+    estimate = None
+    for family in families:
+        if family not in TOKENIZER_FAMILIES:
+            raise ValueError(f"Unknown tokenizer family: {family}")
+        if family == FAMILY_OPENAI and tiktoken is not None:
+            counts[family] = _tiktoken_count(text, _OPENAI_ENCODING)
+        else:
+            if estimate is None:
+                estimate = estimate_tokens(text)
+            counts[family] = estimate
+    return counts
@@ -0,0 +1,141 @@
+"""Shared HTTP connection pools for the chat providers.
+
+Providers are rebuilt on every ``/provider`` switch, so a client owned by a
+provider would throw away its warm, TLS-negotiated connections each time.
+Instead the app keeps one TransportRegistry for its whole run: providers
+borrow a client from it and never close it, and the app closes the registry
+on exit.
+
+Clients use keep-alive with configurable pool limits, and HTTP/2 when the
+optional ``h2`` package is installed. The HTTP client library is whichever
+the OpenAI SDK accepts: newer SDKs are built on the ``httpx2`` fork, older
+ones on ``httpx``.
+"""
+
+import importlib.util
+
+try:
+    import httpx2 as httpx
+except ImportError:
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover - depends on the environment
+        httpx = None
+
+
+# Most connections open at once, per client
+DEFAULT_MAX_CONNECTIONS = 20
+
+# Most idle connections kept open for reuse, per client
+DEFAULT_MAX_KEEPALIVE = 10
+
+# Seconds an idle connection is kept before it is closed
+DEFAULT_KEEPALIVE_EXPIRY = 120.0
+
+# Seconds to wait for a request; streamed replies can pause between tokens
+DEFAULT_TIMEOUT = 60.0
+
+# Seconds to wait for a connection to be established
+_CONNECT_TIMEOUT = 10.0
+
+
+def http2_available():
+    """Return whether HTTP/2 can be negotiated.
+
+    Returns:
+        bool: True if the ``h2`` package is installed
+    """
+    return importlib.util.find_spec("h2") is not None
+
+
+class TransportRegistry:
+    """App-wide registry of pooled HTTP clients that providers borrow."""
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY, http2=True,
+                 timeout=DEFAULT_TIMEOUT):
+        """Configure the clients the registry hands out.
+
+        Args:
+            max_connections: Most connections open at once, per client
+            max_keepalive_connections: Most idle connections kept, per client
+            keepalive_expiry: Seconds an idle connection is kept open
+            http2: Negotiate HTTP/2 when the ``h2`` package is installed
+            timeout: Seconds to wait for a response
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and http2_available()
+        self.timeout = timeout
+        self._clients = {}
+        self.closed = False
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a registry from the ``http`` section of the settings.
+
+        Args:
+            config: The app's Config
+
+        Returns:
+            TransportRegistry: The configured registry
+        """
+        return cls(
+            max_connections=config.get("http.max_connections", DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=config.get(
+                "http.max_keepalive_connections", DEFAULT_MAX_KEEPALIVE
+            ),
+            keepalive_expiry=config.get("http.keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY),
+            http2=config.get("http.http2", True),
+            timeout=config.get("http.timeout", DEFAULT_TIMEOUT),
+        )
+
+    @property
+    def available(self):
+        """Whether an HTTP client library is installed."""
+        return httpx is not None
+
+    def client(self, name="default"):
+        """Borrow the pooled client registered under a name.
+
+        The client is created on first use and reused by every later caller,
+        so its open connections survive provider switches. Callers must not
+        close it.
+
+        Args:
+            name: Key for the pool, e.g. a provider name, so services that
+                need different settings do not share one
+
+        Returns:
+            AsyncClient: The shared client, or None if no HTTP client library
+                is installed
+
+        Raises:
+            RuntimeError: If the registry has been closed
+        """
+        if self.closed:
+            raise RuntimeError("TransportRegistry is closed")
+        if httpx is None:
+            return None
+
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=_CONNECT_TIMEOUT),
+            )
+        return client
+
+    async def aclose(self):
+        """Close every client and its connections. Safe to call twice."""
+        self.closed = True
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
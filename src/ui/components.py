@@ -1,25 +1,99 @@
 """UI components for TermWave."""
 
-from textual.widgets import ListItem, Static, Button
+from rich.markup import escape
+from textual.binding import Binding
+from textual.message import Message
+from textual.widgets import ListItem, ListView, Static, Button
 
 
 class ChatHistoryItem(ListItem):
     """A list item representing a chat history entry."""
     
-    def __init__(self, chat_id, title, timestamp):
+    def __init__(self, chat_id, title, timestamp, preview=None, last_message_at=None):
         """Initialize a chat history item.
         
         Args:
             chat_id: The ID of the chat in the database
             title: The title of the chat
             timestamp: The formatted timestamp of the chat
+            preview: Optional preview of the chat's latest message
+            last_message_at: Optional raw activity time from the database,
+                used to tell whether the chat has moved in the list
         """
         super().__init__()
         self.chat_id = chat_id
         self.title = title
         self.timestamp = timestamp
+        self.preview = preview
+        self.last_message_at = last_message_at
+        self.marked = False
+
+    def update_summary(self, title, timestamp, preview=None):
+        """Show a new title, timestamp and preview without rebuilding the item.
+
+        Args:
+            title: The title of the chat
+            timestamp: The formatted timestamp of the chat
+            preview: Optional preview of the chat's latest message
+        """
+        self.title = title
+        self.timestamp = timestamp
+        self.preview = preview
+        if self.is_mounted:
+            self.query_one(f"#title-{self.chat_id}", Static).update(self._summary_text())
+
+    def toggle_mark(self):
+        """Toggle whether this chat is marked for a bulk action."""
+        self.marked = not self.marked
+        self.set_class(self.marked, "marked")
     
+    def _summary_text(self):
+        """Build the markup shown for this chat."""
+        text = f"[bold]{self.timestamp}[/bold]\n{self.title}"
+        if self.preview:
+            text += f"\n[dim]{escape(self.preview)}[/dim]"
+        return text
+
     def compose(self):
         """Compose the chat history item with title and delete button."""
-        yield Static(f"[bold]{self.timestamp}[/bold]\n{self.title}", id=f"title-{self.chat_id}")
-        yield Button("X", id=f"delete-{self.chat_id}", classes="delete-btn")
\ No newline at end of file
+        yield Static(self._summary_text(), id=f"title-{self.chat_id}")
+        yield Button("X", id=f"delete-{self.chat_id}", classes="delete-btn")
+
+
+class ChatHistoryList(ListView):
+    """The sidebar list of chats, with marking for bulk deletes."""
+
+    BINDINGS = [
+        Binding("space", "toggle_mark", "Mark chat"),
+        Binding("delete", "delete_marked", "Delete chats"),
+    ]
+
+    class DeleteRequested(Message):
+        """Posted when the user asks to delete chats from the list."""
+
+        def __init__(self, chat_ids):
+            """Initialize the message.
+
+            Args:
+                chat_ids: IDs of the chats to delete
+            """
+            super().__init__()
+            self.chat_ids = chat_ids
+
+    @property
+    def marked_chat_ids(self):
+        """Return the IDs of the marked chats, in list order."""
+        return [item.chat_id for item in self.query(ChatHistoryItem) if item.marked]
+
+    def action_toggle_mark(self):
+        """Mark or unmark the highlighted chat."""
+        if isinstance(self.highlighted_child, ChatHistoryItem):
+            self.highlighted_child.toggle_mark()
+
+    def action_delete_marked(self):
+        """Delete the marked chats, or the highlighted one if none are marked."""
+        chat_ids = self.marked_chat_ids
+        if not chat_ids and isinstance(self.highlighted_child, ChatHistoryItem):
+            chat_ids = [self.highlighted_child.chat_id]
+        if chat_ids:
+            self.post_message(self.DeleteRequested(chat_ids))
@@ -41,6 +41,10 @@ ListView > ListItem:hover {
     background: #3d3b4a;
 }
 
+ListView > ListItem.marked {
+    background: #4a3f6b;
+}
+
 ListView > ListItem > Static {
     width: 80%;
     padding: 0 1;
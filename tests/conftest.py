@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Import the application
 from src.app import AIChatApp
+from src.db.async_database import AsyncChatDatabase
 from src.db.database import ChatDatabase
 
 
@@ -30,12 +31,14 @@ def temp_db_path():
 def test_app(monkeypatch, temp_db_path):
     """Create a test app instance with a temporary database."""
     # Create an app instance
-    app = AIChatApp()
+    app = AIChatApp(ephemeral=True)
     
     # Create a test database
     db = ChatDatabase(db_path=temp_db_path)
     
     # Override the app's database
     monkeypatch.setattr(app, "db", db)
+    monkeypatch.setattr(app, "async_db", AsyncChatDatabase(db))
     
-    return app
+    yield app
+    app.async_db.close()
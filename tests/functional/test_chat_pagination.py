@@ -0,0 +1,70 @@
+"""Functional tests for paginated loading of long chats."""
+
+import pytest
+import pytest_asyncio
+from textual.widgets import Markdown
+
+from src.app import AIChatApp
+
+
+@pytest_asyncio.fixture
+async def app():
+    """Fixture that runs the app against a database holding one long chat."""
+    async with AIChatApp(ephemeral=True).run_test() as pilot:
+        chat_id = pilot.app.db.create_new_chat("Long Chat")
+        for i in range(120):
+            pilot.app.db.save_message(chat_id, "user", f"Message {i}")
+        pilot.app.long_chat_id = chat_id
+
+        yield pilot
+
+
+def _message_count(pilot):
+    """Return the number of message widgets below the chat title."""
+    return len(pilot.app.query("#chat-container > Markdown")) - 1
+
+
+@pytest.mark.asyncio
+async def test_load_chat_mounts_only_the_tail(app):
+    """Test that opening a long chat only renders the latest page."""
+    await app.app.load_chat(app.app.long_chat_id)
+    await app.pause()
+
+    assert _message_count(app) == AIChatApp.MESSAGE_PAGE_SIZE
+    assert app.app.oldest_loaded_seq == 120 - AIChatApp.MESSAGE_PAGE_SIZE + 1
+    assert app.app.has_older_messages
+
+
+@pytest.mark.asyncio
+async def test_load_older_messages(app):
+    """Test that older pages are prepended until the chat is exhausted."""
+    await app.app.load_chat(app.app.long_chat_id)
+    await app.pause()
+
+    assert await app.app.load_older_messages()
+    await app.pause()
+    assert _message_count(app) == 2 * AIChatApp.MESSAGE_PAGE_SIZE
+
+    assert await app.app.load_older_messages()
+    await app.pause()
+    assert _message_count(app) == 120
+    assert not app.app.has_older_messages
+    assert not await app.app.load_older_messages()
+
+    # The oldest message sits directly below the title
+    first_message = app.app.query("#chat-container > Markdown")[1]
+    assert isinstance(first_message, Markdown)
+    assert "Message 0" in first_message._markdown
+
+
+@pytest.mark.asyncio
+async def test_scrolling_to_top_loads_older_page(app):
+    """Test that scrolling the transcript to the top fetches the previous page."""
+    await app.app.load_chat(app.app.long_chat_id)
+    await app.pause()
+
+    chat_container = app.app.query_one("#chat-container")
+    chat_container.scroll_home(animate=False)
+    await app.pause()
+
+    assert _message_count(app) > AIChatApp.MESSAGE_PAGE_SIZE
@@ -1,5 +1,6 @@
 """Functional tests for the chat UI."""
 
+import asyncio
 import os
 import tempfile
 import pytest
@@ -9,7 +10,9 @@ import pytest_asyncio
 
 # Import the main application
 from src.app import AIChatApp
+from src.db.database import ChatDatabase
 from src.ui.components import ChatHistoryItem
+from textual.widgets import Markdown
 
 
 @pytest_asyncio.fixture
@@ -20,15 +23,16 @@ async def app():
     db_path = Path(temp_dir) / "test_chat_history.db"
     
     # Create the app with the test database
-    async with AIChatApp().run_test() as pilot:
+    async with AIChatApp(ephemeral=True).run_test() as pilot:
         # Override the database path and initialize it
         pilot.app.db.db_path = db_path
         pilot.app.db.init_database()
         
-        # Mock the chat provider to avoid external API calls
-        async def mock_generate_response(messages):
-            return "This is a test response from the mock provider."
-        pilot.app.chat_provider.generate_response = mock_generate_response
+        # Mock the chat provider to avoid external API calls and delays
+        async def mock_stream_response(messages):
+            for chunk in ("This is a test response", " from the mock provider."):
+                yield chunk
+        pilot.app.chat_provider.stream_response = mock_stream_response
         
         yield pilot
         
@@ -46,8 +50,8 @@ async def test_app_initialization(app):
     assert app.app.query_one("#history-list") is not None
     assert app.app.query_one("#chat-container") is not None
     
-    # Check that a new chat is created on startup
-    assert app.app.current_chat_id is not None
+    # The startup chat is not saved until it has a message
+    assert app.app.current_chat_id is None
     
     # Check that the welcome message is displayed
     markdown = app.app.query_one("#chat-container > Markdown")
@@ -150,3 +154,155 @@ async def test_chat_history_navigation(app):
     # Check that markdown elements are displayed
     markdowns = app.app.query("#chat-container > Markdown")
     assert len(markdowns) > 0, "Expected markdown elements after navigation"
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_and_undo(app):
+    """Test marking several chats in the sidebar, deleting them, and undoing."""
+    for text in ("First chat", "Second chat", "Third chat"):
+        await app.app.async_db.start_chat("user", text)
+    await app.app.load_chat_history()
+    await app.pause()
+
+    history_list = app.app.query_one("#history-list")
+    history_list.focus()
+    history_list.index = 1
+    await app.press("space")
+    history_list.index = 2
+    await app.press("space")
+    marked = history_list.marked_chat_ids
+    assert len(marked) == 2
+
+    await app.press("delete")
+    await app.pause()
+    remaining = [item.chat_id for item in app.app.query(ChatHistoryItem)]
+    assert not set(marked) & set(remaining)
+
+    await app.app.undo_delete()
+    await app.pause()
+    restored = [item.chat_id for item in app.app.query(ChatHistoryItem)]
+    assert set(marked) <= set(restored)
+
+
+@pytest.mark.asyncio
+async def test_chat_created_by_first_message(app):
+    """Test that a new chat only reaches the database with its first message."""
+    await app.app.create_new_chat()
+    await app.press(*"/new")
+    await app.press("enter")
+    assert app.app.db.get_all_chats() == []
+
+    await app.press(*"Hello there")
+    await app.press("enter")
+
+    chats = app.app.db.get_all_chats()
+    assert [chat[0] for chat in chats] == [app.app.current_chat_id]
+    assert chats[0][1] == "Hello there"
+    assert len(app.app.query(ChatHistoryItem)) == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_after_external_change(app):
+    """Test that writes from another instance update just the affected rows."""
+    kept = await app.app.async_db.start_chat("user", "Local chat")
+    await app.app.load_chat_history()
+    await app.pause()
+    kept_item = app.app.query(ChatHistoryItem).first()
+
+    other = ChatDatabase(db_path=app.app.db.db_path)
+    try:
+        chat_id = other.start_chat("user", "From another pane")
+        await app.app.check_for_external_changes()
+        await app.pause()
+
+        items = list(app.app.query(ChatHistoryItem))
+        assert [item.chat_id for item in items] == [chat_id, kept]
+        assert items[1] is kept_item
+
+        other.delete_chat(kept)
+        await app.app.check_for_external_changes()
+        await app.pause()
+        assert [item.chat_id for item in app.app.query(ChatHistoryItem)] == [chat_id]
+    finally:
+        other.close()
+
+
+@pytest.mark.asyncio
+async def test_reply_streams_into_one_message(app):
+    """Test that a streamed reply is rendered in place and saved whole."""
+    renders = []
+
+    async def slow_stream(messages):
+        for word in ("Streaming", " reply", " in", " pieces."):
+            await asyncio.sleep(0.03)
+            renders.append(len(app.app.query("#chat-container > Markdown")))
+            yield word
+    app.app.chat_provider.stream_response = slow_stream
+
+    await app.press(*"Stream please")
+    await app.press("enter")
+
+    markdowns = app.app.query("#chat-container > Markdown")
+    # The reply widget was mounted before the first chunk and never replaced
+    assert renders == [len(markdowns)] * 4
+    assert app.app.db.get_chat_messages(app.app.current_chat_id) == [
+        ("user", "Stream please"), ("assistant", "Streaming reply in pieces.")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_external_change_waits_for_streamed_reply(app):
+    """Test that a change to the open chat mid-reply reloads it only once saved."""
+    chat_id = await app.app.async_db.start_chat("user", "First")
+    await app.app.load_chat(chat_id)
+    other = ChatDatabase(db_path=app.app.db.db_path)
+
+    async def stream_with_external_write(messages):
+        yield "Streaming"
+        other.save_message(chat_id, "user", "From another pane")
+        await app.app.check_for_external_changes()
+        assert app.app.reload_after_reply
+        yield " reply."
+    app.app.chat_provider.stream_response = stream_with_external_write
+
+    try:
+        await app.press(*"Second")
+        await app.press("enter")
+        await app.pause()
+    finally:
+        other.close()
+
+    assert not app.app.reload_after_reply
+    assert [role for role, _ in app.app.db.get_chat_messages(chat_id)] == [
+        "user", "user", "user", "assistant"
+    ]
+    # Reloaded afterwards, so the title and all four messages are on screen
+    assert len(app.app.query("#chat-container > Markdown")) == 5
+
+
+@pytest.mark.asyncio
+async def test_throttled_chunks_render_during_a_pause(app, monkeypatch):
+    """Test that chunks held back by the render throttle show before the next chunk."""
+    shown = []
+    update = Markdown.update
+
+    def record_update(self, markdown):
+        shown.append(markdown)
+        return update(self, markdown)
+    monkeypatch.setattr(Markdown, "update", record_update)
+
+    seen_during_pause = []
+
+    async def stream_with_pause(messages):
+        yield "Quick"
+        yield " burst"
+        await asyncio.sleep(0.2)
+        seen_during_pause.append(shown[-1])
+        yield " then more."
+    app.app.chat_provider.stream_response = stream_with_pause
+
+    await app.press(*"Pause please")
+    await app.press("enter")
+
+    assert seen_during_pause == ["**AI:** Quick burst"]
+    assert shown[-1] == "**AI:** Quick burst then more."
@@ -1,9 +1,6 @@
 """Functional tests for the Eliza provider in the chat UI."""
 
-import os
-import tempfile
 import pytest
-from pathlib import Path
 
 import pytest_asyncio
 
@@ -14,25 +11,12 @@ from src.providers.eliza import ElizaProvider
 @pytest_asyncio.fixture
 async def eliza_app():
     """Fixture that creates an instance of the AIChatApp using the Eliza provider."""
-    # Create a temporary database
-    temp_dir = tempfile.mkdtemp()
-    db_path = Path(temp_dir) / "test_eliza_chat.db"
-    
-    # Create the app with the test database
-    async with AIChatApp().run_test() as pilot:
-        # Override the database path and initialize it
-        pilot.app.db.db_path = db_path
-        pilot.app.db.init_database()
-        
+    # Create the app with an in-memory database
+    async with AIChatApp(ephemeral=True).run_test() as pilot:
         # Use the Eliza provider
         pilot.app.chat_provider = ElizaProvider()
         
         yield pilot
-        
-    # Clean up
-    if db_path.exists():
-        os.unlink(db_path)
-    os.rmdir(temp_dir)
 
 
 @pytest.mark.asyncio
@@ -45,8 +29,8 @@ async def test_eliza_initialization(eliza_app):
     assert eliza_app.app.query_one("#user-input") is not None
     assert eliza_app.app.query_one("#chat-container") is not None
     
-    # Check that a new chat is created on startup
-    assert eliza_app.app.current_chat_id is not None
+    # The startup chat is not saved until it has a message
+    assert eliza_app.app.current_chat_id is None
 
 
 @pytest.mark.asyncio
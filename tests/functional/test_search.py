@@ -0,0 +1,49 @@
+"""Functional tests for the /search command."""
+
+import pytest
+import pytest_asyncio
+
+from src.app import AIChatApp
+
+
+@pytest_asyncio.fixture
+async def app():
+    """Fixture that runs the app against a database with searchable history."""
+    async with AIChatApp(ephemeral=True).run_test() as pilot:
+        db = pilot.app.db
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "Tell me about sqlite indexes")
+        db.save_message(chat_id, "assistant", "Indexes make sqlite lookups fast")
+        db.save_message(db.create_new_chat(), "user", "Unrelated question")
+
+        yield pilot
+
+
+def _transcript(pilot):
+    """Return the source of every Markdown widget in the chat container."""
+    return [md._markdown for md in pilot.app.query("#chat-container > Markdown")]
+
+
+@pytest.mark.asyncio
+async def test_search_streams_results(app):
+    """Test that /search adds a header and one entry per matching message."""
+    await app.press(*"/search sqlite")
+    await app.press("enter")
+    await app.app.workers.wait_for_complete()
+    await app.pause()
+
+    transcript = _transcript(app)
+    assert "## Search results for `sqlite`" in transcript
+    results = [line for line in transcript if "**sqlite**" in line]
+    assert len(results) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_without_matches(app):
+    """Test that a search with no hits says so."""
+    await app.press(*"/search nothinglikethis")
+    await app.press("enter")
+    await app.app.workers.wait_for_complete()
+    await app.pause()
+
+    assert "No messages matched." in _transcript(app)
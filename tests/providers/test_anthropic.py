@@ -0,0 +1,217 @@
+"""Tests for the Anthropic provider against a local fake Messages endpoint."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+
+from src.providers.anthropic import API_VERSION, AnthropicProvider
+from src.transport import TransportRegistry, httpx
+
+pytestmark = pytest.mark.skipif(httpx is None, reason="no HTTP client library installed")
+
+REPLY = ["Hello", " from", " the fake"]
+
+
+def _flatten(body):
+    """Return (role, text, marked) for every content block, system first."""
+    blocks = [("system", block["text"], "cache_control" in block) for block in body.get("system", [])]
+    for turn in body["messages"]:
+        blocks.extend(
+            (turn["role"], block["text"], "cache_control" in block) for block in turn["content"]
+        )
+    return blocks
+
+
+def _tokens(blocks):
+    """Count words as tokens, which is all the fake needs."""
+    return sum(len(block[1].split()) for block in blocks)
+
+
+class _FakeMessagesHandler(BaseHTTPRequestHandler):
+    """Streams a fixed reply and simulates prompt caching at breakpoints."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        """Answer a Messages API request."""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((dict(self.headers), body))
+
+        if body["model"] == "missing-model":
+            self._send(404, "application/json", json.dumps(
+                {"type": "error", "error": {"type": "not_found_error", "message": "model not found"}}
+            ))
+            return
+
+        # A breakpoint caches the prefix ending at its block; later requests
+        # read the longest cached prefix they start with
+        blocks = _flatten(body)
+        prefixes = [
+            json.dumps([block[:2] for block in blocks[:i + 1]])
+            for i, block in enumerate(blocks) if block[2]
+        ]
+        read = max(
+            (_tokens(json.loads(prefix)) for prefix in prefixes if prefix in self.server.cache),
+            default=0,
+        )
+        cached = _tokens(json.loads(prefixes[-1])) if prefixes else 0
+        self.server.cache.update(prefixes)
+        usage = {
+            "input_tokens": _tokens(blocks) - max(cached, read),
+            "cache_creation_input_tokens": max(cached - read, 0),
+            "cache_read_input_tokens": read,
+            "output_tokens": 1,
+        }
+
+        events = [("message_start", {"type": "message_start", "message": {"usage": usage}}),
+                  ("content_block_start", {"type": "content_block_start", "index": 0}),
+                  ("ping", {"type": "ping"})]
+        events += [
+            ("content_block_delta",
+             {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+            for text in REPLY
+        ]
+        events += [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                   ("message_delta", {"type": "message_delta", "usage": {"output_tokens": 3}}),
+                   ("message_stop", {"type": "message_stop"})]
+        self._send(200, "text/event-stream", "".join(
+            f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events
+        ))
+
+    def _send(self, status, content_type, text):
+        """Send a complete response."""
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """Keep test output quiet."""
+
+
+class TestAnthropicProvider:
+    """Tests for AnthropicProvider."""
+
+    @pytest.fixture
+    def server(self):
+        """Run the fake Messages endpoint."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeMessagesHandler)
+        server.requests = []
+        server.cache = set()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    @pytest_asyncio.fixture
+    async def provider(self, server):
+        """Create a provider pointed at the fake endpoint."""
+        registry = TransportRegistry()
+        provider = AnthropicProvider(api_key="test-key", http_client=registry.client("anthropic"))
+        provider.set_provider_option("base_url", f"http://127.0.0.1:{server.server_address[1]}")
+        yield provider
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_response(self, provider, server):
+        """Test that text deltas are streamed and the request is well formed."""
+        chunks = [chunk async for chunk in provider.stream_response(
+            [{"role": "user", "content": "Hi there"}]
+        )]
+
+        assert chunks == REPLY
+        headers, body = server.requests[0]
+        assert headers["x-api-key"] == "test-key"
+        assert headers["anthropic-version"] == API_VERSION
+        assert body["stream"] is True
+        assert body["model"] == provider.options["model"]
+        assert provider.last_usage["output_tokens"] == 3
+
+    @pytest.mark.asyncio
+    async def test_request_shape_and_breakpoints(self, provider):
+        """Test system prompts, merged turns and where breakpoints go."""
+        body = await provider.build_request([
+            {"role": "system", "content": "Be brief."},
+            {"role": "user", "content": "First question"},
+            {"role": "assistant", "content": "First answer"},
+            {"role": "user", "content": "Second question"},
+            {"role": "user", "content": "and a follow-up"},
+        ])
+
+        assert body["system"] == [
+            {"type": "text", "text": "Be brief.", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert [turn["role"] for turn in body["messages"]] == ["user", "assistant", "user"]
+        marked = [
+            block["text"] for turn in body["messages"] for block in turn["content"]
+            if "cache_control" in block
+        ]
+        assert marked == ["First question", "and a follow-up"]
+
+        provider.set_provider_option("prompt_caching", False)
+        body = await provider.build_request([{"role": "user", "content": "Hi"}])
+        assert "cache_control" not in json.dumps(body)
+
+    @pytest.mark.asyncio
+    async def test_cache_hits_across_turns(self, provider):
+        """Test that the second turn reads the prefix the first one cached."""
+        history = [
+            {"role": "system", "content": "You are a patient tutor " * 50},
+            {"role": "user", "content": "Explain recursion"},
+        ]
+        assert await provider.generate_response(history) == "".join(REPLY)
+        first = provider.last_usage
+        assert first["cache_read_input_tokens"] == 0
+        assert first["cache_creation_input_tokens"] > 0
+
+        history += [
+            {"role": "assistant", "content": "".join(REPLY)},
+            {"role": "user", "content": "Now explain iteration"},
+        ]
+        await provider.generate_response(history)
+        second = provider.last_usage
+        assert second["cache_read_input_tokens"] == first["cache_creation_input_tokens"]
+
+        stats = provider.get_cache_stats()
+        assert (stats["requests"], stats["hits"], stats["misses"]) == (2, 1, 1)
+        assert 0 < stats["hit_rate"] < 1
+
+    @pytest.mark.asyncio
+    async def test_api_error(self, provider):
+        """Test that an error response is reported as the reply."""
+        provider.set_provider_option("model", "missing-model")
+
+        response = await provider.generate_response([{"role": "user", "content": "Hi"}])
+
+        assert response == "Error generating response from Anthropic: 404 model not found"
+        assert provider.get_cache_stats()["requests"] == 0
+
+    @pytest.mark.asyncio
+    async def test_missing_api_key(self, monkeypatch):
+        """Test that no request is made without an API key."""
+        monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+        provider = AnthropicProvider()
+
+        response = await provider.generate_response([{"role": "user", "content": "Hi"}])
+
+        assert "API key not found" in response
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_aclose_only_closes_its_own_client(self):
+        """Test that aclose() closes a client the provider made, not a borrowed one."""
+        own = AnthropicProvider(api_key="test-key")
+        await own.aclose()
+        assert own.http_client.is_closed
+
+        registry = TransportRegistry()
+        borrowed = AnthropicProvider(api_key="test-key", http_client=registry.client("anthropic"))
+        await borrowed.aclose()
+        assert not borrowed.http_client.is_closed
+        await registry.aclose()
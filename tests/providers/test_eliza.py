@@ -93,6 +93,19 @@ class TestElizaProvider:
             await provider.generate_response([{"role": "user", "content": "Hello"}])
             mock_sleep.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_stream_response(self, provider):
+        """Test that the response streams a word at a time."""
+        provider.options["response_delay"] = 0
+        provider.options["stream_delay"] = 0
+
+        chunks = [chunk async for chunk in provider.stream_response(
+            [{"role": "user", "content": "Hello"}]
+        )]
+
+        assert chunks == ["I", " understand", " your", " message."]
+        provider.eliza.respond.assert_called_once_with("Hello")
+
     def test_get_provider_model_list(self, provider):
         """Test getting available models."""
         models = provider.get_provider_model_list()
@@ -0,0 +1,47 @@
+"""Tests for the mock provider and the shared streaming helpers."""
+
+import pytest
+
+from src.providers.base import ChatProvider, split_into_chunks
+from src.providers.mock import MockProvider
+
+
+class TestMockProvider:
+    """Tests for MockProvider streaming."""
+
+    @pytest.fixture
+    def provider(self):
+        """Create a MockProvider with no delays."""
+        provider = MockProvider()
+        provider.options["response_delay"] = 0
+        provider.options["stream_delay"] = 0
+        return provider
+
+    @pytest.mark.asyncio
+    async def test_stream_matches_generate(self, provider):
+        """Test that the streamed pieces join into the full response."""
+        messages = [{"role": "user", "content": "Hello  there\nfriend"}]
+
+        chunks = [chunk async for chunk in provider.stream_response(messages)]
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == await provider.generate_response(messages)
+
+    @pytest.mark.asyncio
+    async def test_default_stream_yields_whole_response(self):
+        """Test that providers without streaming yield one chunk."""
+        class WholeProvider(MockProvider):
+            stream_response = ChatProvider.stream_response
+
+        provider = WholeProvider()
+        provider.options["response_delay"] = 0
+        messages = [{"role": "user", "content": "Hi"}]
+
+        chunks = [chunk async for chunk in provider.stream_response(messages)]
+
+        assert chunks == [await provider.generate_response(messages)]
+
+    def test_split_into_chunks(self):
+        """Test that text splits into words that keep their whitespace."""
+        assert split_into_chunks("One two\n\nthree ") == ["One", " two", "\n\nthree", " "]
+        assert split_into_chunks("") == []
@@ -0,0 +1,46 @@
+"""Tests for the OpenAI provider."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.providers.openai import OpenAIProvider
+
+
+def _chunk(content):
+    """Build a streamed completion chunk with the given delta content."""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class TestOpenAIProvider:
+    """Tests for OpenAIProvider."""
+
+    @pytest.mark.asyncio
+    async def test_stream_response(self):
+        """Test that streamed deltas are yielded and empty ones skipped."""
+        async def stream():
+            for content in ("Hel", None, "lo", ""):
+                yield _chunk(content)
+
+        provider = OpenAIProvider(api_key="test-key")
+        provider.client.chat.completions.create = AsyncMock(return_value=stream())
+
+        chunks = [chunk async for chunk in provider.stream_response(
+            [{"role": "user", "content": "Hi"}]
+        )]
+
+        assert chunks == ["Hel", "lo"]
+        assert provider.client.chat.completions.create.call_args.kwargs["stream"] is True
+
+    @pytest.mark.asyncio
+    async def test_stream_response_error(self):
+        """Test that an API failure is reported as the response text."""
+        provider = OpenAIProvider(api_key="test-key")
+        provider.client.chat.completions.create = AsyncMock(side_effect=RuntimeError("down"))
+
+        chunks = [chunk async for chunk in provider.stream_response(
+            [{"role": "user", "content": "Hi"}]
+        )]
+
+        assert chunks == ["Error generating response from OpenAI: down"]
@@ -0,0 +1,77 @@
+"""Tests for the async database facade."""
+
+import threading
+
+import pytest
+import pytest_asyncio
+
+from src.db.async_database import AsyncChatDatabase
+from src.db.database import ChatDatabase
+
+
+class TestAsyncChatDatabase:
+    """Tests for AsyncChatDatabase."""
+
+    @pytest_asyncio.fixture
+    async def async_db(self, tmp_path):
+        """Create an async facade over a temporary database."""
+        async_db = AsyncChatDatabase(ChatDatabase(db_path=tmp_path / "async.db"))
+        yield async_db
+        async_db.close()
+
+    @pytest.mark.asyncio
+    async def test_methods_run_on_database_thread(self, async_db):
+        """Test that queries execute off the calling thread."""
+        seen = []
+
+        def record_thread():
+            seen.append(threading.current_thread())
+            return "done"
+
+        assert await async_db.call(record_thread) == "done"
+        assert seen[0] is not threading.current_thread()
+        assert seen[0].name == "termwave-db"
+
+    @pytest.mark.asyncio
+    async def test_public_methods_are_awaitable(self, async_db):
+        """Test that ChatDatabase methods are exposed as coroutines."""
+        chat_id = await async_db.create_new_chat("Async Chat")
+        await async_db.save_message(chat_id, "user", "Hello async")
+
+        assert await async_db.get_chat_info(chat_id) == ("Hello async",)
+        assert await async_db.get_chat_messages(chat_id) == [("user", "Hello async")]
+        # The sync API sees the same data
+        assert async_db.db.get_chat_messages(chat_id) == [("user", "Hello async")]
+
+    @pytest.mark.asyncio
+    async def test_exceptions_propagate(self, async_db):
+        """Test that errors raised on the database thread reach the caller."""
+        def fail():
+            raise ValueError("bad query")
+
+        with pytest.raises(ValueError, match="bad query"):
+            await async_db.call(fail)
+
+        # The thread keeps serving requests afterwards
+        assert await async_db.get_all_chats() == []
+
+    @pytest.mark.asyncio
+    async def test_search_messages_streams(self, async_db):
+        """Test that search results are delivered as an async stream."""
+        chat_id = await async_db.create_new_chat()
+        for i in range(3):
+            await async_db.save_message(chat_id, "user", f"needle number {i}")
+
+        results = [row async for row in async_db.search_messages("needle")]
+        assert len(results) == 3
+
+    @pytest.mark.asyncio
+    async def test_close_is_idempotent(self, async_db):
+        """Test that closing stops the thread and rejects new requests."""
+        await async_db.get_all_chats()
+        async_db.close()
+        async_db.close()
+
+        assert async_db.db.pool.closed
+        with pytest.raises(RuntimeError):
+            await async_db.get_all_chats()
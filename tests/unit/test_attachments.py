@@ -0,0 +1,156 @@
+"""Tests for chunked file attachments."""
+
+import hashlib
+
+import pytest
+
+from src.db.async_database import AsyncChatDatabase
+from src.db.database import ChatDatabase
+from src.providers.mock import MockProvider
+
+
+class TestAttachments:
+    """Tests for storing and streaming attachments."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a temporary database."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        yield db
+        db.close()
+
+    @pytest.fixture
+    def data_file(self, tmp_path):
+        """Write a file of 10,000 bytes that is not a multiple of the chunk size."""
+        path = tmp_path / "notes.txt"
+        path.write_bytes(bytes(range(256)) * 39 + b"0123456789abcdef")
+        return path
+
+    def _chunk_sizes(self, db, attachment_id):
+        """Return the stored size of each chunk of an attachment."""
+        with db.pool.reader() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT length(data) FROM attachment_chunks WHERE attachment_id = ? "
+                "ORDER BY chunk", (attachment_id,)
+            )]
+
+    def test_file_is_stored_in_chunks(self, db, data_file):
+        """Test that a file is split into chunks and read back intact."""
+        chat_id = db.start_chat("user", "See the attached notes")
+        data = data_file.read_bytes()
+
+        attachment_id = db.add_attachment(chat_id, data_file, chunk_size=4096)
+
+        assert db.get_attachments(chat_id) == [
+            (attachment_id, 1, "notes.txt", "text/plain", len(data))
+        ]
+        assert self._chunk_sizes(db, attachment_id) == [4096, 4096, len(data) - 8192]
+        assert b"".join(db.iter_attachment(attachment_id)) == data
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT sha256 FROM attachments WHERE id = ?", (attachment_id,)
+            ).fetchone()[0] == hashlib.sha256(data).hexdigest()
+
+    def test_attaches_to_latest_message_by_default(self, db, data_file):
+        """Test that seq defaults to the chat's latest message."""
+        chat_id = db.start_chat("user", "First")
+        db.save_message(chat_id, "assistant", "Second")
+
+        db.add_attachment(chat_id, data_file, name="renamed.md", media_type="text/markdown")
+
+        assert db.get_attachments(chat_id)[0][1:4] == (2, "renamed.md", "text/markdown")
+
+    def test_empty_file(self, db, tmp_path):
+        """Test that an empty file is stored with no chunks."""
+        chat_id = db.start_chat("user", "Empty file")
+        empty = tmp_path / "empty.bin"
+        empty.write_bytes(b"")
+
+        attachment_id = db.add_attachment(chat_id, empty)
+
+        assert db.get_attachments(chat_id) == [
+            (attachment_id, 1, "empty.bin", "application/octet-stream", 0)
+        ]
+        assert list(db.iter_attachment(attachment_id)) == []
+
+    def test_chat_without_messages_is_rejected(self, db, data_file):
+        """Test that a file cannot be attached to a chat with no messages."""
+        chat_id = db.create_new_chat("Empty chat")
+
+        with pytest.raises(ValueError):
+            db.add_attachment(chat_id, data_file)
+        with db.pool.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+
+    def test_failed_upload_leaves_nothing_behind(self, db, data_file, monkeypatch):
+        """Test that an upload interrupted part way removes its chunks."""
+        chat_id = db.start_chat("user", "Attach")
+
+        def fail(*args):
+            raise OSError("disk went away")
+
+        monkeypatch.setattr(db, "_write_attachment_chunks", fail)
+        with pytest.raises(OSError):
+            db.add_attachment(chat_id, data_file)
+
+        with db.pool.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM attachment_chunks").fetchone()[0] == 0
+
+    def test_incomplete_attachments_are_hidden_and_cleaned_up(self, db, data_file):
+        """Test that a half-written attachment is not listed and can be removed."""
+        chat_id = db.start_chat("user", "Attach")
+        with db.pool.writer() as conn:
+            conn.execute(
+                "INSERT INTO attachments (chat_id, seq, name, media_type, size) "
+                "VALUES (?, 1, 'partial.txt', 'text/plain', 10)", (chat_id,)
+            )
+
+        assert db.get_attachments(chat_id) == []
+        assert db.delete_incomplete_attachments() == 0
+        assert db.delete_incomplete_attachments(older_than=0) == 1
+
+    def test_deletes_remove_attachments(self, db, data_file):
+        """Test that deleting a message or purging a chat removes its files."""
+        first = db.start_chat("user", "One")
+        db.save_message(first, "user", "Two")
+        db.add_attachment(first, data_file, seq=1)
+        kept = db.add_attachment(first, data_file, seq=2)
+        second = db.start_chat("user", "Other chat")
+        db.add_attachment(second, data_file)
+
+        db.delete_message(first, 1)
+        assert [row[0] for row in db.get_attachments(first)] == [kept]
+
+        db.delete_chat(second)
+        db.purge_deleted_chats()
+        assert db.get_attachments(second) == []
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT COUNT(DISTINCT attachment_id) FROM attachment_chunks"
+            ).fetchone()[0] == 1
+
+    @pytest.mark.asyncio
+    async def test_async_iteration_and_provider_text(self, db, data_file):
+        """Test streaming an attachment through the async facade into a provider."""
+        async_db = AsyncChatDatabase(db)
+        chat_id = db.start_chat("user", "Attach")
+        text_file = data_file.with_name("greeting.txt")
+        text_file.write_text("héllo wörld " * 1000, encoding="utf-8")
+        attachment_id = db.add_attachment(chat_id, text_file, chunk_size=1001)
+
+        chunks = [chunk async for chunk in async_db.iter_attachment(attachment_id)]
+        assert b"".join(chunks) == text_file.read_bytes()
+
+        attachment = {
+            "name": "greeting.txt",
+            "media_type": "text/plain",
+            "size": text_file.stat().st_size,
+            "read": lambda: async_db.iter_attachment(attachment_id),
+        }
+        provider = MockProvider()
+        assert await provider.read_attachment_text(attachment) == "héllo wörld " * 1000
+        assert await provider.read_attachment_text(attachment, limit=7) == "héllo w"
+        assert await provider.read_attachment_text(
+            dict(attachment, media_type="image/png")
+        ) is None
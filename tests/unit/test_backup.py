@@ -0,0 +1,178 @@
+"""Tests for online database snapshots."""
+
+import sqlite3
+import threading
+
+import pytest
+
+from src.db.backup import (
+    backup_database,
+    list_snapshots,
+    persist_database,
+    verify_snapshot,
+)
+from src.db.database import ChatDatabase
+from src.main import main
+
+
+class TestBackup:
+    """Tests for backup_database and its helpers."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a database with a couple of chats."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        for i in range(3):
+            db.start_chat("user", f"Question {i}")
+        yield db
+        db.close()
+
+    def test_snapshot_is_a_standalone_copy(self, db, tmp_path):
+        """Test that a snapshot opens on its own and holds every chat."""
+        result = backup_database(db, tmp_path / "backups")
+
+        snapshot = result["path"]
+        assert snapshot.exists()
+        assert result["bytes"] == snapshot.stat().st_size
+        assert not snapshot.with_name(snapshot.name + "-wal").exists()
+
+        conn = sqlite3.connect(snapshot)
+        try:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+            assert conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0] == 3
+        finally:
+            conn.close()
+
+    def test_backup_while_writing(self, db, tmp_path):
+        """Test that writes during a backup neither fail nor corrupt the snapshot."""
+        for i in range(200):
+            db.save_message(1, "assistant", f"Padding message {i} " * 50)
+
+        stop = threading.Event()
+
+        def keep_writing():
+            while not stop.is_set():
+                db.save_message(2, "user", "Written during the backup")
+
+        writer = threading.Thread(target=keep_writing)
+        writer.start()
+        try:
+            result = backup_database(db, tmp_path / "backups", verify=True)
+        finally:
+            stop.set()
+            writer.join()
+
+        assert result["problems"] == []
+
+    def test_quick_backups_do_not_replace_each_other(self, db, tmp_path):
+        """Test that snapshots taken within the same second are all kept."""
+        paths = [backup_database(db, tmp_path / "backups")["path"] for _ in range(3)]
+
+        assert len(set(paths)) == 3
+        assert list_snapshots(db, tmp_path / "backups") == paths
+
+    def test_rotation_keeps_newest(self, db, tmp_path):
+        """Test that only the newest snapshots are kept."""
+        directory = tmp_path / "backups"
+        directory.mkdir()
+        for stamp in ("20240101-000000", "20240102-000000", "20240103-000000"):
+            (directory / f"chat_history-{stamp}.db").write_bytes(b"")
+        (directory / "chat_history-20240101-000000.archive.db").write_bytes(b"")
+
+        result = backup_database(db, directory, keep=2)
+
+        assert [p.name for p in result["removed"]] == [
+            "chat_history-20240101-000000.db",
+            "chat_history-20240102-000000.db",
+        ]
+        assert list_snapshots(db, directory) == [
+            directory / "chat_history-20240103-000000.db", result["path"]
+        ]
+        assert not (directory / "chat_history-20240101-000000.archive.db").exists()
+
+    def test_archive_is_backed_up_alongside(self, db, tmp_path):
+        """Test that archived chats are included and the snapshot reopens with them."""
+        with db.pool.writer() as conn:
+            conn.execute("UPDATE chats SET last_message_at = datetime('now', '-1 year')")
+        assert db.archive_inactive_chats(30) == 3
+
+        result = backup_database(db, tmp_path / "backups", verify=True)
+        assert result["problems"] == []
+
+        restored = ChatDatabase(db_path=result["path"])
+        try:
+            assert restored.get_chat_messages(1) == [("user", "Question 0")]
+        finally:
+            restored.close()
+
+    def test_verify_reports_corruption(self, tmp_path):
+        """Test that the integrity check flags a damaged snapshot."""
+        path = tmp_path / "damaged.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE t (x)")
+        conn.execute("CREATE INDEX t_x ON t (x)")
+        conn.executemany("INSERT INTO t VALUES (?)", ((i,) for i in range(1000)))
+        conn.commit()
+        conn.execute("PRAGMA writable_schema=ON")
+        conn.execute("UPDATE sqlite_master SET sql = 'CREATE INDEX t_x ON t (x DESC)' "
+                     "WHERE name = 't_x'")
+        conn.commit()
+        conn.close()
+
+        assert verify_snapshot(path) != []
+
+    def test_backup_command(self, db, tmp_path, capsys):
+        """Test the termwave backup command line."""
+        directory = tmp_path / "snapshots"
+
+        assert main([
+            "--db", str(db.db_path), "backup", "--dir", str(directory), "--verify"
+        ]) == 0
+
+        assert len(list_snapshots(db, directory)) == 1
+        assert "Integrity check passed" in capsys.readouterr().err
+
+
+class TestPersist:
+    """Tests for saving an ephemeral database to a file."""
+
+    @pytest.fixture
+    def db(self):
+        """Create an ephemeral database with one chat."""
+        db = ChatDatabase(ephemeral=True)
+        db.start_chat("user", "Remember me")
+        yield db
+        db.close()
+
+    def test_persisted_copy_opens_as_a_database(self, db, tmp_path):
+        """Test that the saved file holds the history and opens normally."""
+        result = persist_database(db, tmp_path / "session.db")
+        db.close()
+
+        assert result["bytes"] == result["path"].stat().st_size
+        assert verify_snapshot(result["path"]) == []
+        saved = ChatDatabase(db_path=result["path"])
+        try:
+            assert saved.get_chat_messages(1) == [("user", "Remember me")]
+        finally:
+            saved.close()
+
+    def test_refuses_to_overwrite(self, db, tmp_path):
+        """Test that an existing file is only replaced when asked."""
+        target = tmp_path / "session.db"
+        target.write_text("keep")
+
+        with pytest.raises(FileExistsError):
+            persist_database(db, target)
+        assert target.read_text() == "keep"
+
+        persist_database(db, target, overwrite=True)
+        assert verify_snapshot(target) == []
+
+    def test_backup_needs_a_directory(self, db, tmp_path):
+        """Test that an ephemeral database is only backed up to an explicit directory."""
+        with pytest.raises(ValueError):
+            backup_database(db)
+
+        result = backup_database(db, tmp_path)
+        assert result["path"].name.startswith("ephemeral-")
@@ -0,0 +1,87 @@
+"""Tests for the benchmark suite's generator and reporting."""
+
+import json
+import random
+
+from benchmarks.run import compare_results, main, percentiles
+from benchmarks.synthetic import chat_lengths, generate_records, populate
+from src.db.database import ChatDatabase
+
+
+class TestSynthetic:
+    """Tests for the synthetic history generator."""
+
+    def test_generate_records_is_reproducible(self):
+        """Test that the same seed produces the same history."""
+        first = list(generate_records(chats=5, messages=50, seed=1))
+        second = list(generate_records(chats=5, messages=50, seed=1))
+
+        assert first == second
+        assert sum(r["type"] == "chat" for r in first) == 5
+
+    def test_chat_lengths_are_skewed(self):
+        """Test that a few chats hold a large share of the messages."""
+        lengths = sorted(chat_lengths(random.Random(0), 1000, 100000), reverse=True)
+
+        assert min(lengths) >= 1
+        assert sum(lengths[:10]) > sum(lengths) * 0.1
+        assert lengths[500] < sum(lengths) / 1000
+
+    def test_populate(self, tmp_path):
+        """Test that a generated history loads through the import path."""
+        db = ChatDatabase(db_path=tmp_path / "bench.db")
+        try:
+            counts = populate(db, chats=20, messages=400)
+            assert counts["chats"] == 20
+            assert sum(chat[3] for chat in db.get_all_chats()) == counts["messages"]
+        finally:
+            db.close()
+
+
+class TestReporting:
+    """Tests for percentile summaries and baseline comparison."""
+
+    def test_percentiles(self):
+        """Test the p50 and p99 of a known distribution."""
+        summary = percentiles([i / 1000 for i in range(1, 101)])
+
+        assert summary["iterations"] == 100
+        assert 50 <= summary["p50_ms"] <= 51
+        assert 99 <= summary["p99_ms"] <= 100
+
+    def test_compare_flags_regressions(self):
+        """Test that only slowdowns beyond the threshold are reported."""
+        baseline = {"results": {
+            "fast": {"p50_ms": 10.0, "p99_ms": 20.0},
+            "slow": {"p50_ms": 10.0, "p99_ms": 20.0},
+        }}
+        current = {"results": {
+            "fast": {"p50_ms": 11.0, "p99_ms": 19.0},
+            "slow": {"p50_ms": 15.0, "p99_ms": 20.0},
+            "new": {"p50_ms": 1.0, "p99_ms": 2.0},
+        }}
+
+        regressions = compare_results(baseline, current, threshold=0.2)
+
+        assert len(regressions) == 1
+        assert regressions[0].startswith("slow p50")
+
+    def test_main_saves_and_compares(self, tmp_path, capsys):
+        """Test a full small run that records and then checks a baseline."""
+        baseline = tmp_path / "baseline.json"
+        args = ["--chats", "10", "--messages", "100", "--iterations", "3",
+                "--db", str(tmp_path / "bench.db")]
+
+        assert main(args + ["--save", str(baseline)]) == 0
+        assert baseline.exists()
+        assert json.loads(baseline.read_text())["results"]["purge_deleted_chats"]["iterations"] == 3
+        cached = (tmp_path / "bench.db").read_bytes()
+
+        assert main(args + ["--compare", str(baseline), "--threshold", "100"]) == 0
+        assert "No regressions" in capsys.readouterr().err
+
+        # Runs work on a copy, so the cached history is left as generated
+        assert (tmp_path / "bench.db").read_bytes() == cached
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "baseline.json", "bench.db", "bench.db.json"
+        ]
@@ -0,0 +1,112 @@
+"""Tests for content-addressed storage of large message bodies."""
+
+import pytest
+
+from src.db.blobs import content_hash
+from src.db.database import ChatDatabase
+
+PASTED = "SELECT * FROM chats WHERE id = ?;\n" * 100
+
+
+class TestBlobs:
+    """Tests for storing repeated large bodies once."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a database that stores bodies of 1 KiB and more as blobs."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db", blob_threshold=1024)
+        yield db
+        db.close()
+
+    def _blobs(self, db, schema="main"):
+        """Return (hash, refcount) for every blob in a schema."""
+        with db.pool.reader() as conn:
+            return conn.execute(f"SELECT hash, refcount FROM {schema}.blobs").fetchall()
+
+    def test_repeated_bodies_are_stored_once(self, db):
+        """Test that the same large body in several chats shares one blob."""
+        first = db.start_chat("user", PASTED)
+        second = db.start_chat("user", PASTED)
+        db.save_message(second, "assistant", "Short reply")
+
+        assert self._blobs(db) == [(content_hash(PASTED), 2)]
+        assert db.get_chat_messages(first) == [("user", PASTED)]
+        assert db.get_chat_messages_page(second) == [
+            (1, "user", PASTED), (2, "assistant", "Short reply")
+        ]
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE content IS NULL"
+            ).fetchone()[0] == 2
+
+    def test_deletes_release_blobs(self, db):
+        """Test that a blob goes away with the last message referring to it."""
+        first = db.start_chat("user", PASTED)
+        second = db.start_chat("user", PASTED)
+
+        db.delete_message(first, 1)
+        assert self._blobs(db) == [(content_hash(PASTED), 1)]
+
+        db.delete_chat(second)
+        db.purge_deleted_chats()
+        assert self._blobs(db) == []
+
+    def test_search_reads_blob_text(self, db):
+        """Test that messages stored as blobs are indexed and removed from search."""
+        chat_id = db.start_chat("user", PASTED + "needle")
+        assert [row[0] for row in db.search_messages("needle")] == [chat_id]
+
+        db.delete_message(chat_id, 1)
+        assert list(db.search_messages("needle")) == []
+
+    def test_blobs_move_with_archived_chats(self, db):
+        """Test that archiving and restoring carries blobs and their counts along."""
+        archived = db.start_chat("user", PASTED)
+        live = db.start_chat("user", PASTED)
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE chats SET last_message_at = datetime('now', '-1 year') WHERE id = ?",
+                (archived,)
+            )
+        assert db.archive_inactive_chats(30) == 1
+
+        digest = content_hash(PASTED)
+        assert self._blobs(db) == [(digest, 1)]
+        assert self._blobs(db, "archive") == [(digest, 1)]
+        assert db.get_chat_messages(archived) == [("user", PASTED)]
+        assert {row[0] for row in db.search_messages("chats")} == {archived, live}
+
+        # Writing to the archived chat brings it back
+        db.save_message(archived, "user", "Follow-up")
+        assert self._blobs(db) == [(digest, 2)]
+        assert self._blobs(db, "archive") == []
+
+    def test_import_deduplicates(self, db, tmp_path):
+        """Test that imports share blobs and re-imports leave no stray ones."""
+        db.start_chat("user", PASTED)
+        db.start_chat("user", PASTED)
+
+        other = ChatDatabase(db_path=tmp_path / "other.db", blob_threshold=1024)
+        try:
+            other.import_records(db.iter_export_records())
+            other.import_records(db.iter_export_records())
+            assert self._blobs(other) == [(content_hash(PASTED), 2)]
+            assert other.get_chat_messages(2) == [("user", PASTED)]
+        finally:
+            other.close()
+
+    def test_storage_stats(self, db):
+        """Test the dedupe ratio reported for repeated bodies."""
+        assert db.get_storage_stats()["dedupe_ratio"] == 1.0
+
+        for _ in range(3):
+            db.start_chat("user", PASTED)
+        stats = db.get_storage_stats()
+
+        size = len(PASTED.encode("utf-8"))
+        assert stats["blobs"] == 1
+        assert stats["references"] == 3
+        assert stats["logical_bytes"] == 3 * size
+        assert stats["unique_bytes"] == size
+        assert stats["dedupe_ratio"] == 3.0
+        assert 0 < stats["stored_bytes"] < size
@@ -47,3 +47,26 @@ class TestChatHistoryItem:
         assert isinstance(widgets[1], Button)
         assert widgets[1].id == f"delete-{chat_id}"
         assert "delete-btn" in widgets[1].classes
+
+    def test_chat_history_item_preview(self):
+        """Test that the latest message preview is shown with markup escaped."""
+        item = ChatHistoryItem(7, "Chat", "2023-01-01 12:00", preview="see [link]")
+
+        widgets = list(item.compose())
+
+        assert item.preview == "see [link]"
+        assert "[dim]see \\[link][/dim]" in widgets[0].renderable
+
+
+    def test_chat_history_item_toggle_mark(self):
+        """Test that marking a chat toggles its state and CSS class."""
+        item = ChatHistoryItem(7, "Chat", "2023-01-01 12:00")
+        assert not item.marked
+
+        item.toggle_mark()
+        assert item.marked
+        assert item.has_class("marked")
+
+        item.toggle_mark()
+        assert not item.marked
+        assert not item.has_class("marked")
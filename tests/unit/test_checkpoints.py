@@ -0,0 +1,266 @@
+"""Tests for rolling summary checkpoints."""
+
+import pytest
+
+from src.app import AIChatApp
+from src.checkpoints import (
+    checkpoint_due,
+    create_checkpoint,
+    format_transcript,
+    summary_span_budget,
+)
+from src.context import MESSAGE_OVERHEAD, SUMMARY_HEADING, build_context
+from src.db.async_database import AsyncChatDatabase
+from src.db.database import CHECKPOINTS_KEPT, ChatDatabase
+from src.providers.base import ChatProvider, ProviderError
+from src.providers.mock import MockProvider
+from src.tokens import FAMILY_APPROX, count_tokens
+
+
+def words(count):
+    """Return a message of count one-token words."""
+    return " ".join(["word"] * count)
+
+
+class _SummaryProvider(ChatProvider):
+    """Returns a fixed summary and remembers what it was asked."""
+
+    def __init__(self, summary="The user asked about words.", during=None, error=None):
+        self.summary = summary
+        self.during = during
+        self.error = error
+        self.requests = []
+
+    @property
+    def name(self):
+        return "Summary"
+
+    async def generate_response(self, messages):
+        self.requests.append(messages)
+        if self.during is not None:
+            self.during()
+        return self.summary
+
+    async def complete(self, messages):
+        if self.error is not None:
+            raise ProviderError(self.error)
+        return await self.generate_response(messages)
+
+    def get_provider_model_list(self):
+        return ["summarizer"]
+
+    def get_provider_options(self):
+        return {"model": "summarizer"}
+
+    def set_provider_option(self, option_name, option_value):
+        return False
+
+
+class TestCheckpoints:
+    """Tests for writing, invalidating and sending checkpoint summaries."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a temporary database with an archive."""
+        db = ChatDatabase(
+            db_path=tmp_path / "chat_history.db", archive_path=tmp_path / "archive.db"
+        )
+        yield db
+        db.close()
+
+    @pytest.fixture
+    def chat_id(self, db):
+        """Create a chat with a system prompt and ten 10-token exchanges."""
+        chat_id = db.start_chat("system", words(20))
+        for _ in range(10):
+            db.save_message(chat_id, "user", words(10))
+            db.save_message(chat_id, "assistant", words(10))
+        return chat_id
+
+    def _checkpoint(self, db, chat_id, through_seq, summary="Summary"):
+        """Store a finished checkpoint."""
+        assert db.complete_checkpoint(db.begin_checkpoint(chat_id, through_seq), summary)
+
+    def test_checkpoint_due(self, db, chat_id):
+        """Test the threshold, and that recent messages are never summarized."""
+        # 21 messages; the newest 5 are kept back, leaving seqs 1-16
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=1000, recent=5) is None
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=100, recent=5) == 16
+
+        # Only history after the last checkpoint counts
+        self._checkpoint(db, chat_id, 16)
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=1, recent=5) is None
+        db.save_message(chat_id, "user", words(50))
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=10, recent=5) == 17
+
+    def test_checkpoint_due_caps_the_span(self, db, chat_id):
+        """Test that one checkpoint takes no more than the summary model can."""
+        span = 20 + 3 * 10 + 4 * MESSAGE_OVERHEAD
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=100, recent=5,
+                              max_span=span) == 4
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=100, recent=5,
+                              max_span=span - 1) == 3
+
+        # The first message is taken even if it alone is over the limit
+        assert checkpoint_due(db, chat_id, FAMILY_APPROX, threshold=100, recent=5,
+                              max_span=1) == 1
+
+    def test_pending_and_superseded_checkpoints(self, db, chat_id):
+        """Test that only finished checkpoints are used and old ones are pruned."""
+        db.begin_checkpoint(chat_id, 5)
+        assert db.get_checkpoint(chat_id) is None
+
+        for through_seq in range(2, 4 + CHECKPOINTS_KEPT):
+            self._checkpoint(db, chat_id, through_seq, f"Through {through_seq}")
+
+        assert db.get_checkpoint(chat_id)[1:] == (3 + CHECKPOINTS_KEPT, f"Through {3 + CHECKPOINTS_KEPT}")
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT COUNT(*) FROM chat_checkpoints WHERE chat_id = ?", (chat_id,)
+            ).fetchone()[0] == CHECKPOINTS_KEPT
+
+    def test_edits_invalidate_covering_checkpoints(self, db, chat_id):
+        """Test that changing a summarized message drops the summaries covering it."""
+        self._checkpoint(db, chat_id, 6)
+        self._checkpoint(db, chat_id, 12)
+
+        db.delete_message(chat_id, 20)
+        assert db.get_checkpoint(chat_id)[1] == 12
+
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE messages SET content = 'rewritten' WHERE chat_id = ? AND seq = 9",
+                (chat_id,)
+            )
+        assert db.get_checkpoint(chat_id)[1] == 6
+
+        db.delete_message(chat_id, 3)
+        assert db.get_checkpoint(chat_id) is None
+
+    def test_compact_and_archive_keep_checkpoints(self, db, chat_id, tmp_path):
+        """Test that rewriting storage or moving a chat does not invalidate it."""
+        db.save_message(chat_id, "user", words(1000))
+        self._checkpoint(db, chat_id, 12)
+
+        compressed = ChatDatabase(db_path=db.db_path, compression_threshold=256)
+        compressed.compact()
+        assert compressed.get_checkpoint(chat_id)[1] == 12
+        compressed.close()
+
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE chats SET last_message_at = datetime('now', '-1 year') WHERE id = ?",
+                (chat_id,)
+            )
+        assert db.archive_inactive_chats(30) == 1
+        assert db.get_checkpoint(chat_id)[1] == 12
+        assert [seq for seq, _, _ in db.get_chat_messages_range(chat_id, 10, 12)] == [11, 12]
+
+        # Deleting an archived chat's message still invalidates
+        db.delete_message(chat_id, 4)
+        assert db.get_checkpoint(chat_id) is None
+
+    def test_build_context_sends_summary_and_tail(self, db, chat_id):
+        """Test that a summary replaces the messages it covers."""
+        self._checkpoint(db, chat_id, 15, "They talked about words.")
+
+        context = build_context(db, chat_id, MockProvider())
+
+        summary = f"{SUMMARY_HEADING}\n\nThey talked about words."
+        assert context["messages"][:2] == [(1, "system", words(20)), (None, "system", summary)]
+        assert [seq for seq, _, _ in context["messages"][2:]] == list(range(16, 22))
+        assert context["summarized_through"] == 15
+        assert context["dropped"] == 0
+        assert context["tokens"] == (
+            20 + count_tokens(summary, FAMILY_APPROX) + 6 * 10 + 8 * MESSAGE_OVERHEAD
+        )
+
+    def test_format_transcript(self):
+        """Test that pinned messages are left out and speakers are named."""
+        text = format_transcript("Before.", [
+            (1, "system", "Be brief."), (2, "user", "Hi"), (3, "assistant", "Hello"),
+        ])
+
+        assert text == "Earlier summary:\nBefore.\n\nUser: Hi\n\nAssistant: Hello"
+
+        text = format_transcript(None, [(1, "user", words(100))], FAMILY_APPROX, max_tokens=10)
+        assert text.startswith(f"User: {words(10)} [... ")
+        assert text.endswith(" characters omitted]")
+
+    @pytest.mark.asyncio
+    async def test_create_checkpoint(self, db, chat_id):
+        """Test that summaries fold in the previous one and only cover new messages."""
+        async_db = AsyncChatDatabase(db)
+        provider = _SummaryProvider("First summary")
+        assert await create_checkpoint(async_db, chat_id, provider, 5)
+
+        provider.summary = "Second summary"
+        assert await create_checkpoint(async_db, chat_id, provider, 9)
+
+        transcript = provider.requests[-1][-1]["content"]
+        assert transcript.startswith("Earlier summary:\nFirst summary")
+        assert transcript.count("User:") + transcript.count("Assistant:") == 4
+        assert db.get_checkpoint(chat_id)[1:] == (9, "Second summary")
+
+    @pytest.mark.asyncio
+    async def test_create_checkpoint_discards_stale_or_failed_summaries(self, db, chat_id):
+        """Test that an edit during summarizing, or a provider error, stores nothing."""
+        async_db = AsyncChatDatabase(db)
+        edited = _SummaryProvider(during=lambda: db.delete_message(chat_id, 3))
+        assert not await create_checkpoint(async_db, chat_id, edited, 9)
+
+        failed = _SummaryProvider(error="Error generating response: timeout")
+        with pytest.raises(ProviderError):
+            await create_checkpoint(async_db, chat_id, failed, 9)
+        with pytest.raises(ProviderError):
+            await create_checkpoint(async_db, chat_id, _SummaryProvider("  "), 9)
+        assert db.get_checkpoint(chat_id) is None
+
+        # Only failures raise; a summary may start with any word
+        assert await create_checkpoint(async_db, chat_id, _SummaryProvider("Errors were fixed."), 9)
+
+    @pytest.mark.asyncio
+    async def test_app_folds_long_history_in_steps(self):
+        """Test that history too long for one request is summarized a stretch at a time."""
+        app = AIChatApp(ephemeral=True)
+        app.summary_provider = _SummaryProvider("Folded")
+        recent = app.config.get("context.recent_messages")
+        chat_id = app.db.start_chat("user", words(4000))
+        for _ in range(recent + 3):
+            app.db.save_message(chat_id, "assistant", words(4000))
+        assert 4000 < summary_span_budget(app.summary_provider) < 8000
+
+        # One message per request, each folding in the summary before it,
+        # until what is left is under the threshold
+        assert await app.update_checkpoint(chat_id) == 3
+        assert app.db.get_checkpoint(chat_id)[1:] == (3, "Folded")
+        assert [
+            request[-1]["content"].startswith("Earlier summary:")
+            for request in app.summary_provider.requests
+        ] == [False, True, True]
+
+        # After a failure the chat is left alone for a while
+        app.db.save_message(chat_id, "user", words(10000))
+        for _ in range(recent):
+            app.db.save_message(chat_id, "assistant", "ok")
+        app.summary_provider = _SummaryProvider(error="Error: offline")
+        assert await app.update_checkpoint(chat_id) == 0
+        app.summary_provider.error = None
+        assert await app.update_checkpoint(chat_id) == 0
+        assert app.summary_provider.requests == []
+
+    @pytest.mark.asyncio
+    async def test_app_summary_provider(self, monkeypatch):
+        """Test the summary model choice and that offline providers do not summarize."""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        app = AIChatApp(ephemeral=True)
+        app.setup_provider("mock")
+        assert app.summary_provider is None
+
+        app.setup_provider("openai")
+        assert app.summary_provider.get_provider_options()["model"] == "gpt-4o-mini"
+        assert app.chat_provider.get_provider_options()["model"] != "gpt-4o-mini"
+
+        app.setup_provider("anthropic")
+        assert app.summary_provider.get_provider_options()["model"] == "claude-3-5-haiku-latest"
+        await app.transports.aclose()
@@ -17,10 +17,12 @@ class TestCommands:
         app.exit = Mock()
         app.create_new_chat = Mock(return_value=1)
         app.add_message_to_chat = Mock()
+        app.search_history = Mock()
         app.chat_provider = Mock()
         app.chat_provider.name = "Mock Provider"
         app.chat_provider.get_provider_options = Mock(return_value={"option1": "value1"})
         app.chat_provider.set_provider_option = Mock(return_value=True)
+        app.chat_provider.get_cache_stats = Mock(return_value=None)
 
         return app
 
@@ -55,8 +57,9 @@ class TestCommands:
         # Call the handle_command method with /new
         command_handler.handle_command("/new")
 
-        # Check if create_new_chat was called
+        # Check if create_new_chat was scheduled as a worker
         mock_app.create_new_chat.assert_called_once()
+        mock_app.run_worker.assert_called_once_with(mock_app.create_new_chat.return_value)
 
     def test_handle_provider_command_no_args(self, command_handler, mock_app):
         """Test handling the /provider command with no arguments."""
@@ -93,6 +96,133 @@ class TestCommands:
         command_handler.handle_command("/provider option1=3.14")
         mock_app.chat_provider.set_provider_option.assert_called_with("option1", 3.14)
 
+    def test_handle_provider_command_set_option_boolean(self, command_handler, mock_app):
+        """Test that true and false option values are parsed as booleans."""
+        command_handler.handle_command("/provider prompt_caching=false")
+        mock_app.chat_provider.set_provider_option.assert_called_with("prompt_caching", False)
+
+        command_handler.handle_command("/provider prompt_caching=True")
+        mock_app.chat_provider.set_provider_option.assert_called_with("prompt_caching", True)
+
+    def test_handle_provider_command_shows_cache_stats(self, command_handler, mock_app):
+        """Test that prompt cache use is listed for providers that cache."""
+        mock_app.chat_provider.get_cache_stats.return_value = {
+            "requests": 4, "hits": 3, "misses": 1,
+            "cache_read_input_tokens": 9000, "cache_creation_input_tokens": 3000,
+            "hit_rate": 0.72,
+        }
+
+        command_handler.handle_command("/provider")
+
+        message = mock_app.add_message_to_chat.call_args[0][0]
+        assert "3 hits, 1 misses" in message
+        assert "72% of prompt tokens cached" in message
+
+    def test_handle_search_command(self, command_handler, mock_app):
+        """Test handling the /search command."""
+        command_handler.handle_command("/search  reverse list ")
+
+        mock_app.search_history.assert_called_once_with("reverse list")
+
+    def test_handle_search_command_no_args(self, command_handler, mock_app):
+        """Test that /search without words shows usage instead of searching."""
+        command_handler.handle_command("/search")
+
+        mock_app.search_history.assert_not_called()
+        assert "Usage" in mock_app.add_message_to_chat.call_args[0][0]
+
+    def test_handle_compact_command(self, command_handler, mock_app):
+        """Test that /compact runs database compaction in a worker."""
+        mock_app.compact_database = Mock(return_value="compact-coroutine")
+
+        assert command_handler.handle_command("/compact") is True
+
+        mock_app.compact_database.assert_called_once()
+        assert mock_app.run_worker.call_args[0][0] == "compact-coroutine"
+
+    def test_handle_stats_command(self, command_handler, mock_app):
+        """Test that /stats reports storage statistics in a worker."""
+        mock_app.show_storage_stats = Mock(return_value="stats-coroutine")
+
+        assert command_handler.handle_command("/stats") is True
+
+        mock_app.show_storage_stats.assert_called_once()
+        assert mock_app.run_worker.call_args[0][0] == "stats-coroutine"
+
+    def test_handle_attach_command(self, command_handler, mock_app):
+        """Test that /attach stores the file in a worker and needs a path."""
+        mock_app.attach_file = Mock(return_value="attach-coroutine")
+
+        assert command_handler.handle_command("/attach ~/notes.txt") is True
+        mock_app.attach_file.assert_called_once_with("~/notes.txt")
+        assert mock_app.run_worker.call_args[0][0] == "attach-coroutine"
+
+        mock_app.run_worker.reset_mock()
+        command_handler.handle_command("/attach")
+        mock_app.run_worker.assert_not_called()
+        assert "Usage" in mock_app.add_message_to_chat.call_args[0][0]
+
+    def test_handle_archive_command(self, command_handler, mock_app):
+        """Test that /archive starts an archive worker with an optional age."""
+        mock_app.archive_inactive_chats = Mock(return_value="archive-coroutine")
+
+        assert command_handler.handle_command("/archive") is True
+        mock_app.archive_inactive_chats.assert_called_once_with(None)
+        assert mock_app.run_worker.call_args[0][0] == "archive-coroutine"
+
+        command_handler.handle_command("/archive 30")
+        mock_app.archive_inactive_chats.assert_called_with(30)
+
+        mock_app.run_worker.reset_mock()
+        command_handler.handle_command("/archive soon")
+        mock_app.run_worker.assert_not_called()
+        assert "Usage" in mock_app.add_message_to_chat.call_args[0][0]
+
+    def test_handle_backup_command(self, command_handler, mock_app):
+        """Test that /backup starts a backup worker, with optional verification."""
+        mock_app.backup_database = Mock(return_value="backup-coroutine")
+
+        assert command_handler.handle_command("/backup") is True
+        mock_app.backup_database.assert_called_once_with(verify=False)
+        assert mock_app.run_worker.call_args[0][0] == "backup-coroutine"
+
+        command_handler.handle_command("/backup --verify")
+        mock_app.backup_database.assert_called_with(verify=True)
+
+        mock_app.run_worker.reset_mock()
+        command_handler.handle_command("/backup now")
+        mock_app.run_worker.assert_not_called()
+        assert "Usage" in mock_app.add_message_to_chat.call_args[0][0]
+
+    def test_handle_undo_command(self, command_handler, mock_app):
+        """Test that /undo starts an undo worker."""
+        mock_app.undo_delete = Mock(return_value="undo-coroutine")
+
+        assert command_handler.handle_command("/undo") is True
+
+        mock_app.undo_delete.assert_called_once()
+        assert mock_app.run_worker.call_args[0][0] == "undo-coroutine"
+
+    def test_handle_export_and_import_commands(self, command_handler, mock_app):
+        """Test that /export and /import start transfer workers."""
+        mock_app.export_history = Mock(return_value="export-coroutine")
+        mock_app.import_history = Mock(return_value="import-coroutine")
+
+        command_handler.handle_command("/export ~/chats.jsonl.gz")
+        mock_app.export_history.assert_called_once_with("~/chats.jsonl.gz")
+        assert mock_app.run_worker.call_args[0][0] == "export-coroutine"
+
+        command_handler.handle_command("/import ~/chats.jsonl.gz")
+        mock_app.import_history.assert_called_once_with("~/chats.jsonl.gz")
+        assert mock_app.run_worker.call_args[0][0] == "import-coroutine"
+
+    def test_handle_export_command_no_path(self, command_handler, mock_app):
+        """Test that /export without a path shows usage."""
+        command_handler.handle_command("/export")
+
+        mock_app.run_worker.assert_not_called()
+        assert "Usage" in mock_app.add_message_to_chat.call_args[0][0]
+
     def test_handle_unknown_command(self, command_handler, mock_app):
         """Test handling an unknown command."""
         # Call the handle_command method with an unknown command
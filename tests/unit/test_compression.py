@@ -0,0 +1,132 @@
+"""Tests for message body compression."""
+
+import sqlite3
+
+import pytest
+
+from src.db import compression
+from src.db.compression import CODEC_ZLIB, compress, decompress
+from src.db.database import ChatDatabase
+
+
+class TestCompression:
+    """Tests for the compression codecs."""
+
+    def test_small_bodies_stay_plain(self):
+        """Test that bodies under the threshold are stored as text."""
+        assert compress("short", threshold=1024) == (None, "short")
+        assert decompress(None, "short") == "short"
+
+    def test_zlib_round_trip(self):
+        """Test that zlib-compressed bodies decode to the original text."""
+        text = "def main():\n    print('hello')\n" * 200
+        codec, payload = compress(text, threshold=64, codec=CODEC_ZLIB)
+
+        assert codec == CODEC_ZLIB
+        assert isinstance(payload, bytes)
+        assert len(payload) < len(text)
+        assert decompress(codec, payload) == text
+
+    def test_default_codec_round_trip(self):
+        """Test a round trip with whichever codec is available here."""
+        text = "ünïcödé log line\n" * 500
+        codec, payload = compress(text, threshold=64)
+
+        assert codec == compression.default_codec()
+        assert decompress(codec, payload) == text
+
+    def test_incompressible_bodies_stay_plain(self):
+        """Test that compression is skipped when it would not save space."""
+        # zlib framing alone is larger than a two-byte body
+        codec, payload = compress("ab", threshold=1)
+
+        assert codec is None
+        assert payload == "ab"
+
+    def test_unknown_codec(self):
+        """Test that an unknown codec marker is reported."""
+        with pytest.raises(ValueError):
+            decompress("lz4", b"data")
+
+
+class TestCompressedStorage:
+    """Tests for compressed message storage in ChatDatabase."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a database that compresses anything over 256 bytes and keeps it inline."""
+        db = ChatDatabase(
+            db_path=tmp_path / "compressed.db", compression_threshold=256, blob_threshold=10**9
+        )
+        yield db
+        db.close()
+
+    def test_large_messages_are_compressed_transparently(self, db):
+        """Test that large bodies are stored compressed and read back as text."""
+        chat_id = db.create_new_chat()
+        body = "Traceback (most recent call last):\n  File 'app.py'\n" * 100
+        db.save_message(chat_id, "user", "short question")
+        db.save_message(chat_id, "assistant", body)
+
+        conn = sqlite3.connect(db.db_path)
+        rows = conn.execute("SELECT codec, typeof(content) FROM messages ORDER BY seq").fetchall()
+        conn.close()
+        assert rows[0] == (None, "text")
+        assert rows[1] == (compression.default_codec(), "blob")
+
+        assert db.get_chat_messages(chat_id)[1] == ("assistant", body)
+        assert db.get_chat_messages_page(chat_id)[1] == (2, "assistant", body)
+
+    def test_compressed_messages_are_searchable(self, db):
+        """Test that the search index sees the decompressed text."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "assistant", "filler text " * 100 + "needle")
+
+        results = list(db.search_messages("needle"))
+        assert len(results) == 1
+        assert "**needle**" in results[0][4]
+
+        db.delete_chat(chat_id)
+        assert list(db.search_messages("needle")) == []
+
+    def test_other_tools_can_write_messages(self, db):
+        """Test that the schema does not need the app's SQL functions to change messages."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "assistant", "filler text " * 100 + "needle")
+        db.save_message(chat_id, "user", "haystack")
+
+        conn = sqlite3.connect(db.db_path)
+        conn.execute(
+            "INSERT INTO messages (chat_id, seq, role, content) VALUES (?, 3, 'user', 'hi')",
+            (chat_id,)
+        )
+        conn.execute("UPDATE messages SET content = 'edited' WHERE seq = 2")
+        conn.execute("DELETE FROM messages WHERE seq = 1")
+        conn.commit()
+        conn.close()
+
+        assert list(db.search_messages("needle")) == []
+        assert [row[2] for row in db.search_messages("haystack")] == [2]
+
+    def test_compact_rewrites_existing_rows(self, tmp_path):
+        """Test that compact compresses old plain rows and reports the savings."""
+        db_path = tmp_path / "compact.db"
+        plain = ChatDatabase(db_path=db_path, compression_threshold=10**9)
+        chat_id = plain.create_new_chat()
+        for i in range(50):
+            plain.save_message(chat_id, "assistant", f"log line {i}\n" * 300)
+        plain.close()
+
+        db = ChatDatabase(db_path=db_path, compression_threshold=256)
+        try:
+            stats = db.compact()
+
+            assert stats["rows_compressed"] == 50
+            assert stats["bytes_after"] < stats["bytes_before"]
+            assert db.get_chat_messages(chat_id)[3] == ("assistant", "log line 3\n" * 300)
+            assert len(list(db.search_messages("line"))) == 50
+
+            # A second pass finds nothing left to do
+            assert db.compact()["rows_compressed"] == 0
+        finally:
+            db.close()
@@ -0,0 +1,108 @@
+"""Tests for the token-budgeted context builder."""
+
+from unittest.mock import Mock
+
+import pytest
+
+from src.app import AIChatApp
+from src.context import (
+    DEFAULT_CONTEXT_WINDOW,
+    MESSAGE_OVERHEAD,
+    build_context,
+    context_budget,
+    context_window,
+)
+from src.db.database import ChatDatabase
+from src.providers.mock import MockProvider
+from src.providers.openai import OpenAIProvider
+
+
+def words(count):
+    """Return a message of count one-token words."""
+    return " ".join(["word"] * count)
+
+
+class TestContext:
+    """Tests for choosing the messages that fit a model's context."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a temporary database."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        yield db
+        db.close()
+
+    @pytest.fixture
+    def chat_id(self, db):
+        """Create a chat with a system prompt and five 10-token exchanges."""
+        chat_id = db.start_chat("system", words(20))
+        for _ in range(5):
+            db.save_message(chat_id, "user", words(10))
+            db.save_message(chat_id, "assistant", words(10))
+        return chat_id
+
+    def test_context_window(self):
+        """Test exact, prefix and unknown model lookups."""
+        assert context_window("gpt-4") == 8192
+        assert context_window("gpt-4o-2024-08-06") == 128000
+        assert context_window("claude-3-7-sonnet-latest") == 200000
+        assert context_window("doctor") == DEFAULT_CONTEXT_WINDOW
+        assert context_window(None) == DEFAULT_CONTEXT_WINDOW
+
+    def test_context_budget_reserves_reply_tokens(self):
+        """Test that the reply's max_tokens is taken off the window."""
+        provider = OpenAIProvider(api_key="test-key")
+        provider.set_provider_option("model", "gpt-4")
+        provider.set_provider_option("max_tokens", 1000)
+
+        assert context_budget(provider) == 8192 - 1000
+        assert context_budget(MockProvider()) == DEFAULT_CONTEXT_WINDOW
+
+    def test_everything_fits(self, db, chat_id):
+        """Test that a chat within budget is sent whole."""
+        context = build_context(db, chat_id, MockProvider())
+
+        assert len(context["messages"]) == 11
+        assert context["dropped"] == 0
+        assert context["tokens"] == 20 + 10 * 10 + 11 * MESSAGE_OVERHEAD
+
+    def test_oldest_messages_are_dropped_and_system_kept(self, db, chat_id):
+        """Test that the newest messages fill the budget after pinned ones."""
+        per_message = 10 + MESSAGE_OVERHEAD
+        budget = 20 + MESSAGE_OVERHEAD + 3 * per_message + 5
+
+        context = build_context(db, chat_id, MockProvider(), budget=budget)
+
+        assert [seq for seq, _, _ in context["messages"]] == [1, 9, 10, 11]
+        assert context["messages"][0] == (1, "system", words(20))
+        assert context["tokens"] == 20 + MESSAGE_OVERHEAD + 3 * per_message
+        assert context["dropped"] == 7
+        assert context["dropped_tokens"] == 7 * per_message
+        assert context["budget"] == budget
+
+    def test_newest_message_is_always_kept(self, db, chat_id):
+        """Test that an over-budget newest message is still sent."""
+        db.save_message(chat_id, "user", words(500))
+
+        context = build_context(db, chat_id, MockProvider(), budget=100)
+
+        assert [seq for seq, _, _ in context["messages"]] == [1, 12]
+        assert context["dropped"] == 10
+
+    def test_report_once_per_chat(self):
+        """Test that the app notes dropped messages only when a chat first goes over budget."""
+        app = AIChatApp(ephemeral=True)
+        app.add_message_to_chat = Mock()
+        context = {"dropped": 3, "dropped_tokens": 120, "budget": 7192}
+
+        app.report_context(1, dict(context, dropped=0))
+        assert app.add_message_to_chat.call_count == 0
+
+        app.report_context(1, context)
+        app.report_context(1, dict(context, dropped=4))
+        app.report_context(1, dict(context, dropped=5))
+        assert app.add_message_to_chat.call_count == 1
+        assert "3 oldest messages" in app.add_message_to_chat.call_args[0][0]
+
+        app.report_context(2, context)
+        assert app.add_message_to_chat.call_count == 2
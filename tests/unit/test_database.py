@@ -3,10 +3,12 @@
 import os
 import sqlite3
 import tempfile
+import threading
 import pytest
 from pathlib import Path
 
 # Import the database module
+from src.db.connection import ConnectionPool, is_busy_error
 from src.db.database import ChatDatabase
 
 
@@ -27,7 +29,9 @@ class TestDatabase:
     @pytest.fixture
     def db(self, temp_db_path):
         """Create a database instance with a test database."""
-        return ChatDatabase(db_path=temp_db_path)
+        db = ChatDatabase(db_path=temp_db_path)
+        yield db
+        db.close()
 
     def test_init_database(self, db, temp_db_path):
         """Test that database initialization creates the expected tables."""
@@ -126,8 +130,11 @@ class TestDatabase:
         db.save_message(chat_id, "user", "Message to be deleted")
         db.save_message(chat_id, "assistant", "Response to be deleted")
         
-        # Delete the chat
-        db.delete_chat(chat_id)
+        # Delete the chat; it is hidden at once and removed by the purge
+        assert db.delete_chat(chat_id) == 1
+        assert chat_id not in [chat[0] for chat in db.get_all_chats()]
+        assert db.get_chat_info(chat_id) is None
+        assert db.purge_deleted_chats() == 1
         
         # Check if chat was deleted
         conn = sqlite3.connect(db.db_path)
@@ -146,6 +153,79 @@ class TestDatabase:
         assert chat_result is None, "Chat was not deleted"
         assert len(message_result) == 0, "Messages were not deleted"
 
+    def test_start_chat(self, db):
+        """Test creating a chat together with its first message."""
+        chat_id = db.start_chat("user", "How do tides work?")
+
+        assert db.get_chat_info(chat_id) == ("How do tides work?",)
+        assert db.get_chat_messages(chat_id) == [("user", "How do tides work?")]
+
+    def test_delete_empty_chats(self, db):
+        """Test that chats without messages are garbage collected in batches."""
+        kept = db.start_chat("user", "Keep me")
+        for _ in range(5):
+            db.create_new_chat()
+
+        assert db.delete_empty_chats(batch_size=2) == 5
+        assert [chat[0] for chat in db.get_all_chats()] == [kept]
+        assert db.delete_empty_chats() == 0
+
+    def test_deleted_chats_hidden_from_search_and_export(self, db):
+        """Test that tombstoned chats are left out of search and export."""
+        kept = db.create_new_chat()
+        db.save_message(kept, "user", "keep this zebra")
+        gone = db.create_new_chat()
+        db.save_message(gone, "user", "drop this zebra")
+
+        db.delete_chats([gone])
+
+        assert [r[0] for r in db.search_messages("zebra")] == [kept]
+        assert [r["title"] for r in db.iter_export_records() if r["type"] == "chat"] == [
+            "keep this zebra"
+        ]
+
+    def test_undelete_chats(self, db):
+        """Test that deleted chats can be restored until they are purged."""
+        chat_ids = [db.create_new_chat(f"Chat {i}") for i in range(3)]
+        for chat_id in chat_ids:
+            db.save_message(chat_id, "user", "hello")
+
+        assert db.delete_chats(chat_ids[:2]) == 2
+        assert db.delete_chats(chat_ids[:2]) == 0
+        assert len(db.get_all_chats()) == 1
+
+        assert db.undelete_chats(chat_ids[:2]) == 2
+        assert len(db.get_all_chats()) == 3
+        assert db.purge_deleted_chats() == 0
+        assert db.get_chat_messages(chat_ids[0]) == [("user", "hello")]
+
+    def test_purge_respects_undo_window(self, db):
+        """Test that recent deletions survive a purge with an undo window."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "hello")
+        db.delete_chat(chat_id)
+
+        assert db.purge_deleted_chats(older_than=3600) == 0
+        assert db.undelete_chats([chat_id]) == 1
+
+    def test_purge_in_batches(self, db):
+        """Test that a long chat is purged across several small transactions."""
+        chat_id = db.create_new_chat()
+        for i in range(25):
+            db.save_message(chat_id, "user", f"Message {i}")
+        db.delete_chat(chat_id)
+
+        batches = []
+        purge_batch = db._purge_batch
+
+        def counting_batch(*args):
+            batches.append(purge_batch(*args))
+            return batches[-1]
+
+        db._purge_batch = counting_batch
+        assert db.purge_deleted_chats(batch_size=10) == 1
+        assert batches == [10, 10, 5]
+
     def test_chat_title_update(self, db):
         """Test that the chat title is updated based on the first message."""
         # Create a chat
@@ -194,3 +274,597 @@ class TestDatabase:
         conn.close()
         
         assert count == 0, "Message was saved despite having no chat_id"
+
+    def test_connections_are_reused(self, db):
+        """Test that queries reuse the pooled connections instead of reconnecting."""
+        writer = db.pool._writer
+        readers = list(db.pool._all_readers)
+
+        chat_id = db.create_new_chat("Pooled Chat")
+        db.save_message(chat_id, "user", "Hello")
+        db.get_chat_messages(chat_id)
+        db.get_all_chats()
+
+        assert db.pool._writer is writer
+        assert db.pool._all_readers == readers
+        assert len(readers) == db.read_pool_size
+
+    def test_connection_tuning(self, db):
+        """Test that the pool enables WAL and applies its pragmas."""
+        with db.pool.writer() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+        with db.pool.reader() as conn:
+            assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+
+    def test_nested_writes_share_one_transaction(self, db):
+        """Test that an error in a nested write rolls back the outer block too."""
+        with pytest.raises(RuntimeError), db.pool.writer() as conn:
+            conn.execute("INSERT INTO chats (title) VALUES ('outer')")
+            with db.pool.writer() as inner:
+                inner.execute("INSERT INTO chats (title) VALUES ('inner')")
+            raise RuntimeError("boom")
+
+        assert db.get_all_chats() == []
+
+    def test_reinit_on_new_path(self, db, tmp_path):
+        """Test that init_database reopens the pool when db_path changes."""
+        old_pool = db.pool
+        db.db_path = tmp_path / "other.db"
+        db.init_database()
+
+        assert old_pool.closed
+        assert db.pool is not old_pool
+        assert db.pool.db_path == tmp_path / "other.db"
+
+    def test_close_is_idempotent(self, db):
+        """Test that closing the database twice is harmless."""
+        db.close()
+        db.close()
+        assert db.pool.closed
+
+    def test_messages_keep_insertion_order(self, db):
+        """Test that messages saved within the same second keep their order."""
+        chat_id = db.create_new_chat("Fast Chat")
+        for i in range(20):
+            db.save_message(chat_id, "user" if i % 2 == 0 else "assistant", f"msg {i}")
+
+        messages = db.get_chat_messages(chat_id)
+        assert [content for _, content in messages] == [f"msg {i}" for i in range(20)]
+
+        with db.pool.reader() as conn:
+            seqs = [row[0] for row in conn.execute(
+                "SELECT seq FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
+            )]
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN "
+                "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY seq",
+                (chat_id,)
+            ))
+        assert seqs == list(range(1, 21))
+        assert "TEMP B-TREE" not in plan
+
+    def test_get_chat_messages_page(self, db):
+        """Test keyset pagination over a chat's messages."""
+        chat_id = db.create_new_chat("Long Chat")
+        for i in range(1, 11):
+            db.save_message(chat_id, "user", f"msg {i}")
+
+        latest = db.get_chat_messages_page(chat_id, limit=4)
+        assert [seq for seq, _, _ in latest] == [7, 8, 9, 10]
+        assert latest[-1] == (10, "user", "msg 10")
+
+        older = db.get_chat_messages_page(chat_id, limit=4, before_seq=latest[0][0])
+        assert [seq for seq, _, _ in older] == [3, 4, 5, 6]
+
+        oldest = db.get_chat_messages_page(chat_id, limit=4, before_seq=older[0][0])
+        assert [seq for seq, _, _ in oldest] == [1, 2]
+
+        assert db.get_chat_messages_page(chat_id, limit=4, before_seq=1) == []
+
+    def test_search_messages(self, db):
+        """Test full-text search with ranking and highlighted snippets."""
+        python_chat = db.create_new_chat("Python")
+        db.save_message(python_chat, "user", "How do I reverse a list in Python?")
+        db.save_message(python_chat, "assistant", "Use reversed() or slicing with [::-1].")
+        other_chat = db.create_new_chat("Other")
+        db.save_message(other_chat, "user", "Python python python snakes")
+
+        results = list(db.search_messages("python"))
+        assert len(results) == 2
+        # The message that mentions the term most often ranks first
+        assert results[0][0] == other_chat
+        assert results[0][4].count("**python**") + results[0][4].count("**Python**") == 3
+
+        chat_id, _title, seq, role, snippet = results[1]
+        assert (chat_id, seq, role) == (python_chat, 1, "user")
+        assert "**Python**" in snippet
+
+        assert list(db.search_messages("reverse list")) == [
+            (python_chat, "How do I reverse a...", 1, "user",
+             "How do I **reverse** a **list** in Python?")
+        ]
+
+    def test_search_messages_special_characters(self, db):
+        """Test that FTS5 operator characters in queries are treated literally."""
+        chat_id = db.create_new_chat("Chat")
+        db.save_message(chat_id, "user", "error: file-not-found")
+
+        assert len(list(db.search_messages("file-not-found"))) == 1
+        assert list(db.search_messages('"unbalanced')) == []
+        assert list(db.search_messages("   ")) == []
+
+    def test_search_index_follows_deletes(self, db):
+        """Test that deleted messages drop out of the search index."""
+        chat_id = db.create_new_chat("Chat")
+        db.save_message(chat_id, "user", "ephemeral needle")
+        assert len(list(db.search_messages("needle"))) == 1
+
+        db.delete_chat(chat_id)
+        assert list(db.search_messages("needle")) == []
+
+    def test_chat_summary_maintained_on_insert(self, db):
+        """Test that saving messages keeps the chat summary columns current."""
+        chat_id = db.create_new_chat("Summary Chat")
+        db.save_message(chat_id, "user", "Hello   there\nfriend")
+        db.save_message(chat_id, "assistant", "x" * 200)
+
+        chat = next(c for c in db.get_all_chats() if c[0] == chat_id)
+        _, title, last_message_at, message_count, preview = chat
+        assert title == "Hello there friend"
+        assert last_message_at is not None
+        assert message_count == 2
+        assert preview == "x" * 77 + "..."
+
+    def test_title_only_set_by_first_message(self, db):
+        """Test that a user message after an assistant message keeps the title."""
+        chat_id = db.create_new_chat("Greeting First")
+        db.save_message(chat_id, "assistant", "Hello, how can I help?")
+        db.save_message(chat_id, "user", "Not the title")
+
+        assert db.get_chat_info(chat_id) == ("Greeting First",)
+
+    def test_get_all_chats_orders_by_recent_activity(self, db):
+        """Test that the sidebar query lists the most recently active chat first."""
+        older = db.create_new_chat("Older")
+        newer = db.create_new_chat("Newer")
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE chats SET last_message_at = '2020-01-01 00:00:00' WHERE id = ?",
+                (newer,)
+            )
+        db.save_message(older, "user", "Bump")
+
+        assert [c[0] for c in db.get_all_chats()] == [older, newer]
+
+    def test_delete_message_updates_summary(self, db):
+        """Test that deleting messages keeps the chat summary columns correct."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "First")
+        db.save_message(chat_id, "assistant", "Second")
+
+        assert db.delete_message(chat_id, 2)
+        chat = next(c for c in db.get_all_chats() if c[0] == chat_id)
+        assert chat[3:] == (1, "First")
+
+        assert db.delete_message(chat_id, 1)
+        chat = next(c for c in db.get_all_chats() if c[0] == chat_id)
+        assert chat[3:] == (0, "")
+        assert db.get_chat_messages(chat_id) == []
+
+        assert not db.delete_message(chat_id, 1)
+
+    def test_seq_is_not_reused_after_delete(self, db):
+        """Test that deleting the newest message does not free its seq for the next one."""
+        chat_id = db.start_chat("user", "First")
+        db.save_message(chat_id, "assistant", "Second")
+        export = list(db.iter_export_records())
+
+        db.delete_message(chat_id, 2)
+        db.save_message(chat_id, "user", "Third")
+        assert db.get_chat_messages(chat_id, with_seq=True) == [
+            (1, "user", "First"), (3, "user", "Third")
+        ]
+
+        # Re-importing the earlier export brings back the deleted message only
+        assert db.import_records(export) == {"chats": 0, "messages": 1}
+        assert [m[0] for m in db.get_chat_messages(chat_id, with_seq=True)] == [1, 2, 3]
+        db.save_message(chat_id, "assistant", "Fourth")
+        assert db.get_chat_messages(chat_id, with_seq=True)[-1][0] == 4
+
+
+class TestArchive:
+    """Tests for moving inactive chats to the archive database."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a database with one idle chat and one active chat."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        db.old_chat = db.create_new_chat()
+        db.save_message(db.old_chat, "user", "An old question about rivers")
+        db.save_message(db.old_chat, "assistant", "An old answer about rivers")
+        db.new_chat = db.create_new_chat()
+        db.save_message(db.new_chat, "user", "A recent question about rivers")
+
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE chats SET last_message_at = datetime('now', '-200 days') "
+                "WHERE id = ?",
+                (db.old_chat,)
+            )
+        yield db
+        db.close()
+
+    def test_archive_file_created_only_when_needed(self, db):
+        """Test that nothing is archived or created when no chat is old enough."""
+        assert db.archive_inactive_chats(365) == 0
+        assert not db.archive_path.exists()
+
+        assert db.archive_inactive_chats(90) == 1
+        assert db.archive_path.exists()
+        assert db.archive_inactive_chats(90) == 0
+
+    def test_archived_messages_leave_live_database(self, db):
+        """Test that archived messages are moved rather than copied."""
+        db.archive_inactive_chats(90)
+
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT COUNT(*) FROM main.messages WHERE chat_id = ?", (db.old_chat,)
+            ).fetchone()[0] == 0
+            assert conn.execute(
+                "SELECT COUNT(*) FROM archive.messages WHERE chat_id = ?", (db.old_chat,)
+            ).fetchone()[0] == 2
+
+    def test_interrupted_archive_keeps_messages(self, db, monkeypatch):
+        """Test that a move cut short after the copy loses nothing and can be redone."""
+        def crash(conn, chat_ids):
+            raise RuntimeError("power lost")
+
+        monkeypatch.setattr(db, "_drop_archived_messages", crash)
+        with pytest.raises(RuntimeError):
+            db.archive_inactive_chats(90)
+        with db.pool.reader() as conn:
+            assert conn.execute("PRAGMA archive.synchronous").fetchone()[0] == 2  # FULL
+            assert conn.execute("SELECT COUNT(*) FROM archive.messages").fetchone()[0] == 2
+
+        # The chat is still live, and a message deleted meanwhile stays deleted
+        db.delete_message(db.old_chat, 2)
+        assert db.get_chat_messages(db.old_chat) == [("user", "An old question about rivers")]
+
+        with db.pool.writer() as conn:
+            conn.execute(
+                "UPDATE chats SET last_message_at = datetime('now', '-200 days') WHERE id = ?",
+                (db.old_chat,)
+            )
+
+        monkeypatch.undo()
+        assert db.archive_inactive_chats(90) == 1
+        assert db.get_chat_messages(db.old_chat) == [("user", "An old question about rivers")]
+        with db.pool.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM main.messages").fetchone()[0] == 1
+            assert conn.execute("SELECT COUNT(*) FROM archive.messages").fetchone()[0] == 1
+
+    def test_write_during_archive_keeps_chat_live(self, db, monkeypatch):
+        """Test that a chat written to between the copy and the delete is not archived."""
+        drop = db._drop_archived_messages
+
+        def write_first(conn, chat_ids):
+            db.save_message(db.old_chat, "user", "One more thing")
+            return drop(conn, chat_ids)
+
+        monkeypatch.setattr(db, "_drop_archived_messages", write_first)
+        assert db.archive_inactive_chats(90) == 0
+        assert [m[1] for m in db.get_chat_messages(db.old_chat)] == [
+            "An old question about rivers",
+            "An old answer about rivers",
+            "One more thing",
+        ]
+
+    def test_reads_fall_through_to_archive(self, db):
+        """Test that archived chats list, load, page and search as before."""
+        db.archive_inactive_chats(90)
+
+        assert {chat[0] for chat in db.get_all_chats()} == {db.old_chat, db.new_chat}
+        assert db.get_chat_messages(db.old_chat) == [
+            ("user", "An old question about rivers"),
+            ("assistant", "An old answer about rivers"),
+        ]
+        assert db.get_chat_messages_page(db.old_chat, limit=1) == [
+            (2, "assistant", "An old answer about rivers")
+        ]
+
+        results = list(db.search_messages("rivers"))
+        assert results[0][0] == db.new_chat
+        assert {r[0] for r in results[1:]} == {db.old_chat}
+        assert len(list(db.search_messages("rivers", limit=2))) == 2
+
+    def test_archive_attached_on_reopen(self, db, tmp_path):
+        """Test that an existing archive is picked up when the database reopens."""
+        db.archive_inactive_chats(90)
+        db.close()
+
+        reopened = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        try:
+            assert len(reopened.get_chat_messages(db.old_chat)) == 2
+        finally:
+            reopened.close()
+
+    def test_new_message_restores_chat(self, db):
+        """Test that writing to an archived chat moves it back to the live database."""
+        db.archive_inactive_chats(90)
+        db.save_message(db.old_chat, "user", "Picking this back up")
+
+        assert [m[1] for m in db.get_chat_messages(db.old_chat)] == [
+            "An old question about rivers",
+            "An old answer about rivers",
+            "Picking this back up",
+        ]
+        assert [r[0] for r in db.search_messages("old question")] == [db.old_chat]
+        with db.pool.reader() as conn:
+            assert conn.execute(
+                "SELECT archived_at FROM chats WHERE id = ?", (db.old_chat,)
+            ).fetchone()[0] is None
+            assert conn.execute("SELECT COUNT(*) FROM archive.messages").fetchone()[0] == 0
+
+    def test_delete_archived_chat_and_message(self, db):
+        """Test that deletes reach messages stored in the archive."""
+        db.archive_inactive_chats(90)
+
+        assert db.delete_message(db.old_chat, 2)
+        assert db.get_chat_messages(db.old_chat) == [
+            ("user", "An old question about rivers")
+        ]
+
+        db.delete_chat(db.old_chat)
+        assert db.purge_deleted_chats() == 1
+        with db.pool.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM archive.messages").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM archive.chats").fetchone()[0] == 0
+
+    def test_export_includes_archived_messages(self, db):
+        """Test that exports contain the messages of archived chats."""
+        db.archive_inactive_chats(90)
+
+        messages = [r for r in db.iter_export_records() if r["type"] == "message"]
+        assert len(messages) == 3
+
+
+class TestMultiInstance:
+    """Tests for sharing one database file between several processes."""
+
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        """Return a path for a shared database file."""
+        return tmp_path / "shared.db"
+
+    def test_writer_retries_while_locked(self, db_path):
+        """Test that starting a write waits for another process's lock."""
+        pool = ConnectionPool(db_path, pragmas={"busy_timeout": 10},
+                              busy_retries=5, retry_delay=0.02)
+        blocker = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        try:
+            blocker.execute("BEGIN IMMEDIATE")
+            threading.Timer(0.1, blocker.rollback).start()
+
+            with pool.writer() as conn:
+                conn.execute("CREATE TABLE t (x)")
+        finally:
+            blocker.close()
+            pool.close()
+
+    def test_writer_gives_up_eventually(self, db_path):
+        """Test that a lock held for too long still surfaces as an error."""
+        pool = ConnectionPool(db_path, pragmas={"busy_timeout": 10},
+                              busy_retries=1, retry_delay=0.01)
+        blocker = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            blocker.execute("BEGIN IMMEDIATE")
+            with pytest.raises(sqlite3.OperationalError) as excinfo, pool.writer():
+                pass
+            assert is_busy_error(excinfo.value)
+        finally:
+            blocker.close()
+            pool.close()
+
+    def test_poll_changes_sees_other_instances(self, db_path):
+        """Test that changes from another connection are reported by chat."""
+        ours = ChatDatabase(db_path=db_path)
+        theirs = ChatDatabase(db_path=db_path)
+        try:
+            assert ours.poll_changes() == set()
+
+            # Our own writes do not count as external changes
+            ours.start_chat("user", "Mine")
+            assert ours.poll_changes() == set()
+
+            # Nor once something external happens
+            mine = ours.get_all_chats()[0][0]
+            ours.save_message(mine, "assistant", "Reply")
+            chat_id = theirs.start_chat("user", "Theirs")
+            assert ours.poll_changes() == {chat_id}
+            assert theirs.poll_changes() == {mine}
+            assert ours.poll_changes() == set()
+            assert [chat[1] for chat in ours.get_chats([chat_id])] == ["Theirs"]
+
+            theirs.delete_chat(chat_id)
+            assert ours.poll_changes() == {chat_id}
+            assert ours.get_chats([chat_id]) == []
+        finally:
+            theirs.close()
+            ours.close()
+
+    def test_poll_changes_after_prune(self, db_path):
+        """Test that falling behind a pruned log reports every chat."""
+        ours = ChatDatabase(db_path=db_path)
+        theirs = ChatDatabase(db_path=db_path)
+        try:
+            first = theirs.start_chat("user", "One")
+            second = theirs.start_chat("user", "Two")
+            assert ours.poll_changes() == {first, second}
+
+            theirs.save_message(second, "assistant", "Reply")
+            assert ours.poll_changes() == {second}
+
+            theirs.save_message(first, "assistant", "Reply")
+            theirs.save_message(first, "user", "More")
+            assert theirs.prune_change_log(keep=1) > 0
+            assert ours.poll_changes() == {first, second}
+        finally:
+            theirs.close()
+            ours.close()
+
+
+class TestEphemeral:
+    """Tests for databases kept in memory instead of a file."""
+
+    @pytest.fixture
+    def home(self, tmp_path, monkeypatch):
+        """Point the home directory at an empty folder."""
+        monkeypatch.setenv("HOME", str(tmp_path))
+        return tmp_path
+
+    def test_nothing_is_written_to_disk(self, home, tmp_path, monkeypatch):
+        """Test that an ephemeral database creates no files anywhere."""
+        monkeypatch.chdir(tmp_path)
+        db = ChatDatabase(ephemeral=True)
+        try:
+            chat_id = db.start_chat("user", "Hello")
+            db.save_message(chat_id, "assistant", "Hi there")
+            assert db.ephemeral
+            assert db.get_chat_messages(chat_id) == [("user", "Hello"), ("assistant", "Hi there")]
+        finally:
+            db.close()
+
+        assert list(home.iterdir()) == []
+
+    def test_instances_are_isolated(self):
+        """Test that two ephemeral databases do not share chats."""
+        first = ChatDatabase(ephemeral=True)
+        second = ChatDatabase(ephemeral=True)
+        try:
+            first.start_chat("user", "Only in the first")
+            assert len(first.get_all_chats()) == 1
+            assert second.get_all_chats() == []
+        finally:
+            first.close()
+            second.close()
+
+    def test_search_and_archive(self):
+        """Test that search works and archiving is a no-op without an archive."""
+        db = ChatDatabase(ephemeral=True)
+        try:
+            chat_id = db.start_chat("user", "The quick brown fox")
+            assert [row[0] for row in db.search_messages("fox")] == [chat_id]
+            assert db.archive_inactive_chats(0) == 0
+            assert db.archive_path is None
+        finally:
+            db.close()
+
+    def test_reads_wait_for_the_writer(self):
+        """Test that readers neither trip over the writer's locks nor see uncommitted rows."""
+        db = ChatDatabase(ephemeral=True)
+        try:
+            chat_id = db.start_chat("user", "Hello")
+            results = []
+            reader = threading.Thread(target=lambda: results.append(db.get_all_chats()))
+            with pytest.raises(RuntimeError), db.pool.writer() as conn:
+                conn.execute("UPDATE chats SET title = 'Renamed' WHERE id = ?", (chat_id,))
+                reader.start()
+                reader.join(0.2)
+                assert reader.is_alive()
+                raise RuntimeError("roll back")
+            reader.join()
+            assert [chat[1] for chat in results[0]] == ["Hello"]
+        finally:
+            db.close()
+
+
+class TestTokenCounts:
+    """Tests for the stored per-message token counts."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a database with one chat of five messages."""
+        db = ChatDatabase(db_path=tmp_path / "chat_history.db")
+        db.chat_id = db.start_chat("user", "one two three four")
+        for i in range(4):
+            db.save_message(db.chat_id, "assistant", "one two three four")
+        yield db
+        db.close()
+
+    def test_counts_are_stored_on_write(self, db):
+        """Test that each message gets a count per family with running totals."""
+        assert db.get_token_counts(db.chat_id, "approx") == [
+            (1, 4, 4), (2, 4, 8), (3, 4, 12), (4, 4, 16), (5, 4, 20)
+        ]
+        with db.pool.reader() as conn:
+            families = {row[0] for row in conn.execute("SELECT family FROM message_tokens")}
+        assert families == set(db.token_families)
+
+    def test_fit_token_budget(self, db):
+        """Test picking the longest suffix of messages within a budget."""
+        assert db.fit_token_budget(db.chat_id, "approx", 100) == (1, 20)
+        assert db.fit_token_budget(db.chat_id, "approx", 13) == (3, 12)
+        assert db.fit_token_budget(db.chat_id, "approx", 13, per_message=2) == (4, 12)
+        assert db.fit_token_budget(db.chat_id, "approx", 3) == (None, 0)
+
+    def test_backfill(self, db):
+        """Test that messages stored without counts are estimated, then backfilled."""
+        with db.pool.writer() as conn:
+            conn.execute("DELETE FROM message_tokens WHERE seq > 2")
+
+        # Uncounted rows fall back to a length estimate until backfilled
+        assert db.get_token_counts(db.chat_id, "approx")[2] == (3, 5, 13)
+
+        assert db.backfill_token_counts(batch_size=2) == 3
+        assert db.backfill_token_counts() == 0
+        assert db.get_token_counts(db.chat_id, "approx")[-1] == (5, 4, 20)
+
+    def test_counted_backfill_does_not_take_the_write_lock(self, db):
+        """Test that a backfill with nothing to count leaves other writers alone."""
+        blocker = sqlite3.connect(db.db_path)
+        try:
+            blocker.execute("BEGIN IMMEDIATE")
+            assert db.backfill_token_counts() == 0
+        finally:
+            blocker.close()
+
+    def test_counts_survive_archive_and_follow_deletes(self, db):
+        """Test that counts stay with messages through archiving and are removed with them."""
+        with db.pool.writer() as conn:
+            conn.execute("UPDATE chats SET last_message_at = datetime('now', '-1 year')")
+        assert db.archive_inactive_chats(30) == 1
+        assert db.fit_token_budget(db.chat_id, "approx", 100) == (1, 20)
+
+        db.delete_message(db.chat_id, 5)
+        assert db.get_token_counts(db.chat_id, "approx")[-1] == (4, 4, 16)
+
+        db.delete_chat(db.chat_id)
+        db.purge_deleted_chats()
+        with db.pool.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM message_tokens").fetchone()[0] == 0
+
+    def test_import_stores_counts(self, db, tmp_path):
+        """Test that imported messages are counted as they are written."""
+        other = ChatDatabase(db_path=tmp_path / "other.db")
+        try:
+            other.import_records(db.iter_export_records())
+            assert other.get_token_counts(1, "approx")[-1] == (5, 4, 20)
+            with other.pool.reader() as conn:
+                assert conn.execute(
+                    "SELECT COUNT(*) FROM message_tokens WHERE family = 'approx'"
+                ).fetchone()[0] == 5
+        finally:
+            other.close()
+
+    def test_import_keeps_counts_of_skipped_duplicates(self, db):
+        """Test that a duplicate message in an import leaves the stored counts alone."""
+        records = list(db.iter_export_records())
+        for record in records:
+            if record["type"] == "message":
+                record["content"] = "a different and much longer body of text"
+
+        assert db.import_records(records) == {"chats": 0, "messages": 0}
+        assert db.get_token_counts(db.chat_id, "approx")[-1] == (5, 4, 20)
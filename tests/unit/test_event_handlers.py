@@ -1,7 +1,7 @@
 """Tests for various event handlers."""
 
 import pytest
-from unittest.mock import Mock, MagicMock
+from unittest.mock import AsyncMock, Mock, MagicMock
 
 from src.app import AIChatApp
 from src.ui.components import ChatHistoryItem
@@ -13,7 +13,7 @@ class TestEventHandlers:
     @pytest.fixture
     def mock_app(self):
         """Create a mock app for testing event handlers."""
-        app = AIChatApp()
+        app = AIChatApp(ephemeral=True)
         # Mock database and config-related methods
         app.db = Mock()
         app.config = Mock()
@@ -21,8 +21,8 @@ class TestEventHandlers:
         app.chat_provider = Mock()
         
         # Mock methods that would be called by event handlers
-        app.load_chat = Mock()
-        app.delete_chat = Mock()
+        app.load_chat = AsyncMock()
+        app.delete_chat = AsyncMock()
         app.add_message_to_chat = Mock()
         app.save_and_respond_to_message = Mock()
         app.load_chat_history = Mock()
@@ -39,7 +39,8 @@ class TestEventHandlers:
         
         return app
 
-    def test_on_button_pressed_delete(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_button_pressed_delete(self, mock_app):
         """Test handling of delete button press."""
         # Create a mock event
         event = MagicMock()
@@ -49,16 +50,17 @@ class TestEventHandlers:
         event.stop = Mock()
         
         # Call the event handler
-        mock_app.on_button_pressed(event)
+        await mock_app.on_button_pressed(event)
         
         # Check that delete_chat was called with the correct ID
-        mock_app.delete_chat.assert_called_once_with(123)
+        mock_app.delete_chat.assert_awaited_once_with(123)
         
         # Check that event propagation was stopped
         event.prevent_default.assert_called_once()
         event.stop.assert_called_once()
 
-    def test_on_button_pressed_other(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_button_pressed_other(self, mock_app):
         """Test handling of non-delete button press."""
         # Create a mock event
         event = MagicMock()
@@ -68,7 +70,7 @@ class TestEventHandlers:
         event.stop = Mock()
         
         # Call the event handler
-        mock_app.on_button_pressed(event)
+        await mock_app.on_button_pressed(event)
         
         # Check that delete_chat was not called
         mock_app.delete_chat.assert_not_called()
@@ -77,50 +79,54 @@ class TestEventHandlers:
         event.prevent_default.assert_not_called()
         event.stop.assert_not_called()
 
-    def test_on_list_item_selected(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_list_item_selected(self, mock_app):
         """Test handling of list item selection."""
         # Create a mock event with a ChatHistoryItem
         event = MagicMock()
         event.item = ChatHistoryItem(123, "Test Chat", "2023-01-01 12:00")
         
         # Call the event handler
-        mock_app.on_list_item_selected(event)
+        await mock_app.on_list_item_selected(event)
         
         # Check that load_chat was called with the correct ID
-        mock_app.load_chat.assert_called_once_with(123)
+        mock_app.load_chat.assert_awaited_once_with(123)
 
-    def test_on_list_item_selected_not_chat_item(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_list_item_selected_not_chat_item(self, mock_app):
         """Test handling of list item selection with a non-ChatHistoryItem."""
         # Create a mock event with a non-ChatHistoryItem
         event = MagicMock()
         event.item = "Not a ChatHistoryItem"
         
         # Call the event handler
-        mock_app.on_list_item_selected(event)
+        await mock_app.on_list_item_selected(event)
         
         # Check that load_chat was not called
         mock_app.load_chat.assert_not_called()
 
-    def test_on_list_view_selected(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_list_view_selected(self, mock_app):
         """Test handling of list view selection."""
         # Create a mock event with a ChatHistoryItem
         event = MagicMock()
         event.item = ChatHistoryItem(456, "Another Chat", "2023-01-02 12:00")
         
         # Call the event handler
-        mock_app.on_list_view_selected(event)
+        await mock_app.on_list_view_selected(event)
         
         # Check that load_chat was called with the correct ID
-        mock_app.load_chat.assert_called_once_with(456)
+        mock_app.load_chat.assert_awaited_once_with(456)
 
-    def test_on_list_view_selected_not_chat_item(self, mock_app):
+    @pytest.mark.asyncio
+    async def test_on_list_view_selected_not_chat_item(self, mock_app):
         """Test handling of list view selection with a non-ChatHistoryItem."""
         # Create a mock event with a non-ChatHistoryItem
         event = MagicMock()
         event.item = "Not a ChatHistoryItem"
         
         # Call the event handler
-        mock_app.on_list_view_selected(event)
+        await mock_app.on_list_view_selected(event)
         
         # Check that load_chat was not called
         mock_app.load_chat.assert_not_called()
@@ -159,7 +165,5 @@ class TestEventHandlers:
         # Check that save_and_respond_to_message was called
         mock_app.save_and_respond_to_message.assert_called_once_with("Test message")
         
-        # Check that add_message_to_chat was called for both user and assistant messages
-        assert mock_app.add_message_to_chat.call_count == 2
-        mock_app.add_message_to_chat.assert_any_call("Test message", role="user")
-        mock_app.add_message_to_chat.assert_any_call("Test response", role="assistant")
+        # The user message is added here; the reply is rendered as it streams
+        mock_app.add_message_to_chat.assert_called_once_with("Test message", role="user")
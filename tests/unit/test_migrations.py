@@ -0,0 +1,201 @@
+"""Tests for schema migrations."""
+
+import sqlite3
+
+import pytest
+
+from src.db.database import ChatDatabase
+from src.db.migrations import SCHEMA_VERSION, get_schema_version
+
+
+class TestMigrations:
+    """Tests for the user_version based migration framework."""
+
+    @pytest.fixture
+    def legacy_db_path(self, tmp_path):
+        """Create a database with the pre-migration schema and some data."""
+        db_path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+        CREATE TABLE chats (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER,
+            role TEXT,
+            content TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chats (id)
+        )
+        ''')
+        conn.execute("INSERT INTO chats (id, title) VALUES (1, 'Old Chat')")
+        conn.execute(
+            "INSERT INTO messages (chat_id, role, content) VALUES (1, 'user', 'Hi')"
+        )
+        conn.commit()
+        conn.close()
+        return db_path
+
+    def _index_names(self, db_path):
+        conn = sqlite3.connect(db_path)
+        names = {
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        conn.close()
+        return names
+
+    def test_fresh_database_is_current(self, tmp_path):
+        """Test that a new database is created at the latest schema version."""
+        db = ChatDatabase(db_path=tmp_path / "fresh.db")
+        try:
+            with db.pool.reader() as conn:
+                assert get_schema_version(conn) == SCHEMA_VERSION
+        finally:
+            db.close()
+
+        assert {"idx_messages_chat_seq", "idx_chats_last_message_at"} <= self._index_names(
+            tmp_path / "fresh.db"
+        )
+
+    def test_legacy_database_upgraded_in_place(self, legacy_db_path):
+        """Test that an unversioned database is migrated without losing data."""
+        db = ChatDatabase(db_path=legacy_db_path)
+        try:
+            with db.pool.reader() as conn:
+                assert get_schema_version(conn) == SCHEMA_VERSION
+            assert db.get_chat_info(1) == ("Old Chat",)
+            assert db.get_chat_messages(1) == [("user", "Hi")]
+        finally:
+            db.close()
+
+        assert "idx_messages_chat_seq" in self._index_names(legacy_db_path)
+
+    def test_migrate_is_idempotent(self, tmp_path):
+        """Test that reopening an up-to-date database changes nothing."""
+        db_path = tmp_path / "twice.db"
+        ChatDatabase(db_path=db_path).close()
+        db = ChatDatabase(db_path=db_path)
+        try:
+            db.init_database()
+            with db.pool.reader() as conn:
+                assert get_schema_version(conn) == SCHEMA_VERSION
+        finally:
+            db.close()
+
+    def test_message_reads_use_index(self, tmp_path):
+        """Test that per-chat message queries are served by an index."""
+        db = ChatDatabase(db_path=tmp_path / "plan.db")
+        try:
+            with db.pool.reader() as conn:
+                plan = " ".join(
+                    row[-1] for row in conn.execute(
+                        "EXPLAIN QUERY PLAN "
+                        "SELECT COUNT(*) FROM messages WHERE chat_id = ?",
+                        (1,)
+                    )
+                )
+            assert "USING COVERING INDEX idx_messages_chat_seq" in plan
+        finally:
+            db.close()
+
+    def test_seq_backfilled_in_insertion_order(self, legacy_db_path):
+        """Test that legacy rows sharing a timestamp get a stable per-chat seq."""
+        conn = sqlite3.connect(legacy_db_path)
+        conn.execute("INSERT INTO chats (id, title) VALUES (2, 'Other')")
+        conn.executemany(
+            "INSERT INTO messages (chat_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (1, "assistant", "Reply", "2024-01-01 00:00:00"),
+                (2, "user", "Elsewhere", "2024-01-01 00:00:00"),
+                (1, "user", "Again", "2024-01-01 00:00:00"),
+            ]
+        )
+        conn.execute("UPDATE messages SET timestamp = '2024-01-01 00:00:00'")
+        conn.commit()
+        conn.close()
+
+        db = ChatDatabase(db_path=legacy_db_path)
+        try:
+            with db.pool.reader() as conn:
+                rows = conn.execute(
+                    "SELECT chat_id, seq, content FROM messages ORDER BY chat_id, seq"
+                ).fetchall()
+
+            # New messages carry on from the backfilled numbering
+            db.save_message(1, "assistant", "Next")
+            db.save_message(2, "assistant", "Next")
+            assert db.get_chat_messages(1, with_seq=True)[-1][0] == 4
+            assert db.get_chat_messages(2, with_seq=True)[-1][0] == 2
+        finally:
+            db.close()
+
+        assert rows == [
+            (1, 1, "Hi"),
+            (1, 2, "Reply"),
+            (1, 3, "Again"),
+            (2, 1, "Elsewhere"),
+        ]
+
+    def test_chat_summary_backfilled(self, legacy_db_path):
+        """Test that message_count, last_message_at and preview are backfilled."""
+        conn = sqlite3.connect(legacy_db_path)
+        conn.execute(
+            "INSERT INTO chats (id, title, created_at) VALUES (2, 'Empty', '2024-01-01 00:00:00')"
+        )
+        conn.execute(
+            "INSERT INTO messages (chat_id, role, content, timestamp) "
+            "VALUES (1, 'assistant', 'Latest\n  reply', '2030-01-01 00:00:00')"
+        )
+        conn.commit()
+        conn.close()
+
+        db = ChatDatabase(db_path=legacy_db_path)
+        try:
+            chats = {row[0]: row for row in db.get_all_chats()}
+        finally:
+            db.close()
+
+        assert chats[1][2:] == ("2030-01-01 00:00:00", 2, "Latest reply")
+        assert chats[2][2:] == ("2024-01-01 00:00:00", 0, "")
+
+    def test_chat_uuid_backfilled(self, legacy_db_path):
+        """Test that existing chats are given unique UUIDs."""
+        db = ChatDatabase(db_path=legacy_db_path)
+        try:
+            new_chat = db.create_new_chat()
+            with db.pool.reader() as conn:
+                uuids = dict(conn.execute("SELECT id, uuid FROM chats"))
+        finally:
+            db.close()
+
+        assert uuids[1] is not None
+        assert uuids[new_chat] is not None
+        assert uuids[1] != uuids[new_chat]
+
+    def test_large_bodies_move_to_blobs(self, legacy_db_path):
+        """Test that repeated large bodies are deduplicated when upgrading."""
+        pasted = "def main():\n    pass\n" * 200
+        conn = sqlite3.connect(legacy_db_path)
+        conn.execute("INSERT INTO chats (id, title) VALUES (2, 'Second Chat')")
+        conn.executemany(
+            "INSERT INTO messages (chat_id, role, content) VALUES (?, 'user', ?)",
+            [(1, pasted), (2, pasted)]
+        )
+        conn.commit()
+        conn.close()
+
+        db = ChatDatabase(db_path=legacy_db_path)
+        try:
+            with db.pool.reader() as conn:
+                assert conn.execute("SELECT refcount FROM blobs").fetchall() == [(2,)]
+            assert db.get_chat_messages(2) == [("user", pasted)]
+            assert {row[0] for row in db.search_messages("main")} == {1, 2}
+        finally:
+            db.close()
@@ -0,0 +1,47 @@
+"""Tests for token counting."""
+
+import pytest
+
+from src import tokens
+from src.tokens import (
+    FAMILY_ANTHROPIC,
+    FAMILY_APPROX,
+    FAMILY_OPENAI,
+    TOKENIZER_FAMILIES,
+    count_tokens,
+    count_tokens_by_family,
+    estimate_tokens,
+)
+
+
+class TestTokens:
+    """Tests for count_tokens and the estimator."""
+
+    def test_estimate_counts_words_and_punctuation(self):
+        """Test that short words are one token and punctuation counts separately."""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("Hi there!") == 3
+        # Long words cost about one token per four characters
+        assert estimate_tokens("abcdefghijk") == 3
+
+    def test_estimate_fallback(self, monkeypatch):
+        """Test that every family falls back to the estimate without tiktoken."""
+        monkeypatch.setattr(tokens, "tiktoken", None)
+        text = "How many tokens is this sentence?"
+        for family in TOKENIZER_FAMILIES:
+            assert count_tokens(text, family) == estimate_tokens(text)
+
+    def test_unknown_family(self):
+        """Test that an unknown family is rejected."""
+        with pytest.raises(ValueError):
+            count_tokens("text", "nonsense")
+        with pytest.raises(ValueError):
+            count_tokens_by_family("text", [FAMILY_APPROX, "nonsense"])
+
+    def test_by_family_matches_single_counts(self):
+        """Test that counting several families at once gives the same answers."""
+        text = "Counting tokens for several families at once."
+        counts = count_tokens_by_family(text)
+        assert set(counts) == set(TOKENIZER_FAMILIES)
+        for family in (FAMILY_APPROX, FAMILY_OPENAI, FAMILY_ANTHROPIC):
+            assert counts[family] == count_tokens(text, family)
@@ -0,0 +1,118 @@
+"""Tests for JSONL import and export."""
+
+import gc
+import gzip
+import json
+import warnings
+
+import pytest
+
+from src.db.database import ChatDatabase
+from src.db.transfer import export_history, import_history
+from src.main import main
+
+
+class TestTransfer:
+    """Tests for streaming chat history in and out as JSONL."""
+
+    @pytest.fixture
+    def source_db(self, tmp_path):
+        """Create a database with a couple of chats to export."""
+        db = ChatDatabase(db_path=tmp_path / "source.db", compression_threshold=256)
+        first = db.create_new_chat()
+        db.save_message(first, "user", "How do I export?")
+        db.save_message(first, "assistant", "Like this:\n" + "line\n" * 200)
+        db.create_new_chat("Empty Chat")
+        yield db
+        db.close()
+
+    @pytest.fixture
+    def target_db(self, tmp_path):
+        """Create an empty database to import into."""
+        db = ChatDatabase(db_path=tmp_path / "target.db")
+        yield db
+        db.close()
+
+    def test_export_format(self, source_db, tmp_path):
+        """Test that the export is a header followed by chat and message records."""
+        path = tmp_path / "export.jsonl"
+        counts = export_history(source_db, path)
+
+        assert counts == {"chats": 2, "messages": 2}
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert lines[0] == {"type": "termwave-export", "version": 1}
+        assert [line["type"] for line in lines[1:]] == ["chat", "message", "message", "chat"]
+        assert lines[3]["content"] == "Like this:\n" + "line\n" * 200
+        assert lines[2]["chat"] == lines[1]["uuid"]
+
+    def test_round_trip(self, source_db, target_db, tmp_path):
+        """Test that an export imports into another database unchanged."""
+        path = tmp_path / "export.jsonl.gz"
+        export_history(source_db, path)
+
+        with gzip.open(path, "rt") as f:
+            assert json.loads(f.readline())["type"] == "termwave-export"
+
+        assert import_history(target_db, path) == {"chats": 2, "messages": 2}
+
+        chats = {c[1]: c for c in target_db.get_all_chats()}
+        assert set(chats) == {"How do I export?", "Empty Chat"}
+        imported = chats["How do I export?"]
+        assert imported[3] == 2
+        assert imported[4].startswith("Like this: line")
+        assert target_db.get_chat_messages(imported[0]) == source_db.get_chat_messages(
+            next(c[0] for c in source_db.get_all_chats() if c[1] == "How do I export?")
+        )
+        assert len(list(target_db.search_messages("export"))) == 1
+
+    def test_gzip_files_are_closed(self, source_db, target_db, tmp_path):
+        """Test that the file under a gzip stream is closed, not left to the collector."""
+        path = tmp_path / "export.jsonl.gz"
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            export_history(source_db, path)
+            import_history(target_db, path)
+            gc.collect()
+
+        assert [w for w in caught if issubclass(w.category, ResourceWarning)] == []
+
+    def test_import_is_idempotent(self, source_db, target_db, tmp_path):
+        """Test that importing the same export twice adds nothing the second time."""
+        path = tmp_path / "export.jsonl"
+        export_history(source_db, path)
+
+        import_history(target_db, path, batch_size=2)
+        assert import_history(target_db, path, batch_size=2) == {"chats": 0, "messages": 0}
+        assert len(target_db.get_all_chats()) == 2
+
+    def test_import_adds_new_messages_to_known_chat(self, source_db, target_db, tmp_path):
+        """Test that re-importing a grown chat only adds the new messages."""
+        path = tmp_path / "export.jsonl"
+        export_history(source_db, path)
+        import_history(target_db, path)
+
+        chat_id = next(c[0] for c in source_db.get_all_chats() if c[1] == "Empty Chat")
+        source_db.save_message(chat_id, "user", "Now with a message")
+        export_history(source_db, path)
+
+        assert import_history(target_db, path) == {"chats": 0, "messages": 1}
+
+    def test_import_rejects_invalid_json(self, target_db, tmp_path):
+        """Test that a corrupt line is reported with its line number."""
+        path = tmp_path / "bad.jsonl"
+        path.write_text('{"type": "termwave-export", "version": 1}\n{not json\n')
+
+        with pytest.raises(ValueError, match="line 2"):
+            import_history(target_db, path)
+
+    def test_cli_export_and_import(self, source_db, tmp_path, capsys):
+        """Test the termwave export and import subcommands."""
+        path = tmp_path / "cli.jsonl"
+        target = tmp_path / "cli_target.db"
+
+        assert main(["--db", str(source_db.db_path), "export", str(path)]) == 0
+        assert main(["--db", str(target), "import", str(path)]) == 0
+
+        err = capsys.readouterr().err
+        assert "Exported 2 chats and 2 messages." in err
+        assert "Imported 2 new chats and 2 new messages." in err
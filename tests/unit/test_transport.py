@@ -0,0 +1,123 @@
+"""Tests for the shared HTTP transport registry."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.app import AIChatApp
+from src.config import Config
+from src.providers.openai import OpenAIProvider
+from src.transport import TransportRegistry, httpx
+
+pytestmark = pytest.mark.skipif(httpx is None, reason="no HTTP client library installed")
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion over keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        """Record the connection the request came in on and reply."""
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.connections.append(self.client_address)
+        body = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "stand-in",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Hello from the stand-in"},
+                "finish_reason": "stop",
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep test output quiet."""
+
+
+class TestTransportRegistry:
+    """Tests for TransportRegistry."""
+
+    @pytest.fixture
+    def server(self):
+        """Run a local HTTP server standing in for a provider's API."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        server.connections = []
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    @pytest.mark.asyncio
+    async def test_clients_are_shared_by_name(self):
+        """Test that borrowing twice returns the same pooled client."""
+        registry = TransportRegistry()
+        try:
+            assert registry.client("openai") is registry.client("openai")
+            assert registry.client("openai") is not registry.client("anthropic")
+        finally:
+            await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_provider_switch_reuses_connection(self, server):
+        """Test that a rebuilt provider sends over the previous one's connection."""
+        registry = TransportRegistry()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        messages = [{"role": "user", "content": "Hi"}]
+        try:
+            for _ in range(3):
+                # As /provider does, build a fresh provider each time
+                provider = OpenAIProvider(api_key="test-key", http_client=registry.client("openai"))
+                provider.client.base_url = base_url
+                assert await provider.generate_response(messages) == "Hello from the stand-in"
+        finally:
+            await registry.aclose()
+
+        assert len(server.connections) == 3
+        assert len(set(server.connections)) == 1
+
+    @pytest.mark.asyncio
+    async def test_close(self):
+        """Test that closing the registry closes its clients and stops lending."""
+        registry = TransportRegistry()
+        client = registry.client()
+
+        await registry.aclose()
+        await registry.aclose()
+
+        assert client.is_closed
+        with pytest.raises(RuntimeError):
+            registry.client()
+
+    def test_from_config(self, tmp_path):
+        """Test that pool limits come from the http settings."""
+        config = Config(config_path=tmp_path / "config.json")
+        config.set("http.max_connections", 4)
+        config.set("http.keepalive_expiry", 30.0)
+        config.set("http.http2", False)
+
+        registry = TransportRegistry.from_config(config)
+
+        assert registry.max_connections == 4
+        assert registry.max_keepalive_connections == 10
+        assert registry.keepalive_expiry == 30.0
+        assert registry.http2 is False
+
+    @pytest.mark.asyncio
+    async def test_app_closes_registry_on_exit(self):
+        """Test that the app's clients are closed when it exits."""
+        async with AIChatApp(ephemeral=True).run_test() as pilot:
+            client = pilot.app.transports.client("openai")
+            assert not client.is_closed
+
+        assert client.is_closed
@@ -0,0 +1,119 @@
+"""Tests for write-behind message saving."""
+
+import sqlite3
+import time
+
+import pytest
+
+from src.db.database import ChatDatabase
+from src.db.write_behind import WriteBehindQueue
+
+
+def _stored_message_count(db_path):
+    """Count messages that have actually been committed to the file."""
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    conn.close()
+    return count
+
+
+class TestWriteBehindQueue:
+    """Tests for the generic WriteBehindQueue."""
+
+    def test_flushes_at_threshold(self):
+        """Test that reaching the threshold writes the whole batch at once."""
+        batches = []
+        queue = WriteBehindQueue(batches.append, interval=60, threshold=3)
+
+        queue.add(1)
+        queue.add(2)
+        assert batches == []
+        queue.add(3)
+
+        assert batches == [[1, 2, 3]]
+        assert len(queue) == 0
+
+    def test_flushes_after_interval(self):
+        """Test that a partial batch is written once the interval elapses."""
+        batches = []
+        queue = WriteBehindQueue(batches.append, interval=0.01, threshold=100)
+        queue.add("a")
+
+        deadline = time.monotonic() + 2
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert batches == [["a"]]
+
+    def test_failed_flush_keeps_items(self):
+        """Test that items survive a failed write and are retried."""
+        def fail(batch):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        queue = WriteBehindQueue(fail, interval=60, threshold=100)
+        queue.add("a")
+
+        with pytest.raises(sqlite3.OperationalError):
+            queue.flush()
+        assert len(queue) == 1
+
+        written = []
+        queue.flush_batch = written.append
+        assert queue.flush() == 1
+        assert written == [["a"]]
+
+
+class TestWriteBehindDatabase:
+    """Tests for ChatDatabase in write-behind mode."""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """Create a write-behind database that only flushes when asked."""
+        db = ChatDatabase(
+            db_path=tmp_path / "write_behind.db",
+            write_behind=True,
+            flush_interval=60,
+            flush_threshold=1000,
+        )
+        yield db
+        db.close()
+
+    def test_messages_are_buffered(self, db):
+        """Test that saves are queued rather than committed one by one."""
+        chat_id = db.create_new_chat()
+        assert db.save_message(chat_id, "user", "Hello there")
+        assert db.save_message(chat_id, "assistant", "Hi")
+
+        assert _stored_message_count(db.db_path) == 0
+        assert db.flush() == 2
+        assert _stored_message_count(db.db_path) == 2
+
+    def test_read_your_writes(self, db):
+        """Test that reads see messages that are still queued."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "First words of the chat title")
+        db.save_message(chat_id, "assistant", "Reply")
+
+        assert db.get_chat_messages(chat_id) == [
+            ("user", "First words of the chat title"),
+            ("assistant", "Reply"),
+        ]
+        assert db.get_chat_info(chat_id) == ("First words of the chat...",)
+
+    def test_close_flushes(self, db):
+        """Test that closing the database writes everything still queued."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "Last words")
+        db.close()
+
+        assert _stored_message_count(db.db_path) == 1
+
+    def test_delete_flushes_first(self, db):
+        """Test that queued messages of a deleted chat do not reappear."""
+        chat_id = db.create_new_chat()
+        db.save_message(chat_id, "user", "Doomed")
+        db.delete_chat(chat_id)
+        db.flush()
+        db.purge_deleted_chats()
+
+        assert _stored_message_count(db.db_path) == 0